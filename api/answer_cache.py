@@ -0,0 +1,237 @@
+"""Semantic cache of streamed chat answers.
+
+Popular repositories get the same questions over and over ("how do I run this?",
+"explain the architecture"), and each one used to pay for retrieval and a full LLM
+generation. Answers to first-turn questions are stored with the embedding of the
+question, under a scope identifying everything else the answer depends on:
+
+    repository, indexed commit, provider, model, language, file, filters, credentials
+
+A new question is answered from the cache when a stored question of the same scope
+has a cosine similarity of at least DEEPWIKI_ANSWER_CACHE_THRESHOLD; the stored chunks
+are replayed in order, so clients see the same stream as for a generated answer.
+Because the indexed commit is part of the scope, re-indexing a repository never
+serves an answer computed against older code.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Location of the cache database, next to the repository databases by default
+DEFAULT_PATH = os.environ.get(
+    "DEEPWIKI_ANSWER_CACHE_PATH",
+    os.path.join(os.path.expanduser("~"), ".adalflow", "answer_cache.sqlite3"),
+)
+# Whether answers are cached at all
+ANSWER_CACHE_ENABLED = os.environ.get("DEEPWIKI_ANSWER_CACHE", "true").lower() in ("1", "true", "yes")
+# Minimum cosine similarity between two questions for one to reuse the other's answer
+DEFAULT_THRESHOLD = float(os.environ.get("DEEPWIKI_ANSWER_CACHE_THRESHOLD", 0.95))
+# Seconds an answer stays valid
+DEFAULT_TTL = int(os.environ.get("DEEPWIKI_ANSWER_CACHE_TTL", 7 * 24 * 3600))
+# Answers kept per scope; the least recently used ones are removed first
+DEFAULT_MAX_PER_SCOPE = int(os.environ.get("DEEPWIKI_ANSWER_CACHE_MAX_PER_SCOPE", 200))
+
+
+def make_scope(**parts: Any) -> str:
+    """
+    Identify the settings an answer depends on, besides the question itself.
+
+    Access tokens must be passed hashed; values are serialized in key order.
+    """
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def hash_token(token: Optional[str]) -> str:
+    """Return a digest of an access token, so private answers are scoped without storing it."""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest() if token else ""
+
+
+class AnswerCache:
+    """
+    SQLite-backed store of answers, looked up by question similarity within a scope.
+
+    All operations are thread-safe.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, threshold: float = DEFAULT_THRESHOLD, ttl: int = DEFAULT_TTL,
+                 max_per_scope: int = DEFAULT_MAX_PER_SCOPE):
+        self.path = path
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_per_scope = max_per_scope
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "id INTEGER PRIMARY KEY, scope TEXT NOT NULL, question TEXT NOT NULL, vector BLOB NOT NULL, "
+            "chunks TEXT NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_scope ON answers (scope, last_used)")
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def lookup(self, scope: str, vector: Sequence[float]) -> Optional[List[str]]:
+        """
+        Find the answer to the most similar stored question of a scope.
+
+        Returns:
+            Optional[List[str]]: The streamed chunks of the answer, or None if no stored
+            question reaches the similarity threshold.
+        """
+        query = _normalize(np.asarray(vector, dtype=np.float32))
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, vector FROM answers WHERE scope = ? AND created >= ?",
+                (scope, time.time() - self.ttl),
+            ).fetchall()
+            best_id, best_score = None, self.threshold
+            if rows and query is not None:
+                candidates = [(row_id, np.frombuffer(blob, dtype=np.float32)) for row_id, blob in rows]
+                candidates = [(row_id, stored) for row_id, stored in candidates if stored.shape == query.shape]
+                if candidates:
+                    matrix = np.stack([stored for _, stored in candidates])
+                    scores = matrix @ query
+                    best = int(scores.argmax())
+                    if scores[best] >= best_score:
+                        best_id, best_score = candidates[best][0], float(scores[best])
+            if best_id is None:
+                self.misses += 1
+                return None
+            chunks = self._conn.execute("SELECT chunks FROM answers WHERE id = ?", (best_id,)).fetchone()[0]
+            self._conn.execute("UPDATE answers SET last_used = ? WHERE id = ?", (time.time(), best_id))
+            self._conn.commit()
+            self.hits += 1
+        logger.info(f"Answer cache hit with similarity {best_score:.3f}")
+        return json.loads(chunks)
+
+    def store(self, scope: str, question: str, vector: Sequence[float], chunks: List[str]) -> None:
+        """Store the streamed chunks of an answer, keeping at most max_per_scope answers per scope."""
+        normalized = _normalize(np.asarray(vector, dtype=np.float32))
+        if normalized is None or not chunks:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO answers (scope, question, vector, chunks, created, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                (scope, question, array("f", normalized.tolist()).tobytes(), json.dumps(chunks), now, now),
+            )
+            # Drop expired answers of the scope and the least recently used ones over the limit
+            self._conn.execute("DELETE FROM answers WHERE scope = ? AND created < ?", (scope, now - self.ttl))
+            self._conn.execute(
+                "DELETE FROM answers WHERE scope = ? AND id NOT IN "
+                "(SELECT id FROM answers WHERE scope = ? ORDER BY last_used DESC LIMIT ?)",
+                (scope, scope, self.max_per_scope),
+            )
+            self._conn.commit()
+            self.writes += 1
+
+    def clear(self) -> None:
+        """Remove all entries without touching the counters."""
+        with self._lock:
+            self._conn.execute("DELETE FROM answers")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the cache counters and current occupancy."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "path": self.path,
+                "entries": entries,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _normalize(vector: np.ndarray) -> Optional[np.ndarray]:
+    norm = float(np.linalg.norm(vector)) if vector.ndim == 1 and len(vector) else 0.0
+    if not np.isfinite(norm) or norm == 0:
+        return None
+    return vector / norm
+
+
+# Some clients stream provider errors as plain text, without an is_error flag
+_ERROR_PREFIXES = ("Error", "OpenRouter API error")
+
+
+class AnswerRecorder:
+    """
+    Pass-through wrapper of a websocket recording the text sent on it.
+
+    Error paths call discard(), and so does sending a chunk flagged with a true is_error
+    attribute, the way clients report provider errors inside the stream (see
+    openrouter_client.ErrorText). Only complete answers are offered to the cache.
+    """
+
+    def __init__(self, websocket: Any):
+        self._websocket = websocket
+        self.chunks: List[str] = []
+        self.discarded = False
+
+    async def send_text(self, text: str) -> None:
+        if getattr(text, "is_error", False):
+            self.discard()
+        self.chunks.append(text)
+        await self._websocket.send_text(text)
+
+    def discard(self) -> None:
+        self.discarded = True
+
+    @property
+    def answer(self) -> Optional[List[str]]:
+        """The recorded chunks, or None if the answer failed or is empty."""
+        text = "".join(self.chunks).strip()
+        if self.discarded or not text or text.startswith(_ERROR_PREFIXES):
+            return None
+        return self.chunks
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._websocket, name)
+
+
+_answer_cache: Optional[AnswerCache] = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> Optional[AnswerCache]:
+    """
+    Return the process-wide answer cache, opening it on first use.
+
+    Returns:
+        Optional[AnswerCache]: The cache, or None if it is disabled or cannot be opened.
+    """
+    global _answer_cache
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    with _answer_cache_lock:
+        if _answer_cache is None:
+            try:
+                _answer_cache = AnswerCache()
+            except sqlite3.Error as e:
+                logger.warning(f"Answer cache disabled, could not open {DEFAULT_PATH}: {e}")
+                return None
+        return _answer_cache
@@ -24,6 +24,20 @@ app = FastAPI(
     description="API for streaming chat completions"
 )
 
+@app.on_event("shutdown")
+async def close_shared_http_session():
+    """Close the pooled HTTP session used for repository hosting API calls."""
+    from api.http_client import close_http_session
+    await close_http_session()
+
+@app.on_event("shutdown")
+def release_executors():
+    """Release the thread pools used for retriever preparation and retrieval."""
+    from api.executors import shutdown_executors
+    from api.index_jobs import shutdown_job_manager
+    shutdown_executors()
+    shutdown_job_manager()
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -504,6 +518,13 @@ async def store_wiki_cache(request_data: WikiCacheRequest):
     else:
         raise HTTPException(status_code=500, detail="Failed to save wiki cache")
 
+def check_authorization_code(authorization_code: Optional[str]) -> None:
+    """Reject the request unless authorization is disabled or the code matches."""
+    if WIKI_AUTH_MODE:
+        logger.info("check the authorization code")
+        if not authorization_code or WIKI_AUTH_CODE != authorization_code:
+            raise HTTPException(status_code=401, detail="Authorization code is invalid")
+
 @app.delete("/api/wiki_cache")
 async def delete_wiki_cache(
     owner: str = Query(..., description="Repository owner"),
@@ -520,10 +541,7 @@ async def delete_wiki_cache(
     if not supported_langs.__contains__(language):
         raise HTTPException(status_code=400, detail="Language is not supported")
 
-    if WIKI_AUTH_MODE:
-        logger.info("check the authorization code")
-        if not authorization_code or WIKI_AUTH_CODE != authorization_code:
-            raise HTTPException(status_code=401, detail="Authorization code is invalid")
+    check_authorization_code(authorization_code)
 
     logger.info(f"Attempting to delete wiki cache for {owner}/{repo} ({repo_type}), lang: {language}")
     cache_path = get_wiki_cache_path(owner, repo, repo_type, language)
@@ -540,6 +558,96 @@ async def delete_wiki_cache(
         logger.warning(f"Wiki cache not found, cannot delete: {cache_path}")
         raise HTTPException(status_code=404, detail="Wiki cache not found")
 
+@app.get("/api/retriever_cache")
+async def get_retriever_cache_stats():
+    """Returns hit/miss/eviction counters and occupancy of the in-process retriever cache."""
+    from api.retriever_cache import retriever_cache
+    return retriever_cache.stats()
+
+@app.get("/api/embedding_cache")
+async def get_embedding_cache_stats():
+    """Returns hit/miss/eviction counters and size of the persistent embedding cache."""
+    from api.embedding_cache import get_embedding_cache
+    cache = get_embedding_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+@app.get("/api/query_embedding_cache")
+async def get_query_embedding_cache_stats():
+    """Returns hit/miss/eviction counters and occupancy of the query embedding cache."""
+    from api.query_embedding_cache import query_embedding_cache
+    return query_embedding_cache.stats()
+
+@app.get("/api/answer_cache")
+async def get_answer_cache_stats():
+    """Returns hit/miss counters and size of the semantic answer cache."""
+    from api.answer_cache import get_answer_cache
+    cache = get_answer_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+class IndexJobRequest(BaseModel):
+    """
+    Model for queueing a repository for background indexing.
+    """
+    repo_url: str = Field(..., description="URL or local path of the repository to index")
+    type: Optional[str] = Field("github", description="Type of repository (e.g., 'github', 'gitlab', 'bitbucket')")
+    token: Optional[str] = Field(None, description="Personal access token for private repositories, kept in memory only")
+    excluded_dirs: Optional[List[str]] = Field(None, description="Directories to exclude from processing")
+    excluded_files: Optional[List[str]] = Field(None, description="File patterns to exclude from processing")
+    included_dirs: Optional[List[str]] = Field(None, description="Directories to include exclusively")
+    included_files: Optional[List[str]] = Field(None, description="File patterns to include exclusively")
+    refresh: Optional[bool] = Field(False, description="Re-index files changed since the repository was last indexed")
+    authorization_code: Optional[str] = Field(None, description="Authorization code")
+
+@app.post("/api/index_jobs")
+async def submit_index_job(request: IndexJobRequest):
+    """Queues a repository for indexing in the background and returns the job."""
+    from api.index_jobs import get_job_manager
+    check_authorization_code(request.authorization_code)
+    # Indexing a path reads server files, which only authorized deployments may allow
+    is_remote = request.repo_url.startswith("https://") or request.repo_url.startswith("http://")
+    if request.type == "local" or not is_remote:
+        if not WIKI_AUTH_MODE:
+            raise HTTPException(status_code=403, detail="Local repositories can only be indexed when authorization is enabled")
+    job = get_job_manager().submit(
+        request.repo_url, request.type, request.token,
+        excluded_dirs=request.excluded_dirs, excluded_files=request.excluded_files,
+        included_dirs=request.included_dirs, included_files=request.included_files,
+        refresh=bool(request.refresh),
+    )
+    return job.to_dict()
+
+@app.get("/api/index_jobs")
+async def list_index_jobs(limit: int = Query(50, ge=1, le=500, description="Maximum number of jobs to return"),
+                          authorization_code: Optional[str] = Query(None, description="Authorization code")):
+    """Lists the most recent indexing jobs, newest first."""
+    from api.index_jobs import get_job_manager
+    check_authorization_code(authorization_code)
+    return [job.to_dict() for job in get_job_manager().list(limit)]
+
+@app.get("/api/index_jobs/{job_id}")
+async def get_index_job(job_id: str, authorization_code: Optional[str] = Query(None, description="Authorization code")):
+    """Returns the status and stage-level progress of an indexing job."""
+    from api.index_jobs import get_job_manager
+    check_authorization_code(authorization_code)
+    job = get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Indexing job not found")
+    return job.to_dict()
+
+@app.delete("/api/index_jobs/{job_id}")
+async def cancel_index_job(job_id: str, authorization_code: Optional[str] = Query(None, description="Authorization code")):
+    """Cancels a queued or running indexing job."""
+    from api.index_jobs import get_job_manager
+    check_authorization_code(authorization_code)
+    job = get_job_manager().cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Indexing job not found")
+    return job.to_dict()
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint for Docker and monitoring"""
@@ -0,0 +1,156 @@
+"""Registry of long-lived model clients shared across requests.
+
+Constructing a provider client creates its HTTP client and connection pool, so building
+one per chat message puts client setup and a fresh TCP/TLS handshake on every request.
+Clients are instead created once per (provider, client class, base URL, credentials,
+options) and reused by the chat handlers, the RAG generator and the embedders. The
+underlying SDK clients (openai, httpx, boto3, ollama) are safe to share between
+threads and concurrent requests of the server's event loop.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of distinct clients kept alive
+CLIENT_POOL_SIZE = int(os.environ.get("DEEPWIKI_CLIENT_POOL_SIZE", 32))
+
+# Environment variables each provider's client reads at construction:
+# (variables giving the endpoint, variables holding credentials)
+PROVIDER_ENV_VARS: Dict[str, Tuple[Tuple[str, ...], Tuple[str, ...]]] = {
+    "openai": (("OPENAI_BASE_URL",), ("OPENAI_API_KEY",)),
+    "openrouter": ((), ("OPENROUTER_API_KEY",)),
+    "azure": (("AZURE_OPENAI_ENDPOINT",), ("AZURE_OPENAI_API_KEY", "AZURE_OPENAI_VERSION")),
+    "dashscope": (("DASHSCOPE_BASE_URL",), ("DASHSCOPE_API_KEY", "DASHSCOPE_WORKSPACE_ID")),
+    "bedrock": (("AWS_REGION",), ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "AWS_ROLE_ARN")),
+    "ollama": (("OLLAMA_HOST",), ()),
+    "google": ((), ("GOOGLE_API_KEY",)),
+}
+
+ClientKey = Tuple[str, str, str, str]
+
+
+def make_client_key(provider: str, client_class: Any, init_kwargs: Dict[str, Any] = None) -> ClientKey:
+    """
+    Identify the client a provider would build with the current environment.
+
+    Credentials and constructor arguments are hashed, so keys can be logged and
+    listed without exposing secrets.
+
+    Args:
+        provider (str): Provider name, e.g. "openai" or "ollama".
+        client_class: The client class or factory.
+        init_kwargs (dict, optional): Constructor arguments.
+
+    Returns:
+        ClientKey: (provider, client class, base URL, fingerprint of credentials and arguments).
+    """
+    init_kwargs = init_kwargs or {}
+    endpoint_vars, credential_vars = PROVIDER_ENV_VARS.get(provider, ((), ()))
+    base_url = init_kwargs.get("base_url") or init_kwargs.get("host") or next(
+        (os.environ[name] for name in endpoint_vars if os.environ.get(name)), "")
+
+    digest = hashlib.sha256()
+    for name in credential_vars:
+        digest.update(f"{name}={os.environ.get(name, '')}\0".encode("utf-8"))
+    digest.update(json.dumps(init_kwargs, sort_keys=True, default=repr).encode("utf-8"))
+    class_name = f"{getattr(client_class, '__module__', '')}.{getattr(client_class, '__qualname__', repr(client_class))}"
+    return provider, class_name, str(base_url), digest.hexdigest()
+
+
+class ClientPool:
+    """
+    Bounded LRU of constructed clients.
+
+    A client is built at most once per key, even when several requests ask for it at
+    the same time, and a slow constructor only holds up requests for the same key.
+    Evicted clients are not closed, since requests may still hold them; they are
+    released once the last reference goes away.
+    """
+
+    def __init__(self, max_entries: int = CLIENT_POOL_SIZE):
+        self.max_entries = max_entries
+        self._clients: "OrderedDict[ClientKey, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._building: Dict[ClientKey, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _lookup(self, key: ClientKey) -> Any:
+        client = self._clients.get(key)
+        if client is not None:
+            self._clients.move_to_end(key)
+            self.hits += 1
+        return client
+
+    def get_or_create(self, key: ClientKey, factory: Callable[[], Any]) -> Any:
+        with self._lock:
+            client = self._lookup(key)
+            if client is not None:
+                return client
+            build_lock = self._building.setdefault(key, threading.Lock())
+
+        # Constructors may resolve credentials or reach the network, so they run outside
+        # the pool lock; the per-key lock keeps concurrent requests from building twice
+        with build_lock:
+            with self._lock:
+                client = self._lookup(key)
+                if client is not None:
+                    return client
+                self.misses += 1
+            try:
+                client = factory()
+            except BaseException:
+                with self._lock:
+                    self._building.pop(key, None)
+                raise
+            with self._lock:
+                self._clients[key] = client
+                self._building.pop(key, None)
+                while len(self._clients) > self.max_entries:
+                    evicted_key, _ = self._clients.popitem(last=False)
+                    self.evictions += 1
+                    logger.info(f"Evicted model client {evicted_key[:3]}")
+            return client
+
+    def clear(self) -> None:
+        with self._lock:
+            self._clients.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._clients),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "clients": [list(key[:3]) for key in self._clients],
+            }
+
+
+client_pool = ClientPool()
+
+
+def get_model_client(provider: str, client_class: Callable[..., Any], **init_kwargs) -> Any:
+    """
+    Return the shared client for a provider, constructing it on first use.
+
+    Args:
+        provider (str): Provider name, used to find the endpoint and credential variables.
+        client_class: The client class or factory to call with init_kwargs.
+        **init_kwargs: Constructor arguments; clients built with different arguments are
+            kept apart.
+
+    Returns:
+        The shared client instance.
+    """
+    key = make_client_key(provider, client_class, init_kwargs)
+    return client_pool.get_or_create(key, lambda: client_class(**init_kwargs))
@@ -0,0 +1,212 @@
+"""Structure-aware, token-sized chunking of source files and documentation.
+
+The word-based TextSplitter cuts every file into fixed windows with a large overlap,
+so functions are split mid-body and a third of every vector repeats its neighbour.
+Chunks here follow the structure of the file instead:
+
+- code and configuration files are split at top-level blocks (functions, classes,
+  statements separated by blank lines); a block that is too large is split again at
+  the next indentation level, and only then into line windows,
+- a single line over the budget (minified JavaScript, JSON, SQL dumps) is cut into
+  pieces of at most the budget,
+- markdown is split at headings, ignoring fenced code blocks,
+- consecutive small blocks are packed together up to the token budget.
+
+Sizes are measured with the active embedder's tokenizer, supplied by the caller as a
+function counting the tokens of many lines at once.
+"""
+
+import logging
+import re
+from dataclasses import dataclass
+from typing import Callable, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+MARKDOWN_EXTENSIONS = {"md", "mdx", "markdown"}
+
+_HEADING = re.compile(r"^\s{0,3}#{1,6}\s")
+_FENCE = re.compile(r"^\s*(```|~~~)")
+# Lines that close a block rather than open one
+_CLOSING = re.compile(r"^(\}|\)|\]|end\b|fi\b|done\b|esac\b|</)")
+
+
+@dataclass
+class Chunk:
+    """
+    A piece of a file, with its 1-based inclusive line range.
+
+    whole_lines is False when the chunk starts or ends inside a line that was too long
+    for one chunk.
+    """
+    text: str
+    start_line: int
+    end_line: int
+    num_tokens: int
+    whole_lines: bool = True
+
+
+def _indent(line: str) -> int:
+    return len(line) - len(line.lstrip())
+
+
+def _code_boundaries(lines: Sequence[str]) -> List[int]:
+    """
+    Return the indices where a block starts at the shallowest indentation level.
+
+    A block starts at a line at that level that does not close a previous block and
+    follows a blank line or a closing line, so comments and decorators stay attached
+    to the definition below them.
+    """
+    levels = [_indent(line) for line in lines if line.strip()]
+    if not levels:
+        return [0]
+    base = min(levels)
+    boundaries = [0]
+    previous = None
+    for i, line in enumerate(lines):
+        if not line.strip():
+            previous = ""
+            continue
+        stripped = line.strip()
+        if i and _indent(line) == base and not _CLOSING.match(stripped) and previous is not None:
+            if previous == "" or (_indent(previous) == base and _CLOSING.match(previous.strip())):
+                if boundaries[-1] != i:
+                    boundaries.append(i)
+        previous = line
+    return boundaries
+
+
+def _markdown_boundaries(lines: Sequence[str]) -> List[int]:
+    """Return the indices of heading lines outside fenced code blocks."""
+    boundaries = [0]
+    in_fence = False
+    for i, line in enumerate(lines):
+        if _FENCE.match(line):
+            in_fence = not in_fence
+        elif not in_fence and i and _HEADING.match(line):
+            boundaries.append(i)
+    return boundaries
+
+
+class CodeSplitter:
+    """
+    Split file contents into chunks of at most chunk_tokens tokens along their structure.
+
+    Args:
+        count_tokens (Callable): Returns the token count of each of a list of lines.
+        chunk_tokens (int): Token budget of one chunk.
+        overlap_tokens (int): Tokens repeated between consecutive line windows, used only
+            when a block has no structure left to split on.
+    """
+
+    def __init__(self, count_tokens: Callable[[List[str]], List[int]], chunk_tokens: int = 512,
+                 overlap_tokens: int = 32):
+        self.count_tokens = count_tokens
+        self.chunk_tokens = max(1, chunk_tokens)
+        self.overlap_tokens = max(0, min(overlap_tokens, self.chunk_tokens // 2))
+
+    def split(self, text: str, extension: str = "") -> List[Chunk]:
+        """
+        Split a file's text into chunks.
+
+        Args:
+            text (str): The file contents.
+            extension (str): The file extension without the dot, selecting markdown or code rules.
+
+        Returns:
+            List[Chunk]: Chunks in file order; blank-only files give no chunks.
+        """
+        lines = text.splitlines(keepends=True)
+        if not lines or not text.strip():
+            return []
+        markdown = extension.lower() in MARKDOWN_EXTENSIONS
+        # From here on "lines" are segments: whole lines, or pieces of an over-budget line
+        lines, tokens, line_numbers = self._cut_long_lines(lines, self.count_tokens(lines))
+
+        spans: List[Tuple[int, int]] = []
+        boundaries = _markdown_boundaries(lines) if markdown else _code_boundaries(lines)
+        for start, end in zip(boundaries, boundaries[1:] + [len(lines)]):
+            self._split_block(lines, tokens, start, end, spans, nested=not markdown)
+        return [self._chunk(lines, tokens, line_numbers, start, end) for start, end in self._pack(tokens, spans)
+                if "".join(lines[start:end]).strip()]
+
+    def _cut_long_lines(self, lines, tokens) -> Tuple[List[str], List[int], List[int]]:
+        """Cut lines over the budget into pieces, returning segments, their sizes and line indices."""
+        segments, sizes, line_numbers = [], [], []
+        for number, (line, size) in enumerate(zip(lines, tokens)):
+            pieces = self._cut_line(line, size) if size > self.chunk_tokens else [(line, size)]
+            for piece, piece_size in pieces:
+                segments.append(piece)
+                sizes.append(piece_size)
+                line_numbers.append(number)
+        return segments, sizes, line_numbers
+
+    def _cut_line(self, line: str, num_tokens: int) -> List[Tuple[str, int]]:
+        """Cut a line into consecutive pieces of at most chunk_tokens tokens."""
+        width = max(1, len(line) * self.chunk_tokens // max(num_tokens, 1))
+        pieces = [line[i:i + width] for i in range(0, len(line), width)]
+        result = []
+        for piece, size in zip(pieces, self.count_tokens(pieces)):
+            if size > self.chunk_tokens and len(piece) > 1:
+                # Tokens are unevenly spread over the line; cut this piece finer
+                result.extend(self._cut_line(piece, size))
+            else:
+                result.append((piece, size))
+        return result
+
+    def _split_block(self, lines, tokens, start, end, spans, nested: bool) -> None:
+        """Append the spans of one block, splitting it further while it exceeds the budget."""
+        if sum(tokens[start:end]) <= self.chunk_tokens:
+            spans.append((start, end))
+            return
+        if nested and end - start > 2:
+            # Keep the header line with the first nested block, split the body on its own level
+            body = _code_boundaries(lines[start + 1:end])
+            if len(body) > 1:
+                starts = [start] + [start + 1 + b for b in body[1:]]
+                for sub_start, sub_end in zip(starts, starts[1:] + [end]):
+                    self._split_block(lines, tokens, sub_start, sub_end, spans, nested)
+                return
+        spans.extend(self._windows(tokens, start, end))
+
+    def _windows(self, tokens, start, end) -> List[Tuple[int, int]]:
+        """Cut a block into overlapping line windows within the budget."""
+        windows = []
+        i = start
+        while i < end:
+            j, size = i, 0
+            while j < end and (j == i or size + tokens[j] <= self.chunk_tokens):
+                size += tokens[j]
+                j += 1
+            windows.append((i, j))
+            if j >= end:
+                break
+            # Step back over up to overlap_tokens of trailing lines, always moving forward
+            k, overlap = j, 0
+            while self.overlap_tokens and k - 1 > i and overlap + tokens[k - 1] <= self.overlap_tokens:
+                k -= 1
+                overlap += tokens[k]
+            i = k
+        return windows
+
+    def _pack(self, tokens, spans: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        """Merge consecutive non-overlapping spans while they fit the budget together."""
+        packed: List[Tuple[int, int]] = []
+        size = 0
+        for start, end in spans:
+            span_size = sum(tokens[start:end])
+            if packed and packed[-1][1] == start and size + span_size <= self.chunk_tokens:
+                packed[-1] = (packed[-1][0], end)
+                size += span_size
+            else:
+                packed.append((start, end))
+                size = span_size
+        return packed
+
+    def _chunk(self, lines, tokens, line_numbers, start, end) -> Chunk:
+        whole_lines = ((start == 0 or line_numbers[start - 1] != line_numbers[start])
+                       and (end == len(lines) or line_numbers[end] != line_numbers[end - 1]))
+        return Chunk(text="".join(lines[start:end]), start_line=line_numbers[start] + 1,
+                     end_line=line_numbers[end - 1] + 1, num_tokens=sum(tokens[start:end]),
+                     whole_lines=whole_lines)
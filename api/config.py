@@ -157,14 +157,17 @@ def load_embedder_config():
 
     return embedder_config
 
-def get_embedder_config():
+def get_embedder_config(embedder_type: str = None):
     """
-    Get the current embedder configuration based on DEEPWIKI_EMBEDDER_TYPE.
+    Get the embedder configuration for an embedder type.
+
+    Args:
+        embedder_type (str, optional): 'openai', 'google' or 'ollama'. Defaults to DEEPWIKI_EMBEDDER_TYPE.
 
     Returns:
         dict: The embedder configuration with model_client resolved
     """
-    embedder_type = EMBEDDER_TYPE
+    embedder_type = embedder_type or EMBEDDER_TYPE
     if embedder_type == 'google' and 'embedder_google' in configs:
         return configs.get("embedder_google", {})
     elif embedder_type == 'ollama' and 'embedder_ollama' in configs:
@@ -313,10 +316,11 @@ lang_config = load_lang_config()
 if generator_config:
     configs["default_provider"] = generator_config.get("default_provider", "google")
     configs["providers"] = generator_config.get("providers", {})
+    configs["context_budget"] = generator_config.get("context_budget", {})
 
 # Update embedder configuration
 if embedder_config:
-    for key in ["embedder", "embedder_ollama", "embedder_google", "retriever", "text_splitter"]:
+    for key in ["embedder", "embedder_ollama", "embedder_google", "retriever", "text_splitter", "code_splitter", "vector_index", "hybrid_retrieval"]:
         if key in embedder_config:
             configs[key] = embedder_config[key]
 
@@ -385,3 +389,24 @@ def get_model_config(provider="google", model=None):
         result["model_kwargs"] = {"model": model, **model_params}
 
     return result
+
+
+def get_context_budget(provider: str, model: str = None) -> int:
+    """
+    Return the number of retrieved-context tokens to send to a model.
+
+    Args:
+        provider (str): Model provider
+        model (str): Model name, or None for the provider's default model
+
+    Returns:
+        int: Token budget, from the "context_budget" section of generator.json
+    """
+    from api.context_builder import context_token_budget
+
+    try:
+        model_kwargs = get_model_config(provider, model)["model_kwargs"]
+    except (ValueError, KeyError):
+        model_kwargs = {}
+    return context_token_budget(provider, model_kwargs.get("model", model), model_kwargs,
+                                configs.get("context_budget"))
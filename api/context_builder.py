@@ -0,0 +1,193 @@
+"""Token-budgeted assembly of retrieved chunks into prompt context.
+
+The chat handlers used to concatenate the full text of every retrieved chunk, grouped
+by file. Neighbouring chunks of the same file overlap (the word splitter repeats 100
+words between chunks) and the same chunk can be retrieved twice, so prompts carried
+large duplicated spans and could exceed the model's context window. Here:
+
+- exact duplicates are dropped,
+- chunks of the same file that overlap or touch are merged into one span, using
+  their line ranges when the splitter recorded them and their shared text otherwise,
+- spans are added in relevance order (the best rank of their chunks) while they fit
+  the token budget of the model,
+- the selected spans are rendered grouped by file, in line order within a file.
+
+Budgets come from the "context_budget" section of generator.json.
+"""
+
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Defaults for the "context_budget" section of generator.json
+DEFAULT_BUDGET_CONFIG = {
+    # Context tokens for models without a specific budget
+    "default_tokens": 8000,
+    # Share of an Ollama model's num_ctx the context may use
+    "num_ctx_fraction": 0.5,
+    # Budgets by provider and by model name; a model budget wins over its provider's
+    "providers": {},
+    "models": {},
+}
+
+
+@dataclass
+class ContextSpan:
+    """Contiguous text of one file, merged from one or more retrieved chunks."""
+    file_path: str
+    text: str
+    rank: int
+    start_line: Optional[int] = None
+    end_line: Optional[int] = None
+    parent_doc_id: Optional[str] = None
+    order: Optional[int] = None
+
+
+def context_token_budget(provider: str, model: str, model_kwargs: Dict[str, Any] = None,
+                         config: Dict[str, Any] = None) -> int:
+    """
+    Return the number of context tokens a model may receive.
+
+    Args:
+        provider (str): Provider name, e.g. "openai" or "ollama".
+        model (str): Model name.
+        model_kwargs (dict, optional): Resolved model settings; an Ollama num_ctx caps the budget.
+        config (dict, optional): The "context_budget" section of generator.json.
+    """
+    config = {**DEFAULT_BUDGET_CONFIG, **(config or {})}
+    budget = config["models"].get(model) or config["providers"].get(provider) or config["default_tokens"]
+    num_ctx = (model_kwargs or {}).get("num_ctx")
+    if num_ctx:
+        budget = min(budget, int(num_ctx * config["num_ctx_fraction"]))
+    return int(budget)
+
+
+def _approximate_tokens(text: str) -> int:
+    return len(text) // 4
+
+
+def _join_overlapping(first: str, second: str) -> Optional[str]:
+    """Join two texts whose end and start overlap, or return None if they do not."""
+    if second in first:
+        return first
+    probe = second[:16]
+    start = first.find(probe)
+    while start != -1:
+        if second.startswith(first[start:]):
+            return first + second[len(first) - start:]
+        start = first.find(probe, start + 1)
+    return None
+
+
+def _merge_by_lines(spans: List[ContextSpan]) -> List[ContextSpan]:
+    merged: List[ContextSpan] = []
+    for span in sorted(spans, key=lambda s: (s.start_line, s.end_line)):
+        last = merged[-1] if merged else None
+        if last is not None and span.start_line <= last.end_line + 1:
+            if span.end_line > last.end_line:
+                extra = span.text.splitlines(keepends=True)[last.end_line + 1 - span.start_line:]
+                separator = "" if last.text.endswith("\n") or not extra else "\n"
+                last.text = last.text + separator + "".join(extra)
+                last.end_line = span.end_line
+            last.rank = min(last.rank, span.rank)
+        else:
+            merged.append(ContextSpan(**vars(span)))
+    return merged
+
+
+def _merge_by_order(spans: List[ContextSpan]) -> List[ContextSpan]:
+    merged: List[ContextSpan] = []
+    for span in sorted(spans, key=lambda s: (str(s.parent_doc_id), s.order if s.order is not None else -1)):
+        last = merged[-1] if merged else None
+        if (last is not None and span.parent_doc_id is not None and last.parent_doc_id == span.parent_doc_id
+                and span.order is not None and last.order is not None and span.order == last.order + 1):
+            joined = _join_overlapping(last.text, span.text)
+            if joined is not None:
+                last.text = joined
+                last.order = span.order
+                last.rank = min(last.rank, span.rank)
+                continue
+        merged.append(ContextSpan(**vars(span)))
+    return merged
+
+
+def merge_chunks(documents: Sequence[Any]) -> List[ContextSpan]:
+    """
+    Deduplicate retrieved chunks and merge the overlapping or adjacent ones of each file.
+
+    Args:
+        documents (Sequence[Document]): Retrieved chunks, most relevant first.
+
+    Returns:
+        List[ContextSpan]: Merged spans, each ranked by its most relevant chunk.
+    """
+    seen = set()
+    by_file: Dict[str, List[ContextSpan]] = {}
+    for rank, doc in enumerate(documents):
+        meta_data = getattr(doc, "meta_data", None) or {}
+        file_path = meta_data.get("file_path", "unknown")
+        text = getattr(doc, "text", None) or ""
+        digest = hashlib.sha1(f"{file_path}\0{text.strip()}".encode("utf-8", errors="surrogatepass")).digest()
+        if not text.strip() or digest in seen:
+            continue
+        seen.add(digest)
+        by_file.setdefault(file_path, []).append(ContextSpan(
+            file_path=file_path, text=text, rank=rank,
+            start_line=meta_data.get("start_line"), end_line=meta_data.get("end_line"),
+            parent_doc_id=getattr(doc, "parent_doc_id", None), order=getattr(doc, "order", None),
+        ))
+
+    merged = []
+    for spans in by_file.values():
+        with_lines = [s for s in spans if s.start_line is not None and s.end_line is not None]
+        without_lines = [s for s in spans if s.start_line is None or s.end_line is None]
+        merged.extend(_merge_by_lines(with_lines))
+        merged.extend(_merge_by_order(without_lines))
+    return merged
+
+
+def build_context(documents: Sequence[Any], token_budget: int,
+                  count_tokens: Callable[[str], int] = _approximate_tokens) -> str:
+    """
+    Render retrieved chunks as prompt context within a token budget.
+
+    Args:
+        documents (Sequence[Document]): Retrieved chunks, most relevant first.
+        token_budget (int): Maximum tokens of chunk text to include.
+        count_tokens (Callable, optional): Token counter for the target model.
+
+    Returns:
+        str: The context, in the "## File Path: ..." layout used by the chat prompts,
+        or an empty string if there is nothing to include.
+    """
+    spans = sorted(merge_chunks(documents), key=lambda s: s.rank)
+    selected = []
+    used = 0
+    for span in spans:
+        tokens = count_tokens(span.text)
+        if used + tokens > token_budget:
+            if selected:
+                continue
+            # Keep a prefix of the most relevant span rather than sending no context at all
+            span.text = span.text[:max(0, len(span.text) * (token_budget - used) // max(tokens, 1))]
+            tokens = token_budget - used
+        selected.append(span)
+        used += tokens
+
+    by_file: Dict[str, List[ContextSpan]] = {}
+    for span in sorted(selected, key=lambda s: s.rank):
+        by_file.setdefault(span.file_path, []).append(span)
+    context_parts = []
+    for file_path, file_spans in by_file.items():
+        file_spans.sort(key=lambda s: (s.start_line or 0, s.order if s.order is not None else 0))
+        content = "\n\n".join(span.text for span in file_spans)
+        context_parts.append(f"## File Path: {file_path}\n\n{content}")
+
+    logger.info(f"Context: {len(documents)} chunks merged into {len(spans)} spans, "
+                f"{len(selected)} included ({used}/{token_budget} tokens)")
+    if not context_parts:
+        return ""
+    return "\n\n" + "-" * 10 + "\n\n".join(context_parts)
@@ -0,0 +1,207 @@
+"""Persistent, content-addressed cache of chunk embeddings.
+
+Embeddings are keyed by a hash of the chunk text and the embedding model settings
+(client, model, dimensions, task type), so identical chunks found in forks, branches,
+vendored copies or re-indexes of a repository are embedded only once. The cache is a
+single SQLite file shared by every repository and bounded by an approximate size
+budget, evicting the least recently used vectors first.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Location of the cache database, next to the repository databases by default
+DEFAULT_PATH = os.environ.get(
+    "DEEPWIKI_EMBEDDING_CACHE_PATH",
+    os.path.join(os.path.expanduser("~"), ".adalflow", "embedding_cache.sqlite3"),
+)
+# Size budget of the stored vectors in megabytes, 0 disables the cache
+DEFAULT_MAX_MB = int(os.environ.get("DEEPWIKI_EMBEDDING_CACHE_MB", 1024))
+
+# SQLite limits the number of bound parameters per statement
+_QUERY_CHUNK = 500
+
+
+def make_namespace(client: str, model: str, dimensions: Any = None, task_type: str = None) -> str:
+    """Describe the embedding settings that make two vectors of the same text comparable."""
+    return f"{client}|{model}|{dimensions or ''}|{task_type or ''}"
+
+
+def make_key(namespace: str, text: str) -> str:
+    """Return the content address of a chunk embedded with the given settings."""
+    digest = hashlib.sha256()
+    digest.update(namespace.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(text.encode("utf-8", errors="surrogatepass"))
+    return digest.hexdigest()
+
+
+def _pack(vector: Iterable[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _unpack(blob: bytes) -> List[float]:
+    values = array("f")
+    values.frombytes(blob)
+    return values.tolist()
+
+
+class EmbeddingCache:
+    """
+    SQLite-backed map from content address to embedding vector.
+
+    Vectors are stored as float32. When the stored size exceeds the budget, the least
+    recently used entries are removed until the cache is back under 90% of it.
+    All operations are thread-safe.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024,
+                 clock: Callable[[], float] = time.time):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, nbytes INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM embeddings").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """
+        Look up several keys at once.
+
+        Returns:
+            Dict[str, List[float]]: The vectors found, by key. Missing keys are absent.
+        """
+        unique_keys = list(dict.fromkeys(keys))
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            for start in range(0, len(unique_keys), _QUERY_CHUNK):
+                chunk = unique_keys[start:start + _QUERY_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = _unpack(blob)
+                if rows:
+                    now = self._clock()
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key, _ in rows]
+                    )
+            self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(unique_keys) - len(found)
+        return found
+
+    def put_many(self, vectors: Dict[str, Iterable[float]]) -> None:
+        """Store vectors by key, then evict old entries if the budget is exceeded."""
+        if not vectors:
+            return
+        now = self._clock()
+        rows = []
+        for key, vector in vectors.items():
+            blob = _pack(vector)
+            rows.append((key, blob, len(blob), now))
+        with self._lock:
+            for start in range(0, len(rows), _QUERY_CHUNK):
+                chunk = rows[start:start + _QUERY_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                replaced = self._conn.execute(
+                    f"SELECT COALESCE(SUM(nbytes), 0) FROM embeddings WHERE key IN ({placeholders})",
+                    [row[0] for row in chunk],
+                ).fetchone()[0]
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, nbytes, last_used) VALUES (?, ?, ?, ?)", chunk
+                )
+                self._total_bytes += sum(row[2] for row in chunk) - replaced
+            self.writes += len(rows)
+            if self._total_bytes > self.max_bytes:
+                self._evict(int(self.max_bytes * 0.9))
+            self._conn.commit()
+
+    def _evict(self, target_bytes: int) -> None:
+        """Remove least recently used entries until the cache holds at most target_bytes."""
+        cursor = self._conn.execute("SELECT key, nbytes FROM embeddings ORDER BY last_used ASC, rowid ASC")
+        stale = []
+        freed = 0
+        for key, nbytes in cursor:
+            if self._total_bytes - freed <= target_bytes:
+                break
+            stale.append((key,))
+            freed += nbytes
+        self._conn.executemany("DELETE FROM embeddings WHERE key = ?", stale)
+        self._total_bytes -= freed
+        self.evictions += len(stale)
+        logger.info(f"Evicted {len(stale)} cached embeddings ({freed} bytes)")
+
+    def clear(self) -> None:
+        """Remove all entries without touching the counters."""
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self._total_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the cache counters and current occupancy."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "path": self.path,
+                "entries": entries,
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_embedding_cache: Optional[EmbeddingCache] = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """
+    Return the process-wide embedding cache, opening it on first use.
+
+    Returns:
+        Optional[EmbeddingCache]: The cache, or None if it is disabled or cannot be opened.
+    """
+    global _embedding_cache
+    if DEFAULT_MAX_MB <= 0:
+        return None
+    with _embedding_cache_lock:
+        if _embedding_cache is None:
+            try:
+                _embedding_cache = EmbeddingCache()
+            except sqlite3.Error as e:
+                logger.warning(f"Embedding cache disabled, could not open {DEFAULT_PATH}: {e}")
+                return None
+        return _embedding_cache
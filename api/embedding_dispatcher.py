@@ -0,0 +1,207 @@
+"""Token-budgeted, concurrent dispatch of embedding requests.
+
+Embedding a repository used to mean sending fixed-size batches one after another, so
+ingestion time grew with the number of round trips rather than with the provider's
+quota. The dispatcher instead:
+
+- packs consecutive chunks into batches bounded by a token budget and an item count,
+- keeps several batches in flight on a thread pool,
+- paces requests with a shared requests/tokens-per-minute limiter,
+- retries transient failures with exponential backoff, and splits a batch that the
+  provider rejects so only the offending chunks are dropped.
+
+The embedding call itself is supplied by the caller, which keeps this module free of
+provider SDKs.
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Batches in flight at once, per dispatch
+EMBED_CONCURRENCY = int(os.environ.get("DEEPWIKI_EMBED_CONCURRENCY", 4))
+# Attempts per batch for transient failures (rate limits, timeouts, 5xx)
+EMBED_MAX_RETRIES = int(os.environ.get("DEEPWIKI_EMBED_MAX_RETRIES", 4))
+
+_TRANSIENT_NAMES = ("Timeout", "Connection", "RateLimit", "ResourceExhausted", "ServiceUnavailable",
+                    "DeadlineExceeded", "InternalServerError", "TooManyRequests")
+
+
+class EmbeddingBatchError(Exception):
+    """Raised when a provider answers a batch without one vector per input."""
+    pass
+
+
+def is_transient_error(error: Exception) -> bool:
+    """Tell whether a failed request is worth retrying as is."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status in (408, 409, 429) or status >= 500
+    return any(name in type(error).__name__ for name in _TRANSIENT_NAMES)
+
+
+def pack_batches(token_counts: Sequence[int], max_tokens: int, max_items: int) -> List[Tuple[int, int]]:
+    """
+    Split consecutive inputs into batches within a token budget and an item limit.
+
+    An input larger than the budget on its own gets a batch to itself.
+
+    Returns:
+        List[Tuple[int, int]]: (start, end) index ranges covering all inputs in order.
+    """
+    batches = []
+    start = 0
+    batch_tokens = 0
+    for i, tokens in enumerate(token_counts):
+        if i > start and (batch_tokens + tokens > max_tokens or i - start >= max_items):
+            batches.append((start, i))
+            start, batch_tokens = i, 0
+        batch_tokens += tokens
+    if start < len(token_counts):
+        batches.append((start, len(token_counts)))
+    return batches
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket pacing requests and tokens per minute.
+
+    Both budgets refill continuously; 0 disables a budget. A request larger than the
+    whole per-minute budget waits for a full bucket instead of forever.
+    """
+
+    def __init__(self, requests_per_minute: int = 0, tokens_per_minute: int = 0,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated = clock()
+
+    def acquire(self, tokens: int = 0) -> float:
+        """
+        Block until one request of the given size fits both budgets, then consume it.
+
+        Returns:
+            float: The seconds spent waiting.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                elapsed = now - self._updated
+                self._updated = now
+                if self.requests_per_minute:
+                    self._requests = min(self.requests_per_minute,
+                                         self._requests + elapsed * self.requests_per_minute / 60)
+                if self.tokens_per_minute:
+                    self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+                cost = min(tokens, self.tokens_per_minute)
+                delay = 0.0
+                if self.requests_per_minute and self._requests < 1:
+                    delay = max(delay, (1 - self._requests) * 60 / self.requests_per_minute)
+                if self.tokens_per_minute and self._tokens < cost:
+                    delay = max(delay, (cost - self._tokens) * 60 / self.tokens_per_minute)
+                if delay <= 0:
+                    if self.requests_per_minute:
+                        self._requests -= 1
+                    if self.tokens_per_minute:
+                        self._tokens -= cost
+                    return waited
+            self._sleep(delay)
+            waited += delay
+
+
+_rate_limiters: Dict[Tuple[str, int, int], RateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(name: str, requests_per_minute: int = 0, tokens_per_minute: int = 0) -> Optional[RateLimiter]:
+    """
+    Return the limiter shared by every dispatch against the same provider quota.
+
+    Returns:
+        Optional[RateLimiter]: The limiter, or None if both budgets are disabled.
+    """
+    if not requests_per_minute and not tokens_per_minute:
+        return None
+    key = (name, requests_per_minute, tokens_per_minute)
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(key)
+        if limiter is None:
+            limiter = _rate_limiters[key] = RateLimiter(requests_per_minute, tokens_per_minute)
+        return limiter
+
+
+def dispatch_embeddings(texts: Sequence[str], token_counts: Sequence[int],
+                        embed_batch: Callable[[List[str]], List[List[float]]],
+                        max_batch_tokens: int, max_batch_size: int,
+                        max_concurrency: int = EMBED_CONCURRENCY, rate_limiter: RateLimiter = None,
+                        max_retries: int = EMBED_MAX_RETRIES, backoff_base: float = 1.0,
+                        sleep: Callable[[float], None] = time.sleep) -> List[Optional[List[float]]]:
+    """
+    Embed texts with token-budgeted batches running concurrently.
+
+    Args:
+        texts (Sequence[str]): The texts to embed.
+        token_counts (Sequence[int]): Token count of each text, used for packing and pacing.
+        embed_batch (Callable): Embeds a list of texts and returns one vector per text.
+        max_batch_tokens (int): Token budget of one request.
+        max_batch_size (int): Maximum number of texts in one request.
+        max_concurrency (int): Requests in flight at once.
+        rate_limiter (RateLimiter, optional): Pacing shared with other dispatches.
+        max_retries (int): Attempts per batch for transient failures.
+        backoff_base (float): First retry delay in seconds, doubled on every attempt.
+
+    Returns:
+        List[Optional[List[float]]]: One vector per text, None where embedding failed.
+    """
+    results: List[Optional[List[float]]] = [None] * len(texts)
+    max_retries = max(1, max_retries)
+
+    def run(start: int, end: int) -> None:
+        batch = list(texts[start:end])
+        for attempt in range(max_retries):
+            if rate_limiter is not None:
+                rate_limiter.acquire(sum(token_counts[start:end]))
+            try:
+                vectors = embed_batch(batch)
+                if len(vectors) != len(batch):
+                    raise EmbeddingBatchError(f"Got {len(vectors)} embeddings for {len(batch)} inputs")
+                results[start:end] = vectors
+                return
+            except Exception as e:
+                if not is_transient_error(e):
+                    if end - start > 1:
+                        # Split the batch so only the chunks the provider rejects are lost
+                        logger.warning(f"Embedding batch [{start}, {end}) rejected ({e}), splitting it")
+                        middle = (start + end) // 2
+                        run(start, middle)
+                        run(middle, end)
+                    else:
+                        logger.error(f"Embedding of chunk {start} rejected, skipping it: {e}")
+                    return
+                if attempt == max_retries - 1:
+                    logger.error(f"Embedding batch [{start}, {end}) failed after {max_retries} attempts: {e}")
+                    return
+                delay = backoff_base * (2 ** attempt) * (1 + random.random() / 2)
+                logger.warning(f"Embedding batch [{start}, {end}) failed ({e}), retrying in {delay:.1f}s")
+                sleep(delay)
+
+    batches = pack_batches(token_counts, max_batch_tokens, max_batch_size)
+    logger.info(f"Embedding {len(texts)} chunks in {len(batches)} batches, {max_concurrency} in flight")
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="deepwiki-embed") as executor:
+        for future in [executor.submit(run, start, end) for start, end in batches]:
+            future.result()
+    return results
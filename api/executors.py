@@ -0,0 +1,118 @@
+"""Bounded executors for blocking work started from async request handlers.
+
+Preparing a retriever (cloning, reading files, embedding, loading the database and
+building the FAISS index) and answering a retrieval query are synchronous. Run inline
+in a websocket or streaming handler they freeze the event loop, and with it every other
+connection served by the worker. They are run on dedicated thread pools instead:
+
+    "index"      few workers for retriever preparation, which may take minutes
+    "retrieval"  more workers for query embedding and vector search, which are short
+
+Keeping the pools apart means a burst of indexing can never starve quick queries.
+Concurrent preparations of the same repository are collapsed with SingleFlight.
+"""
+
+import asyncio
+import functools
+import logging
+import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+logger = logging.getLogger(__name__)
+
+# Concurrent retriever preparations per process
+INDEX_WORKERS = int(os.environ.get("DEEPWIKI_INDEX_WORKERS", 2))
+# Concurrent retrieval queries per process
+RETRIEVAL_WORKERS = int(os.environ.get("DEEPWIKI_RETRIEVAL_WORKERS", 8))
+
+_POOL_SIZES = {"index": INDEX_WORKERS, "retrieval": RETRIEVAL_WORKERS}
+_executors: Dict[str, ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(name: str) -> ThreadPoolExecutor:
+    """Return the named thread pool ("index" or "retrieval"), creating it on first use."""
+    if name not in _POOL_SIZES:
+        raise ValueError(f"Unknown executor: {name}")
+    with _executors_lock:
+        executor = _executors.get(name)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=max(1, _POOL_SIZES[name]),
+                                          thread_name_prefix=f"deepwiki-{name}")
+            _executors[name] = executor
+        return executor
+
+
+async def run_blocking(name: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Run a blocking function on a named executor without blocking the event loop.
+
+    Args:
+        name (str): "index" or "retrieval".
+        func (Callable): The function to call.
+        *args, **kwargs: Its arguments.
+
+    Returns:
+        The function's return value; its exceptions are re-raised.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(name), functools.partial(func, *args, **kwargs))
+
+
+def shutdown_executors() -> None:
+    """Stop accepting work and release the pools; running jobs are not interrupted."""
+    with _executors_lock:
+        for executor in _executors.values():
+            executor.shutdown(wait=False)
+        _executors.clear()
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls with the same key into a single execution.
+
+    The first caller starts the work; callers arriving while it runs await the same
+    result or exception. The work is shielded from cancellation, so a caller that
+    disconnects does not abort it for the others. Flights are tracked per event loop.
+    """
+
+    def __init__(self):
+        self._flights: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Hashable, asyncio.Future]]" = \
+            weakref.WeakKeyDictionary()
+        self.started = 0
+        self.joined = 0
+
+    def in_flight(self) -> int:
+        """Return the number of running flights in the current event loop."""
+        return len(self._flights.get(asyncio.get_running_loop(), {}))
+
+    async def run(self, key: Hashable, work: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Await the flight for key, starting it with work() if none is running.
+
+        Args:
+            key (Hashable): Identifies the work, e.g. a repository and its filters.
+            work (Callable): Returns the awaitable to run when starting a new flight.
+        """
+        flights = self._flights.setdefault(asyncio.get_running_loop(), {})
+        future = flights.get(key)
+        if future is not None:
+            self.joined += 1
+            logger.info(f"Joining in-flight work for {key!r}")
+        else:
+            self.started += 1
+            future = asyncio.ensure_future(work())
+            flights[key] = future
+
+            def _done(finished: asyncio.Future) -> None:
+                if flights.get(key) is finished:
+                    del flights[key]
+                # Mark the outcome as retrieved even if every caller went away
+                if not finished.cancelled():
+                    finished.exception()
+
+            future.add_done_callback(_done)
+        return await asyncio.shield(future)
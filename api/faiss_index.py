@@ -0,0 +1,346 @@
+"""Construction and persistence of the FAISS index built over a repository's vector store.
+
+Small repositories use an exact flat index. Larger ones switch to approximate indexes,
+chosen by chunk count: HNSW graphs, then IVF-PQ for very large repositories, with their
+recall knobs (efSearch, nprobe) read from the "vector_index" section of embedder.json.
+
+The index is written next to the vector store as {base}.faiss, with a small JSON
+sidecar holding a format version and a fingerprint of the data it was built from.
+A saved index is reused only when the fingerprint still matches, and is read with
+faiss' mmap flags so the vectors are not copied into process memory.
+
+Running this module prints a recall-vs-latency report for a stored repository:
+
+    python -m api.faiss_index ~/.adalflow/databases/{owner}_{repo}
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_FORMAT_VERSION = 1
+
+# Defaults for the "vector_index" section of embedder.json
+DEFAULT_INDEX_CONFIG = {
+    # "auto", "flat", "hnsw" or "ivfpq"
+    "type": "auto",
+    # Chunk counts from which "auto" switches to HNSW and to IVF-PQ
+    "hnsw_min_chunks": 20000,
+    "ivfpq_min_chunks": 500000,
+    # HNSW graph degree and build/search beam widths
+    "hnsw_m": 32,
+    "ef_construction": 200,
+    "ef_search": 128,
+    # IVF lists (None: 4 * sqrt(chunks)), lists probed per query, PQ sub-quantizers (None: dim / 8)
+    "nlist": None,
+    "nprobe": 32,
+    "pq_m": None,
+    "pq_nbits": 8,
+}
+
+# Settings that only affect searching, not the stored index
+_SEARCH_SETTINGS = {"ef_search", "nprobe"}
+
+
+def index_paths(base_path: str) -> Dict[str, str]:
+    """Return the paths of the index file and its metadata sidecar."""
+    return {
+        "index": f"{base_path}.faiss",
+        "meta": f"{base_path}.faiss.json",
+    }
+
+
+def index_fingerprint(store_header: Dict[str, Any], **settings: Any) -> str:
+    """
+    Fingerprint the data and settings an index is built from.
+
+    Args:
+        store_header (dict): Header of the vector store the index covers.
+        **settings: Index settings that change its contents (metric, index type, ...).
+
+    Returns:
+        str: A hex digest that changes whenever the index would have to be rebuilt.
+    """
+    payload = {
+        "format": INDEX_FORMAT_VERSION,
+        "faiss": faiss.__version__,
+        "store": store_header,
+        "settings": settings,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def resolve_index_config(config: Dict[str, Any] = None) -> Dict[str, Any]:
+    """Merge a "vector_index" configuration section over the defaults."""
+    return {**DEFAULT_INDEX_CONFIG, **(config or {})}
+
+
+def choose_index_type(num_vectors: int, config: Dict[str, Any]) -> str:
+    """
+    Pick the index type for a repository of num_vectors chunks.
+
+    Returns:
+        str: "flat", "hnsw" or "ivfpq".
+    """
+    index_type = config.get("type", "auto")
+    if index_type != "auto":
+        return index_type
+    if num_vectors >= config["ivfpq_min_chunks"]:
+        return "ivfpq"
+    if num_vectors >= config["hnsw_min_chunks"]:
+        return "hnsw"
+    return "flat"
+
+
+def build_settings(num_vectors: int, dim: int, config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Resolve the settings that determine the contents of the index.
+
+    These are part of the index fingerprint; search-time knobs are not, so tuning
+    them never forces a rebuild.
+    """
+    index_type = choose_index_type(num_vectors, config)
+    if index_type == "ivfpq" and num_vectors < 39 * 2 ** config["pq_nbits"]:
+        # Too few vectors to train the product quantizer codebooks
+        logger.warning(f"{num_vectors} chunks are too few for an IVF-PQ index, using a flat index")
+        index_type = "flat"
+    settings = {"type": index_type}
+    if index_type == "hnsw":
+        settings.update(hnsw_m=config["hnsw_m"], ef_construction=config["ef_construction"])
+    elif index_type == "ivfpq":
+        # Keep at least ~39 training points per list, as faiss recommends
+        nlist = config["nlist"] or int(4 * math.sqrt(num_vectors))
+        nlist = max(1, min(nlist, num_vectors // 39))
+        pq_m = config["pq_m"] or max(m for m in range(1, max(1, dim // 8) + 1) if dim % m == 0)
+        settings.update(nlist=nlist, pq_m=pq_m, pq_nbits=config["pq_nbits"])
+    return settings
+
+
+def _faiss_metric(metric: str) -> int:
+    return faiss.METRIC_L2 if metric == "euclidean" else faiss.METRIC_INNER_PRODUCT
+
+
+def prepare_vectors(vectors: np.ndarray, metric: str = "prob") -> np.ndarray:
+    """Return a contiguous float32 copy of vectors, L2-normalized for cosine-based metrics."""
+    xb = np.array(vectors, dtype=np.float32, order="C", copy=True)
+    if metric != "euclidean":
+        faiss.normalize_L2(xb)
+    return xb
+
+
+def build_index(vectors: np.ndarray, settings: Dict[str, Any], metric: str = "prob") -> Any:
+    """
+    Build an index over prepared vectors.
+
+    Args:
+        vectors (np.ndarray): Float32 matrix from prepare_vectors.
+        settings (dict): Output of build_settings.
+        metric (str): Retriever metric ("prob", "cosine" or "euclidean").
+
+    Returns:
+        faiss.Index: The populated index.
+    """
+    dim = vectors.shape[1]
+    faiss_metric = _faiss_metric(metric)
+    index_type = settings["type"]
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dim) if faiss_metric == faiss.METRIC_L2 else faiss.IndexFlatIP(dim)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, settings["hnsw_m"], faiss_metric)
+        index.hnsw.efConstruction = settings["ef_construction"]
+    elif index_type == "ivfpq":
+        quantizer = faiss.IndexFlatL2(dim) if faiss_metric == faiss.METRIC_L2 else faiss.IndexFlatIP(dim)
+        index = faiss.IndexIVFPQ(quantizer, dim, settings["nlist"], settings["pq_m"], settings["pq_nbits"], faiss_metric)
+        index.train(vectors)
+    else:
+        raise ValueError(f"Unknown index type: {index_type}")
+
+    start = time.perf_counter()
+    index.add(vectors)
+    logger.info(f"Built {index_type} index over {index.ntotal} vectors in {time.perf_counter() - start:.2f}s")
+    return index
+
+
+def apply_search_params(index: Any, config: Dict[str, Any]) -> None:
+    """Set the recall knobs of an approximate index from the configuration."""
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = config["ef_search"]
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(config["nprobe"], ivf.nlist)
+
+
+def save_index(base_path: str, index: Any, fingerprint: str) -> None:
+    """Write the index and its fingerprint atomically next to the vector store."""
+    paths = index_paths(base_path)
+    tmp_suffix = f".tmp{os.getpid()}"
+    faiss.write_index(index, paths["index"] + tmp_suffix)
+    with open(paths["meta"] + tmp_suffix, "w", encoding="utf-8") as f:
+        json.dump({"version": INDEX_FORMAT_VERSION, "fingerprint": fingerprint, "ntotal": index.ntotal}, f)
+    os.replace(paths["index"] + tmp_suffix, paths["index"])
+    # The sidecar is replaced last: an index is only trusted once its fingerprint is in place
+    os.replace(paths["meta"] + tmp_suffix, paths["meta"])
+    logger.info(f"Saved FAISS index with {index.ntotal} vectors to {paths['index']}")
+
+
+def load_index(base_path: str, fingerprint: str) -> Optional[Any]:
+    """
+    Load a saved index if it was built from the data described by fingerprint.
+
+    Returns:
+        Optional[faiss.Index]: The index, or None if it is missing, stale or unreadable.
+    """
+    paths = index_paths(base_path)
+    if not os.path.exists(paths["index"]) or not os.path.exists(paths["meta"]):
+        return None
+    try:
+        with open(paths["meta"], "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning(f"Could not read FAISS index metadata {paths['meta']}: {e}")
+        return None
+    if meta.get("version") != INDEX_FORMAT_VERSION or meta.get("fingerprint") != fingerprint:
+        logger.info(f"Saved FAISS index {paths['index']} is stale, it will be rebuilt")
+        return None
+
+    # Map the stored vectors instead of reading them; older faiss builds only support plain reads
+    mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+    try:
+        index = faiss.read_index(paths["index"], mmap_flag | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        try:
+            index = faiss.read_index(paths["index"])
+        except RuntimeError as e:
+            logger.warning(f"Could not read FAISS index {paths['index']}: {e}")
+            return None
+    if index.ntotal != meta.get("ntotal"):
+        logger.warning(f"FAISS index {paths['index']} holds {index.ntotal} vectors, expected {meta.get('ntotal')}")
+        return None
+    logger.info(f"Loaded FAISS index with {index.ntotal} vectors from {paths['index']}")
+    return index
+
+
+def remove_index(base_path: str) -> None:
+    """Delete a saved index, if present."""
+    for path in index_paths(base_path).values():
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def retriever_from_index(index: Any, **retriever_config: Any):
+    """
+    Wrap a prebuilt index in a FAISSRetriever without re-adding any vectors.
+
+    The retriever has no embedder, so it must be called with query embeddings.
+    """
+    from adalflow.components.retriever.faiss_retriever import FAISSRetriever
+
+    retriever = FAISSRetriever(**retriever_config, embedder=None)
+    retriever.index = index
+    retriever.dimensions = index.d
+    retriever.total_documents = index.ntotal
+    retriever.indexed = True
+    return retriever
+
+
+def recall_latency_report(vectors: np.ndarray, candidates: List[Dict[str, Any]], metric: str = "prob",
+                          top_k: int = 20, num_queries: int = 200, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Measure recall and query latency of index configurations against exact search.
+
+    Queries are sampled from the indexed vectors themselves, which approximates how
+    questions land near existing chunks.
+
+    Args:
+        vectors (np.ndarray): The vectors to index, e.g. VectorStore.vectors.
+        candidates (List[dict]): "vector_index" configurations to compare.
+        metric (str): Retriever metric.
+        top_k (int): Number of neighbours compared for recall.
+        num_queries (int): Number of sampled queries.
+        seed (int): Seed of the query sample.
+
+    Returns:
+        List[dict]: One row per candidate with its settings, build time, index size,
+        recall@top_k and mean/p95 query latency in milliseconds.
+    """
+    xb = prepare_vectors(vectors, metric)
+    rng = np.random.default_rng(seed)
+    xq = xb[rng.choice(len(xb), size=min(num_queries, len(xb)), replace=False)]
+    top_k = min(top_k, len(xb))
+
+    exact = build_index(xb, {"type": "flat"}, metric)
+    _, truth = exact.search(xq, top_k)
+
+    rows = []
+    for candidate in candidates:
+        config = resolve_index_config(candidate)
+        settings = build_settings(len(xb), xb.shape[1], config)
+        if config["type"] != "auto" and settings["type"] != config["type"]:
+            logger.info(f"Skipping {config['type']} candidate, not applicable to {len(xb)} chunks")
+            continue
+        start = time.perf_counter()
+        index = build_index(xb, settings, metric)
+        build_seconds = time.perf_counter() - start
+        apply_search_params(index, config)
+
+        latencies = []
+        found = np.empty_like(truth)
+        for i in range(len(xq)):
+            start = time.perf_counter()
+            _, ids = index.search(xq[i:i + 1], top_k)
+            latencies.append((time.perf_counter() - start) * 1000)
+            found[i] = ids[0]
+        recall = np.mean([len(set(found[i]) & set(truth[i])) / top_k for i in range(len(xq))])
+
+        rows.append({
+            **settings,
+            "ef_search": config["ef_search"] if settings["type"] == "hnsw" else None,
+            "nprobe": config["nprobe"] if settings["type"] == "ivfpq" else None,
+            "build_s": round(build_seconds, 3),
+            "index_mb": round(faiss.serialize_index(index).nbytes / (1024 * 1024), 2),
+            f"recall@{top_k}": round(float(recall), 4),
+            "mean_ms": round(float(np.mean(latencies)), 3),
+            "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+        })
+    return rows
+
+
+def default_report_candidates() -> List[Dict[str, Any]]:
+    """A sweep of the recall knobs of each index type."""
+    candidates = [{"type": "flat"}]
+    candidates += [{"type": "hnsw", "ef_search": ef} for ef in (16, 32, 64, 128, 256)]
+    candidates += [{"type": "ivfpq", "nprobe": nprobe} for nprobe in (4, 8, 16, 32, 64)]
+    return candidates
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from api.vector_store import VectorStore
+
+    parser = argparse.ArgumentParser(description="Recall vs latency of FAISS index types for a stored repository")
+    parser.add_argument("store", help="Vector store path prefix, e.g. ~/.adalflow/databases/owner_repo")
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    store = VectorStore.open(os.path.expanduser(args.store))
+    if store is None:
+        raise SystemExit(f"No vector store at {args.store}")
+    report = recall_latency_report(store.vectors, default_report_candidates(),
+                                   top_k=args.top_k, num_queries=args.queries)
+    columns = list(dict.fromkeys(key for row in report for key in row))
+    print("\t".join(columns))
+    for row in report:
+        print("\t".join("" if row.get(key) is None else str(row.get(key)) for key in columns))
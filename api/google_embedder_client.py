@@ -1,5 +1,6 @@
 """Google AI Embeddings ModelClient integration."""
 
+import asyncio
 import os
 import logging
 import backoff
@@ -201,7 +202,8 @@ class GoogleEmbedderClient(ModelClient):
         if model_type != ModelType.EMBEDDER:
             raise ValueError(f"GoogleEmbedderClient only supports EMBEDDER model type")
             
-        log.info(f"Google AI Embeddings API kwargs: {api_kwargs}")
+        log.info(f"Google AI Embeddings API call: model={api_kwargs.get('model')}, "
+                 f"inputs={len(api_kwargs.get('contents', [])) or 1}")
         
         try:
             # Use embed_content for single text or batch embedding
@@ -225,7 +227,6 @@ class GoogleEmbedderClient(ModelClient):
         """Async call to Google AI embedding API.
         
         Note: Google AI Python client doesn't have async support yet,
-        so this falls back to synchronous call.
+        so the synchronous call runs in a worker thread to keep the event loop free.
         """
-        # Google AI client doesn't have async support yet
-        return self.call(api_kwargs, model_type)
\ No newline at end of file
+        return await asyncio.to_thread(self.call, api_kwargs, model_type)
\ No newline at end of file
@@ -0,0 +1,197 @@
+"""Shared, connection-pooled async HTTP client for calls to repository hosting and model APIs.
+
+One aiohttp session is kept per event loop and pool, with keep-alive, a per-host connection
+limit and default timeouts, so requests to GitHub, GitLab or Bitbucket reuse warm
+connections and never block the event loop. GET responses carrying an ETag are
+remembered, and repeated requests are sent with If-None-Match so unchanged resources
+come back as an empty 304 that does not count against most providers' rate limits.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Connection pool size, overall and per remote host
+HTTP_POOL_LIMIT = int(os.environ.get("DEEPWIKI_HTTP_POOL_LIMIT", 100))
+HTTP_POOL_LIMIT_PER_HOST = int(os.environ.get("DEEPWIKI_HTTP_POOL_LIMIT_PER_HOST", 10))
+# Default timeouts in seconds
+HTTP_TOTAL_TIMEOUT = float(os.environ.get("DEEPWIKI_HTTP_TIMEOUT", 30))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("DEEPWIKI_HTTP_CONNECT_TIMEOUT", 10))
+# Concurrent connections per host for the "llm" pool, whose responses are long-lived streams
+LLM_POOL_LIMIT_PER_HOST = int(os.environ.get("DEEPWIKI_LLM_POOL_LIMIT_PER_HOST", 64))
+# Number of conditional-request entries remembered
+ETAG_CACHE_SIZE = int(os.environ.get("DEEPWIKI_ETAG_CACHE_SIZE", 512))
+
+
+class HTTPClientError(Exception):
+    """Raised when a request fails before a response is received (connection error, timeout)."""
+    pass
+
+
+@dataclass
+class HTTPResponse:
+    """Status, headers and decoded body of a completed request."""
+    status: int
+    text: str
+    headers: Dict[str, str]
+    from_cache: bool = False
+
+
+class ETagCache:
+    """
+    Bounded LRU of GET responses that carried an ETag.
+
+    Entries are keyed by URL and a hash of the credentials sent, so a body fetched with
+    one token is never served to a request made with another. Thread-safe.
+    """
+
+    def __init__(self, max_entries: int = ETAG_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[str, HTTPResponse]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.revalidations = 0
+
+    @staticmethod
+    def make_key(url: str, headers: Dict[str, str]) -> Tuple[str, str]:
+        credentials = "|".join(f"{name}={headers[name]}" for name in sorted(headers)
+                               if name.lower() in ("authorization", "private-token"))
+        return url, hashlib.sha256(credentials.encode("utf-8")).hexdigest()
+
+    def get(self, key: Tuple[str, str]) -> Optional[Tuple[str, HTTPResponse]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Tuple[str, str], etag: str, response: HTTPResponse) -> None:
+        with self._lock:
+            self._entries[key] = (etag, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+etag_cache = ETagCache()
+
+_sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, aiohttp.ClientSession]]" = \
+    weakref.WeakKeyDictionary()
+
+
+def get_http_session(pool: str = "default") -> aiohttp.ClientSession:
+    """
+    Return a pooled session of the running event loop, creating it on first use.
+
+    Must be called from a coroutine.
+
+    Args:
+        pool (str): "default" for short requests to hosting APIs, or "llm" for model
+            completions, which has a larger per-host limit and no total timeout so
+            streamed answers are not cut off.
+    """
+    loop = asyncio.get_running_loop()
+    sessions = _sessions.setdefault(loop, {})
+    session = sessions.get(pool)
+    if session is None or session.closed:
+        if pool == "llm":
+            limit_per_host = LLM_POOL_LIMIT_PER_HOST
+            timeout = aiohttp.ClientTimeout(total=None, connect=HTTP_CONNECT_TIMEOUT)
+        else:
+            limit_per_host = HTTP_POOL_LIMIT_PER_HOST
+            timeout = aiohttp.ClientTimeout(total=HTTP_TOTAL_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_LIMIT,
+            limit_per_host=limit_per_host,
+            ttl_dns_cache=300,
+            keepalive_timeout=60,
+        )
+        session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        sessions[pool] = session
+    return session
+
+
+async def close_http_session() -> None:
+    """Close the pooled sessions of the running event loop, if any."""
+    sessions = _sessions.pop(asyncio.get_running_loop(), {})
+    for session in sessions.values():
+        if not session.closed:
+            await session.close()
+
+
+async def fetch(url: str, headers: Dict[str, str] = None, use_etag: bool = True,
+                timeout: float = None) -> HTTPResponse:
+    """
+    GET a URL through the pooled session.
+
+    Args:
+        url (str): The URL to fetch.
+        headers (dict, optional): Request headers, including any credentials.
+        use_etag (bool): Revalidate with If-None-Match when a previous response had an ETag.
+        timeout (float, optional): Total timeout in seconds, overriding the default.
+
+    Returns:
+        HTTPResponse: The response; a 304 is answered from the cached 200 response.
+
+    Raises:
+        HTTPClientError: If no response could be obtained.
+    """
+    headers = dict(headers or {})
+    cache_key = ETagCache.make_key(url, headers) if use_etag else None
+    cached = etag_cache.get(cache_key) if cache_key else None
+    if cached is not None:
+        headers["If-None-Match"] = cached[0]
+
+    request_kwargs: Dict[str, Any] = {"headers": headers}
+    if timeout is not None:
+        request_kwargs["timeout"] = aiohttp.ClientTimeout(total=timeout)
+    try:
+        async with get_http_session().get(url, **request_kwargs) as response:
+            if response.status == 304 and cached is not None:
+                etag_cache.revalidations += 1
+                cached_response = cached[1]
+                return HTTPResponse(cached_response.status, cached_response.text, cached_response.headers,
+                                    from_cache=True)
+            text = await response.text(errors="replace")
+            result = HTTPResponse(response.status, text, dict(response.headers))
+            etag = response.headers.get("ETag")
+            if cache_key and response.status == 200 and etag:
+                etag_cache.put(cache_key, etag, result)
+            return result
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        raise HTTPClientError(f"{type(e).__name__}: {e}" if str(e) else type(e).__name__) from e
+
+
+def run_coroutine_sync(coro):
+    """
+    Run a coroutine to completion from synchronous code, even inside a running event loop.
+
+    The pooled session created for the temporary loop is closed before returning.
+    """
+    async def run_and_close():
+        try:
+            return await coro
+        finally:
+            await close_http_session()
+
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(run_and_close())
+    # Called from a thread that already runs a loop (e.g. a request handler): use a helper thread
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, run_and_close()).result()
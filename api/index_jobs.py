@@ -0,0 +1,420 @@
+"""Background indexing jobs.
+
+Indexing a repository (clone, read, split, embed, save) can take minutes. Jobs run it
+on a small local worker pool instead of inside the first chat request, and record their
+state in a SQLite table next to the repository databases:
+
+    queued -> running -> succeeded | failed | cancelled
+
+The data pipeline reports stage-level progress through report_progress(), which is a
+no-op outside a job. Access tokens are only kept in memory and never written to disk,
+so jobs still queued or running when their server process stops cannot be resumed.
+Each job records the host and process that owns it, and a starting manager marks the
+unfinished jobs of processes that are gone as interrupted; the table may be shared by
+several workers, whose live jobs are left alone.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from api.executors import INDEX_WORKERS
+
+logger = logging.getLogger(__name__)
+
+# Location of the job table, next to the repository databases by default
+JOB_DB_PATH = os.environ.get(
+    "DEEPWIKI_INDEX_JOBS_PATH",
+    os.path.join(os.path.expanduser("~"), ".adalflow", "index_jobs.sqlite3"),
+)
+# Repositories indexed concurrently by background jobs; as many as were indexed
+# concurrently inline, so a small repository does not queue behind a large one
+JOB_WORKERS = int(os.environ.get("DEEPWIKI_INDEX_JOB_WORKERS", INDEX_WORKERS))
+# Finished jobs kept in the table
+JOB_HISTORY = int(os.environ.get("DEEPWIKI_INDEX_JOB_HISTORY", 200))
+# Minimum seconds between two progress writes of the same job
+PROGRESS_WRITE_INTERVAL = 1.0
+
+TERMINAL_STATES = ("succeeded", "failed", "cancelled")
+
+_COLUMNS = ("id", "repo_url", "repo_type", "embedder_type", "excluded_dirs", "excluded_files",
+            "included_dirs", "included_files", "refresh", "status", "stage", "current", "total",
+            "error", "created_at", "started_at", "finished_at", "owner_host", "owner_pid")
+_LIST_COLUMNS = ("excluded_dirs", "excluded_files", "included_dirs", "included_files")
+
+
+class JobCancelled(BaseException):
+    """
+    Raised from report_progress when the running job has been cancelled.
+
+    Derives from BaseException so the pipeline's broad `except Exception` handlers
+    let it through to the job runner.
+    """
+    pass
+
+
+_reporter = threading.local()
+
+
+@contextmanager
+def progress_reporter(callback: Callable[[str, Optional[int], Optional[int]], None]):
+    """Send the progress reported by the current thread to callback while the block runs."""
+    previous = getattr(_reporter, "callback", None)
+    _reporter.callback = callback
+    try:
+        yield
+    finally:
+        _reporter.callback = previous
+
+
+def report_progress(stage: str, current: int = None, total: int = None) -> None:
+    """
+    Report the stage reached by the indexing running on this thread.
+
+    Args:
+        stage (str): e.g. "cloning", "reading", "embedding", "saving".
+        current (int, optional): Units of work done in this stage.
+        total (int, optional): Units of work in this stage.
+
+    Raises:
+        JobCancelled: If the job running on this thread has been cancelled.
+    """
+    callback = getattr(_reporter, "callback", None)
+    if callback is not None:
+        callback(stage, current, total)
+
+
+def _join(values: Optional[List[str]]) -> Optional[str]:
+    return "\n".join(values) if values else None
+
+
+def _split(value: Optional[str]) -> Optional[List[str]]:
+    return value.split("\n") if value else None
+
+
+@dataclass
+class IndexJob:
+    """State of one indexing job."""
+    id: str
+    repo_url: str
+    repo_type: str = "github"
+    embedder_type: Optional[str] = None
+    excluded_dirs: Optional[List[str]] = None
+    excluded_files: Optional[List[str]] = None
+    included_dirs: Optional[List[str]] = None
+    included_files: Optional[List[str]] = None
+    refresh: bool = False
+    status: str = "queued"
+    stage: Optional[str] = None
+    current: Optional[int] = None
+    total: Optional[int] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    owner_host: Optional[str] = None
+    owner_pid: Optional[int] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in TERMINAL_STATES
+
+    def dedup_key(self):
+        def _normalize(values):
+            return tuple(sorted(values)) if values else ()
+        return (self.repo_url, self.repo_type, self.embedder_type, _normalize(self.excluded_dirs),
+                _normalize(self.excluded_files), _normalize(self.included_dirs),
+                _normalize(self.included_files), self.refresh)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class IndexJobManager:
+    """
+    Queue, run and track indexing jobs.
+
+    Jobs for the same repository, settings and filters are deduplicated while one is
+    queued or running. All methods are thread-safe; wait() is meant for coroutines.
+    """
+
+    def __init__(self, path: str = JOB_DB_PATH, workers: int = JOB_WORKERS,
+                 runner: Callable[["IndexJob", Optional[str]], None] = None):
+        self.path = path
+        self._runner = runner or _index_repository
+        self._lock = threading.Lock()
+        self._active: Dict[str, IndexJob] = {}
+        self._tokens: Dict[str, Optional[str]] = {}
+        self._cancel_requested = set()
+        self._last_write: Dict[str, float] = {}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS index_jobs ("
+            "id TEXT PRIMARY KEY, repo_url TEXT NOT NULL, repo_type TEXT, embedder_type TEXT, "
+            "excluded_dirs TEXT, excluded_files TEXT, included_dirs TEXT, included_files TEXT, "
+            "refresh INTEGER, status TEXT NOT NULL, stage TEXT, current INTEGER, total INTEGER, "
+            "error TEXT, created_at REAL NOT NULL, started_at REAL, finished_at REAL, "
+            "owner_host TEXT, owner_pid INTEGER)"
+        )
+        # Tables created before jobs recorded their owner
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(index_jobs)")}
+        for column, column_type in (("owner_host", "TEXT"), ("owner_pid", "INTEGER")):
+            if column not in existing:
+                self._conn.execute(f"ALTER TABLE index_jobs ADD COLUMN {column} {column_type}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS index_jobs_created_at ON index_jobs (created_at)")
+        self._conn.commit()
+        self._owner = {"owner_host": socket.gethostname(), "owner_pid": os.getpid()}
+        self._reap_orphaned_jobs()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="deepwiki-index-job")
+
+    def _reap_orphaned_jobs(self) -> None:
+        """Mark the unfinished jobs whose owning process is gone as interrupted."""
+        host, pid = self._owner["owner_host"], self._owner["owner_pid"]
+        rows = self._conn.execute(
+            "SELECT id, owner_host, owner_pid FROM index_jobs WHERE status IN ('queued', 'running')"
+        ).fetchall()
+        # Jobs of other hosts cannot be checked and are left to their own workers. A job
+        # recorded under this process's pid belongs to an earlier process that had it.
+        orphaned = [job_id for job_id, owner_host, owner_pid in rows
+                    if owner_host is None or (owner_host == host and (owner_pid == pid or not _pid_alive(owner_pid)))]
+        if not orphaned:
+            return
+        now = time.time()
+        self._conn.executemany(
+            "UPDATE index_jobs SET status = 'failed', error = 'Interrupted by a server restart', finished_at = ? "
+            "WHERE id = ? AND status IN ('queued', 'running')", [(now, job_id) for job_id in orphaned]
+        )
+        self._conn.commit()
+        logger.warning(f"Marked {len(orphaned)} unfinished indexing job(s) as interrupted")
+
+    def submit(self, repo_url: str, repo_type: str = "github", access_token: str = None,
+               embedder_type: str = None, excluded_dirs: List[str] = None, excluded_files: List[str] = None,
+               included_dirs: List[str] = None, included_files: List[str] = None,
+               refresh: bool = False) -> IndexJob:
+        """
+        Queue a repository for indexing.
+
+        Returns:
+            IndexJob: The new job, or the queued or running job with the same settings.
+        """
+        job = IndexJob(
+            id=uuid.uuid4().hex, repo_url=repo_url, repo_type=repo_type or "github",
+            embedder_type=embedder_type, excluded_dirs=excluded_dirs or None,
+            excluded_files=excluded_files or None, included_dirs=included_dirs or None,
+            included_files=included_files or None, refresh=bool(refresh), **self._owner,
+        )
+        with self._lock:
+            for active in self._active.values():
+                if active.dedup_key() == job.dedup_key():
+                    logger.info(f"Reusing indexing job {active.id} for {repo_url}")
+                    return IndexJob(**active.to_dict())
+            self._active[job.id] = job
+            self._tokens[job.id] = access_token
+            self._write(job)
+        logger.info(f"Queued indexing job {job.id} for {repo_url}")
+        self._executor.submit(self._run, job.id)
+        return IndexJob(**job.to_dict())
+
+    def get(self, job_id: str) -> Optional[IndexJob]:
+        """Return a snapshot of a job, or None if it is unknown."""
+        with self._lock:
+            job = self._active.get(job_id)
+            if job is not None:
+                return IndexJob(**job.to_dict())
+            row = self._conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM index_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._from_row(row) if row else None
+
+    def list(self, limit: int = 50) -> List[IndexJob]:
+        """Return the most recent jobs, newest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM index_jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+            active = {job_id: IndexJob(**job.to_dict()) for job_id, job in self._active.items()}
+        return [active.get(row[0]) or self._from_row(row) for row in rows]
+
+    def cancel(self, job_id: str) -> Optional[IndexJob]:
+        """
+        Cancel a job. A queued job is cancelled at once; a running one stops at its next
+        progress report. Finished jobs are left as they are.
+
+        Returns:
+            Optional[IndexJob]: The job after the request, or None if it is unknown.
+        """
+        with self._lock:
+            job = self._active.get(job_id)
+            if job is not None:
+                if job.status == "queued":
+                    self._finish(job, "cancelled")
+                else:
+                    self._cancel_requested.add(job_id)
+        return self.get(job_id)
+
+    async def wait(self, job_id: str, on_progress: Callable[[Dict[str, Any]], Awaitable[None]] = None,
+                   interval: float = 0.5) -> Optional[IndexJob]:
+        """
+        Wait for a job to finish, calling on_progress whenever its stage or counters change.
+
+        Returns:
+            Optional[IndexJob]: The finished job, or None if it is unknown.
+        """
+        last = None
+        while True:
+            job = self.get(job_id)
+            if job is None:
+                return None
+            snapshot = (job.status, job.stage, job.current, job.total)
+            if on_progress is not None and snapshot != last:
+                await on_progress(job.to_dict())
+            last = snapshot
+            if job.done:
+                return job
+            await asyncio.sleep(interval)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+        with self._lock:
+            self._conn.close()
+
+    def _run(self, job_id: str) -> None:
+        with self._lock:
+            job = self._active.get(job_id)
+            if job is None:  # cancelled while queued
+                return
+            job.status = "running"
+            job.started_at = time.time()
+            self._write(job)
+            token = self._tokens.get(job_id)
+
+        def on_progress(stage: str, current: Optional[int], total: Optional[int]) -> None:
+            with self._lock:
+                job.stage, job.current, job.total = stage, current, total
+                now = time.monotonic()
+                if now - self._last_write.get(job_id, 0.0) >= PROGRESS_WRITE_INTERVAL:
+                    self._write(job)
+                    self._last_write[job_id] = now
+                if job_id in self._cancel_requested:
+                    raise JobCancelled()
+
+        try:
+            with progress_reporter(on_progress):
+                self._runner(job, token)
+        except JobCancelled:
+            logger.info(f"Indexing job {job_id} cancelled")
+            with self._lock:
+                self._finish(job, "cancelled")
+        except Exception as e:
+            logger.error(f"Indexing job {job_id} for {job.repo_url} failed: {e}")
+            with self._lock:
+                self._finish(job, "failed", error=str(e))
+        else:
+            logger.info(f"Indexing job {job_id} for {job.repo_url} succeeded")
+            with self._lock:
+                self._finish(job, "succeeded")
+
+    def _finish(self, job: IndexJob, status: str, error: str = None) -> None:
+        job.status = status
+        job.error = error
+        job.finished_at = time.time()
+        if status == "succeeded":
+            job.stage = "done"
+        self._write(job)
+        self._active.pop(job.id, None)
+        self._tokens.pop(job.id, None)
+        self._cancel_requested.discard(job.id)
+        self._last_write.pop(job.id, None)
+        self._conn.execute(
+            "DELETE FROM index_jobs WHERE id IN (SELECT id FROM index_jobs WHERE status IN "
+            "('succeeded', 'failed', 'cancelled') ORDER BY created_at DESC LIMIT -1 OFFSET ?)", (JOB_HISTORY,)
+        )
+        self._conn.commit()
+
+    def _write(self, job: IndexJob) -> None:
+        values = job.to_dict()
+        for column in _LIST_COLUMNS:
+            values[column] = _join(values[column])
+        values["refresh"] = int(values["refresh"])
+        self._conn.execute(
+            f"INSERT OR REPLACE INTO index_jobs ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+            [values[column] for column in _COLUMNS],
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _from_row(row) -> IndexJob:
+        values = dict(zip(_COLUMNS, row))
+        for column in _LIST_COLUMNS:
+            values[column] = _split(values[column])
+        values["refresh"] = bool(values["refresh"])
+        return IndexJob(**values)
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    """Tell whether a process with this pid is running on this host."""
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # running under another user
+        return True
+    except OSError:
+        return False
+    return True
+
+
+def _index_repository(job: IndexJob, access_token: Optional[str]) -> None:
+    """Default job runner: build or update the repository database."""
+    from api.data_pipeline import DatabaseManager
+
+    DatabaseManager().prepare_database(
+        job.repo_url, job.repo_type, access_token, embedder_type=job.embedder_type,
+        excluded_dirs=job.excluded_dirs, excluded_files=job.excluded_files,
+        included_dirs=job.included_dirs, included_files=job.included_files,
+        update=job.refresh,
+    )
+
+
+def database_exists(repo_url: str, repo_type: str = None) -> bool:
+    """Tell whether a repository already has a database, i.e. does not need a full indexing."""
+    from adalflow.utils import get_adalflow_default_root_path
+    from api.data_pipeline import DatabaseManager
+
+    repo_name = DatabaseManager()._repo_name(repo_url, repo_type)
+    return os.path.exists(os.path.join(get_adalflow_default_root_path(), "databases", f"{repo_name}.pkl"))
+
+
+_job_manager: Optional[IndexJobManager] = None
+_job_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> IndexJobManager:
+    """Return the process-wide job manager, opening the job table on first use."""
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is None:
+            _job_manager = IndexJobManager()
+        return _job_manager
+
+
+def shutdown_job_manager() -> None:
+    """Stop the job workers, if the manager was started."""
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is not None:
+            _job_manager.close()
+            _job_manager = None
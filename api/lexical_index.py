@@ -0,0 +1,265 @@
+"""BM25 inverted index over code identifiers, fused with dense retrieval.
+
+Dense similarity alone often misses exact identifier lookups ("where is
+prepare_db_index called?"): the name is rare, but its embedding is dominated by the
+surrounding code. Each chunk is therefore also indexed lexically:
+
+- identifiers are kept whole (lowercased) and split into their snake_case and
+  camelCase parts, so both `prepare_db_index` and `index` match,
+- the chunk's file path is tokenized the same way.
+
+Postings are stored in flat numpy arrays (CSR layout), so scoring a query is a
+handful of vectorized additions. The index is written next to the vector store as
+{base}.lexical.npz with a JSON sidecar holding the vocabulary and a fingerprint of the
+store it was built from; the sidecar is written last, as for the FAISS index.
+
+At query time the dense and lexical rankings are merged with reciprocal rank fusion.
+"""
+
+import hashlib
+import itertools
+import json
+import logging
+import os
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+LEXICAL_FORMAT_VERSION = 1
+
+# Defaults for the "hybrid_retrieval" section of embedder.json
+DEFAULT_HYBRID_CONFIG = {
+    "enabled": True,
+    # Chunks taken from the lexical ranking before fusion
+    "lexical_top_k": 20,
+    # Reciprocal rank fusion constant; larger values flatten the rank weights
+    "rrf_k": 60,
+}
+
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+")
+_CAMEL_PART = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lexical terms: whole identifiers plus their snake_case and camelCase parts.
+
+    Single characters are dropped; a part equal to its identifier is only counted once.
+    """
+    terms = []
+    for identifier in _IDENTIFIER.findall(text):
+        whole = identifier.lower()
+        if len(whole) > 1:
+            terms.append(whole)
+        for piece in identifier.split("_"):
+            for part in _CAMEL_PART.findall(piece):
+                part = part.lower()
+                if len(part) > 1 and part != whole:
+                    terms.append(part)
+    return terms
+
+
+def resolve_hybrid_config(config: Dict[str, Any] = None) -> Dict[str, Any]:
+    """Merge the "hybrid_retrieval" section of embedder.json over the defaults."""
+    return {**DEFAULT_HYBRID_CONFIG, **(config or {})}
+
+
+def index_paths(base_path: str) -> Dict[str, str]:
+    """Return the paths of the postings file and its vocabulary sidecar."""
+    return {
+        "postings": f"{base_path}.lexical.npz",
+        "meta": f"{base_path}.lexical.json",
+    }
+
+
+def lexical_fingerprint(store_header: Dict[str, Any]) -> str:
+    """Fingerprint the store an index is built from, so a stale index is never reused."""
+    payload = {"format": LEXICAL_FORMAT_VERSION, "store": store_header}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class LexicalIndex:
+    """
+    Okapi BM25 over a fixed list of chunks.
+
+    Args:
+        terms (List[str]): Vocabulary, position i holding term id i.
+        term_offsets (np.ndarray): (V + 1,) offsets of each term's postings.
+        doc_ids (np.ndarray): Chunk positions of all postings, grouped by term.
+        term_freqs (np.ndarray): Term frequency of each posting.
+        doc_lengths (np.ndarray): Number of terms in each chunk.
+    """
+
+    def __init__(self, terms: List[str], term_offsets: np.ndarray, doc_ids: np.ndarray,
+                 term_freqs: np.ndarray, doc_lengths: np.ndarray, k1: float = 1.2, b: float = 0.75):
+        self.terms = terms
+        self.term_ids = {term: i for i, term in enumerate(terms)}
+        self.term_offsets = term_offsets
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self.avg_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+
+    @classmethod
+    def build(cls, texts: Iterable[str], paths: Iterable[str] = None) -> "LexicalIndex":
+        """
+        Index chunks by their text and, if given, their file path.
+
+        Args:
+            texts (Iterable[str]): Chunk texts, in retrieval order.
+            paths (Iterable[str], optional): File path of each chunk.
+        """
+        paths = paths if paths is not None else itertools.repeat("")
+        term_ids: Dict[str, int] = {}
+        postings: List[List[Tuple[int, int]]] = []
+        lengths = []
+        for doc_id, (text, path) in enumerate(zip(texts, paths)):
+            counts = Counter(tokenize(text or ""))
+            counts.update(tokenize(path or ""))
+            lengths.append(sum(counts.values()))
+            for term, freq in counts.items():
+                term_id = term_ids.setdefault(term, len(term_ids))
+                if term_id == len(postings):
+                    postings.append([])
+                postings[term_id].append((doc_id, freq))
+
+        offsets = np.zeros(len(postings) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(p) for p in postings])
+        doc_ids = np.fromiter((d for p in postings for d, _ in p), dtype=np.int32, count=int(offsets[-1]))
+        freqs = np.fromiter((f for p in postings for _, f in p), dtype=np.int32, count=int(offsets[-1]))
+        terms = sorted(term_ids, key=term_ids.get)
+        return cls(terms, offsets, doc_ids, freqs, np.asarray(lengths, dtype=np.int32))
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.term_offsets.nbytes + self.doc_ids.nbytes + self.term_freqs.nbytes
+                   + self.doc_lengths.nbytes + sum(len(term) + 50 for term in self.terms))
+
+    def search(self, query: str, top_k: int = 20) -> List[Tuple[int, float]]:
+        """
+        Rank chunks by BM25 score for the query terms.
+
+        Returns:
+            List[Tuple[int, float]]: (chunk position, score) pairs, best first, scores > 0.
+        """
+        num_docs = len(self)
+        if not num_docs or top_k <= 0:
+            return []
+        scores = np.zeros(num_docs, dtype=np.float32)
+        norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / max(self.avg_length, 1e-9))
+        for term, query_freq in Counter(tokenize(query)).items():
+            term_id = self.term_ids.get(term)
+            if term_id is None:
+                continue
+            start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            docs = self.doc_ids[start:end]
+            freqs = self.term_freqs[start:end].astype(np.float32)
+            idf = np.log(1 + (num_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            scores[docs] += query_freq * idf * freqs * (self.k1 + 1) / (freqs + norm[docs])
+
+        matched = np.flatnonzero(scores > 0)
+        if len(matched) > top_k:
+            matched = matched[np.argpartition(-scores[matched], top_k - 1)[:top_k]]
+        ranked = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(int(i), float(scores[i])) for i in ranked]
+
+    def save(self, base_path: str, fingerprint: str) -> None:
+        """Write the index and its vocabulary atomically next to the vector store."""
+        paths = index_paths(base_path)
+        tmp_suffix = f".tmp{os.getpid()}"
+        with open(paths["postings"] + tmp_suffix, "wb") as f:
+            np.savez(f, term_offsets=self.term_offsets, doc_ids=self.doc_ids,
+                     term_freqs=self.term_freqs, doc_lengths=self.doc_lengths)
+        with open(paths["meta"] + tmp_suffix, "w", encoding="utf-8") as f:
+            json.dump({"version": LEXICAL_FORMAT_VERSION, "fingerprint": fingerprint, "count": len(self),
+                       "k1": self.k1, "b": self.b, "terms": self.terms}, f)
+        os.replace(paths["postings"] + tmp_suffix, paths["postings"])
+        os.replace(paths["meta"] + tmp_suffix, paths["meta"])
+        logger.info(f"Saved lexical index with {len(self.terms)} terms over {len(self)} chunks")
+
+    @classmethod
+    def load(cls, base_path: str, fingerprint: str) -> Optional["LexicalIndex"]:
+        """
+        Load a saved index if it was built from the data described by fingerprint.
+
+        Returns:
+            Optional[LexicalIndex]: The index, or None if it is missing, stale or unreadable.
+        """
+        paths = index_paths(base_path)
+        if not os.path.exists(paths["postings"]) or not os.path.exists(paths["meta"]):
+            return None
+        try:
+            with open(paths["meta"], "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("version") != LEXICAL_FORMAT_VERSION or meta.get("fingerprint") != fingerprint:
+                logger.info(f"Saved lexical index {paths['postings']} is stale, it will be rebuilt")
+                return None
+            with np.load(paths["postings"]) as arrays:
+                index = cls(meta["terms"], arrays["term_offsets"], arrays["doc_ids"], arrays["term_freqs"],
+                            arrays["doc_lengths"], k1=meta["k1"], b=meta["b"])
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Could not read lexical index {paths['postings']}: {e}")
+            return None
+        if len(index) != meta.get("count"):
+            logger.warning(f"Lexical index {paths['postings']} covers {len(index)} chunks, expected {meta.get('count')}")
+            return None
+        return index
+
+
+def remove_lexical_index(base_path: str) -> None:
+    """Delete a saved index, if present."""
+    for path in index_paths(base_path).values():
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def load_or_build_for_store(store: Any) -> LexicalIndex:
+    """
+    Reuse the lexical index saved next to a vector store, building and saving it if needed.
+
+    Args:
+        store (VectorStore): The store whose chunks the index covers.
+    """
+    fingerprint = lexical_fingerprint(store.header)
+    index = LexicalIndex.load(store.base_path, fingerprint)
+    if index is None:
+        index = LexicalIndex.build((store.text(i) for i in range(len(store))),
+                                   (store.meta_data(i).get("file_path", "") for i in range(len(store))))
+        try:
+            index.save(store.base_path, fingerprint)
+        except OSError as e:
+            logger.warning(f"Could not save lexical index: {e}")
+    return index
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = 60,
+                           top_k: int = None) -> List[Tuple[int, float]]:
+    """
+    Merge rankings by summing 1 / (k + rank) over the rankings each item appears in.
+
+    Args:
+        rankings (Sequence[Sequence[int]]): Item ids, best first, one sequence per ranker.
+        k (int): Damping constant; 60 is the value from the original RRF paper.
+        top_k (int, optional): Number of fused items to return.
+
+    Returns:
+        List[Tuple[int, float]]: (item, fused score) pairs, best first; ties keep the
+        order of first appearance.
+    """
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank + 1)
+    fused = sorted(scores.items(), key=lambda pair: -pair[1])
+    return fused[:top_k] if top_k is not None else fused
@@ -1,13 +1,17 @@
 from typing import Sequence, List
 from copy import deepcopy
 from tqdm import tqdm
+import asyncio
 import logging
 import adalflow as adal
 from adalflow.core.types import Document
 from adalflow.core.component import DataComponent
+import aiohttp
 import requests
 import os
 
+from api.http_client import run_coroutine_sync
+
 # Configure logging
 from api.logging_config import setup_logging
 
@@ -59,47 +63,156 @@ def check_ollama_model_exists(model_name: str, ollama_host: str = None) -> bool:
         logger.warning(f"Error checking Ollama model availability: {e}")
         return False
 
+# Maximum number of embedding requests in flight against the Ollama server
+OLLAMA_EMBED_CONCURRENCY = int(os.getenv("OLLAMA_EMBED_CONCURRENCY", 4))
+# Number of chunks sent per /api/embed request
+OLLAMA_EMBED_BATCH_SIZE = int(os.getenv("OLLAMA_EMBED_BATCH_SIZE", 32))
+# Attempts per request before giving up on it
+OLLAMA_EMBED_MAX_RETRIES = int(os.getenv("OLLAMA_EMBED_MAX_RETRIES", 3))
+# Timeout of a single embedding request in seconds; CPU-only servers can be slow
+OLLAMA_EMBED_TIMEOUT = float(os.getenv("OLLAMA_EMBED_TIMEOUT", 300))
+
+
+class _RetryableOllamaError(Exception):
+    """A transient Ollama failure (overload, timeout, connection reset) worth retrying."""
+    pass
+
+
 class OllamaDocumentProcessor(DataComponent):
     """
-    Process documents for Ollama embeddings by processing one document at a time.
-    Adalflow Ollama Client does not support batch embedding, so we need to process each document individually.
+    Embed documents through a local Ollama server with bounded concurrency.
+
+    Chunks are sent in batches to Ollama's /api/embed endpoint, with up to
+    max_concurrency requests in flight so the server stays busy. Servers without
+    /api/embed fall back to the single-prompt /api/embeddings endpoint. Transient
+    failures are retried with exponential backoff; a batch that keeps failing is
+    retried one document at a time so a single bad chunk only drops itself.
     """
-    def __init__(self, embedder: adal.Embedder) -> None:
+    def __init__(self, embedder: adal.Embedder, max_concurrency: int = None, batch_size: int = None,
+                 max_retries: int = None) -> None:
         super().__init__()
         self.embedder = embedder
+        self.max_concurrency = max(1, max_concurrency or OLLAMA_EMBED_CONCURRENCY)
+        self.batch_size = max(1, batch_size or OLLAMA_EMBED_BATCH_SIZE)
+        self.max_retries = max(1, max_retries or OLLAMA_EMBED_MAX_RETRIES)
+
+    def _host(self) -> str:
+        ollama_host = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+        if not ollama_host.startswith("http://") and not ollama_host.startswith("https://"):
+            ollama_host = f"http://{ollama_host}"
+        # Remove /api prefix if present, endpoints add it back
+        if ollama_host.endswith('/api'):
+            ollama_host = ollama_host[:-4]
+        return ollama_host.rstrip("/")
+
+    async def _post(self, session: aiohttp.ClientSession, url: str, payload: dict):
+        """POST to Ollama, retrying transient failures with exponential backoff."""
+        for attempt in range(self.max_retries):
+            try:
+                async with session.post(url, json=payload) as response:
+                    if response.status == 404:
+                        return None
+                    if response.status == 429 or response.status >= 500:
+                        raise _RetryableOllamaError(f"HTTP {response.status}: {await response.text()}")
+                    if response.status != 200:
+                        raise ValueError(f"Ollama embedding error ({response.status}): {await response.text()}")
+                    return await response.json()
+            except (aiohttp.ClientError, asyncio.TimeoutError, _RetryableOllamaError) as e:
+                if attempt == self.max_retries - 1:
+                    raise
+                delay = 2 ** attempt
+                logger.warning(f"Ollama embedding request failed ({e}), retrying in {delay}s")
+                await asyncio.sleep(delay)
+
+    async def _embed_single(self, session: aiohttp.ClientSession, model_kwargs: dict, text: str) -> List[float]:
+        """Embed one text with the legacy /api/embeddings endpoint."""
+        payload = {"model": model_kwargs["model"], "prompt": text}
+        if "options" in model_kwargs:
+            payload["options"] = model_kwargs["options"]
+        data = await self._post(session, f"{self._host()}/api/embeddings", payload)
+        if not data or not data.get("embedding"):
+            raise ValueError("Ollama returned no embedding")
+        return data["embedding"]
+
+    async def _embed_batch(self, session: aiohttp.ClientSession, model_kwargs: dict,
+                           texts: List[str], state: dict) -> List[List[float]]:
+        """Embed a batch of texts, using /api/embed when the server supports it."""
+        if state["batch_supported"]:
+            payload = {"model": model_kwargs["model"], "input": texts}
+            if "options" in model_kwargs:
+                payload["options"] = model_kwargs["options"]
+            data = await self._post(session, f"{self._host()}/api/embed", payload)
+            if data is not None:
+                embeddings = data.get("embeddings") or []
+                if len(embeddings) != len(texts):
+                    raise ValueError(f"Ollama returned {len(embeddings)} embeddings for {len(texts)} inputs")
+                return embeddings
+            logger.info("Ollama server has no /api/embed endpoint, embedding one document at a time")
+            state["batch_supported"] = False
+        return [await self._embed_single(session, model_kwargs, text) for text in texts]
+
+    async def _embed_all(self, texts: List[str]) -> List[List[float]]:
+        """Embed all texts concurrently; failed texts get None."""
+        model_kwargs = dict(self.embedder.model_kwargs or {})
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        state = {"batch_supported": True}
+        results: List[List[float]] = [None] * len(texts)
+        progress = tqdm(total=len(texts), desc="Processing documents for Ollama embeddings")
+
+        async def run_batch(session, start: int):
+            batch = texts[start:start + self.batch_size]
+            async with semaphore:
+                try:
+                    results[start:start + len(batch)] = await self._embed_batch(session, model_kwargs, batch, state)
+                except Exception as e:
+                    if len(batch) == 1:
+                        logger.error(f"Error embedding document {start}: {e}, skipping")
+                    else:
+                        # Isolate the failing documents instead of dropping the whole batch
+                        logger.warning(f"Batch starting at document {start} failed ({e}), retrying documents individually")
+                        for offset, text in enumerate(batch):
+                            try:
+                                results[start + offset] = (await self._embed_batch(session, model_kwargs, [text], state))[0]
+                            except Exception as single_error:
+                                logger.error(f"Error embedding document {start + offset}: {single_error}, skipping")
+            progress.update(len(batch))
+
+        timeout = aiohttp.ClientTimeout(total=OLLAMA_EMBED_TIMEOUT)
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+        try:
+            async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+                await asyncio.gather(*(run_batch(session, start) for start in range(0, len(texts), self.batch_size)))
+        finally:
+            progress.close()
+        return results
 
     def __call__(self, documents: Sequence[Document]) -> Sequence[Document]:
         output = deepcopy(documents)
-        logger.info(f"Processing {len(output)} documents individually for Ollama embeddings")
+        logger.info(f"Embedding {len(output)} documents with Ollama "
+                    f"(batch size {self.batch_size}, {self.max_concurrency} concurrent requests)")
+
+        embeddings = run_coroutine_sync(self._embed_all([doc.text for doc in output]))
 
         successful_docs = []
         expected_embedding_size = None
 
-        for i, doc in enumerate(tqdm(output, desc="Processing documents for Ollama embeddings")):
-            try:
-                # Get embedding for a single document
-                result = self.embedder(input=doc.text)
-                if result.data and len(result.data) > 0:
-                    embedding = result.data[0].embedding
-
-                    # Validate embedding size consistency
-                    if expected_embedding_size is None:
-                        expected_embedding_size = len(embedding)
-                        logger.info(f"Expected embedding size set to: {expected_embedding_size}")
-                    elif len(embedding) != expected_embedding_size:
-                        file_path = getattr(doc, 'meta_data', {}).get('file_path', f'document_{i}')
-                        logger.warning(f"Document '{file_path}' has inconsistent embedding size {len(embedding)} != {expected_embedding_size}, skipping")
-                        continue
-
-                    # Assign the embedding to the document
-                    output[i].vector = embedding
-                    successful_docs.append(output[i])
-                else:
-                    file_path = getattr(doc, 'meta_data', {}).get('file_path', f'document_{i}')
-                    logger.warning(f"Failed to get embedding for document '{file_path}', skipping")
-            except Exception as e:
-                file_path = getattr(doc, 'meta_data', {}).get('file_path', f'document_{i}')
-                logger.error(f"Error processing document '{file_path}': {e}, skipping")
+        for i, (doc, embedding) in enumerate(zip(output, embeddings)):
+            file_path = getattr(doc, 'meta_data', {}).get('file_path', f'document_{i}')
+            if not embedding:
+                logger.warning(f"Failed to get embedding for document '{file_path}', skipping")
+                continue
+
+            # Validate embedding size consistency
+            if expected_embedding_size is None:
+                expected_embedding_size = len(embedding)
+                logger.info(f"Expected embedding size set to: {expected_embedding_size}")
+            elif len(embedding) != expected_embedding_size:
+                logger.warning(f"Document '{file_path}' has inconsistent embedding size {len(embedding)} != {expected_embedding_size}, skipping")
+                continue
+
+            # Assign the embedding to the document
+            doc.vector = embedding
+            successful_docs.append(doc)
 
         logger.info(f"Successfully processed {len(successful_docs)}/{len(output)} documents with consistent embeddings")
-        return successful_docs
\ No newline at end of file
+        return successful_docs
@@ -2,6 +2,9 @@
 
 import os
 import base64
+import hashlib
+import threading
+import time
 from typing import (
     Dict,
     Sequence,
@@ -11,6 +14,8 @@ from typing import (
     TypeVar,
     Callable,
     Generator,
+    AsyncGenerator,
+    Tuple,
     Union,
     Literal,
 )
@@ -21,7 +26,6 @@ import backoff
 
 # optional import
 from adalflow.utils.lazy_import import safe_import, OptionalPackages
-from openai.types.chat.chat_completion import Choice
 
 openai = safe_import(OptionalPackages.OPENAI.value[0], OptionalPackages.OPENAI.value[1])
 
@@ -38,7 +42,7 @@ from openai.types import (
     CreateEmbeddingResponse,
     Image,
 )
-from openai.types.chat import ChatCompletionChunk, ChatCompletion, ChatCompletionMessage
+from openai.types.chat import ChatCompletionChunk, ChatCompletion
 
 from adalflow.core.model_client import ModelClient
 from adalflow.core.types import (
@@ -53,6 +57,13 @@ from adalflow.components.model_client.utils import parse_embedding_response
 log = logging.getLogger(__name__)
 T = TypeVar("T")
 
+# Seconds before a model found unable to stream is probed again (e.g. after organization verification)
+STREAMING_PROBE_TTL = float(os.environ.get("OPENAI_STREAMING_PROBE_TTL", 3600))
+
+# Streaming capability by (base URL, API key hash, model): (allowed, time of the probe)
+_streaming_support: Dict[Tuple[str, str, str], Tuple[bool, float]] = {}
+_streaming_support_lock = threading.Lock()
+
 
 # completion parsing functions and you can combine them into one singple chat completion parser
 def get_first_message_content(completion: ChatCompletion) -> str:
@@ -97,6 +108,26 @@ def handle_streaming_response(generator: Stream[ChatCompletionChunk]):
         yield parsed_content
 
 
+def is_streaming_not_allowed_error(error: Exception) -> bool:
+    """
+    Tell whether an API error means the key may not stream this model.
+
+    OpenAI rejects streamed requests for some models until the organization is
+    verified, while the same request without streaming succeeds.
+    """
+    message = str(error).lower()
+    body = getattr(error, "body", None)
+    if isinstance(body, dict):
+        details = body.get("error", body)
+        if isinstance(details, dict):
+            message += f" {details.get('message') or ''} {details.get('code') or ''}".lower()
+    return (
+        "organization must be verified" in message
+        or ("verify organization" in message and "stream" in message)
+        or ("unsupported_value" in message and "stream" in message)
+    )
+
+
 def get_all_messages_content(completion: ChatCompletion) -> List[str]:
     r"""When the n > 1, get all the messages content."""
     return [c.message.content for c in completion.choices]
@@ -185,7 +216,6 @@ class OpenAIClient(ModelClient):
             chat_completion_parser or get_first_message_content
         )
         self._input_type = input_type
-        self._api_kwargs = {}  # add api kwargs when the OpenAI Client is called
 
     def init_sync_client(self):
         api_key = self._api_key or os.getenv(self._env_api_key_name)
@@ -220,9 +250,12 @@ class OpenAIClient(ModelClient):
         completion: Union[ChatCompletion, Generator[ChatCompletionChunk, None, None]],
     ) -> "GeneratorOutput":
         """Parse the completion, and put it into the raw_response."""
-        log.debug(f"completion: {completion}, parser: {self.chat_completion_parser}")
+        # Chosen per completion rather than set by call(): pooled clients are shared by
+        # streaming and non-streaming callers
+        parser = handle_streaming_response if isinstance(completion, Stream) else self.chat_completion_parser
+        log.debug(f"completion: {completion}, parser: {parser}")
         try:
-            data = self.chat_completion_parser(completion)
+            data = parser(completion)
         except Exception as e:
             log.error(f"Error parsing the completion: {e}")
             return GeneratorOutput(data=None, error=str(e), raw_response=completion)
@@ -413,51 +446,15 @@ class OpenAIClient(ModelClient):
         kwargs is the combined input and model_kwargs.  Support streaming call.
         """
         log.info(f"api_kwargs: {api_kwargs}")
-        self._api_kwargs = api_kwargs
         if model_type == ModelType.EMBEDDER:
             return self.sync_client.embeddings.create(**api_kwargs)
         elif model_type == ModelType.LLM:
             if "stream" in api_kwargs and api_kwargs.get("stream", False):
                 log.debug("streaming call")
-                self.chat_completion_parser = handle_streaming_response
                 return self.sync_client.chat.completions.create(**api_kwargs)
             else:
-                log.debug("non-streaming call converted to streaming")
-                # Make a copy of api_kwargs to avoid modifying the original
-                streaming_kwargs = api_kwargs.copy()
-                streaming_kwargs["stream"] = True
-
-                # Get streaming response
-                stream_response = self.sync_client.chat.completions.create(**streaming_kwargs)
-
-                # Accumulate all content from the stream
-                accumulated_content = ""
-                id = ""
-                model = ""
-                created = 0
-                for chunk in stream_response:
-                    id = getattr(chunk, "id", None) or id
-                    model = getattr(chunk, "model", None) or model
-                    created = getattr(chunk, "created", 0) or created
-                    choices = getattr(chunk, "choices", [])
-                    if len(choices) > 0:
-                        delta = getattr(choices[0], "delta", None)
-                        if delta is not None:
-                            text = getattr(delta, "content", None)
-                            if text is not None:
-                                accumulated_content += text or ""
-                # Return the mock completion object that will be processed by the chat_completion_parser
-                return ChatCompletion(
-                    id = id,
-                    model=model,
-                    created=created,
-                    object="chat.completion",
-                    choices=[Choice(
-                        index=0,
-                        finish_reason="stop",
-                        message=ChatCompletionMessage(content=accumulated_content, role="assistant")
-                    )]
-                )
+                log.debug("non-streaming call")
+                return self.sync_client.chat.completions.create(**api_kwargs)
         elif model_type == ModelType.IMAGE_GENERATION:
             # Determine which image API to call based on the presence of image/mask
             if "image" in api_kwargs:
@@ -491,8 +488,6 @@ class OpenAIClient(ModelClient):
         """
         kwargs is the combined input and model_kwargs
         """
-        # store the api kwargs in the client
-        self._api_kwargs = api_kwargs
         if self.async_client is None:
             self.async_client = self.init_async_client()
         if model_type == ModelType.EMBEDDER:
@@ -517,6 +512,77 @@ class OpenAIClient(ModelClient):
         else:
             raise ValueError(f"model_type {model_type} is not supported")
 
+    def _streaming_key(self, model: Optional[str]) -> Tuple[str, str, str]:
+        # OpenAI refuses streaming per model (e.g. o3 before organization verification)
+        api_key = self._api_key or os.getenv(self._env_api_key_name) or ""
+        return self.base_url, hashlib.sha256(api_key.encode("utf-8")).hexdigest(), model or ""
+
+    def streaming_supported(self, model: Optional[str] = None) -> Optional[bool]:
+        """
+        Return whether this client's API key may stream completions of a model.
+
+        Args:
+            model (str, optional): The model of the completion.
+
+        Returns:
+            Optional[bool]: The cached result of the last probe, or None if the key and
+            model have not been probed yet or a negative result has expired.
+        """
+        with _streaming_support_lock:
+            entry = _streaming_support.get(self._streaming_key(model))
+        if entry is None:
+            return None
+        allowed, probed_at = entry
+        if not allowed and time.monotonic() - probed_at > STREAMING_PROBE_TTL:
+            return None
+        return allowed
+
+    def _record_streaming_support(self, model: Optional[str], allowed: bool) -> None:
+        with _streaming_support_lock:
+            _streaming_support[self._streaming_key(model)] = (allowed, time.monotonic())
+
+    async def astream_text(self, api_kwargs: Dict) -> AsyncGenerator[str, None]:
+        """
+        Yield the text of a chat completion, token by token when the API key allows it.
+
+        The first request made with a key for a model is the capability probe: it is sent
+        streamed, and if OpenAI refuses streaming the same request is sent again without
+        streaming and the answer is yielded as a single chunk. The outcome is cached per
+        key and model, so later requests go straight to the right mode. Both modes use
+        the async client and never block the event loop.
+
+        Args:
+            api_kwargs (Dict): Chat completion arguments from convert_inputs_to_api_kwargs.
+
+        Yields:
+            str: Pieces of the completion text.
+        """
+        if self.async_client is None:
+            self.async_client = self.init_async_client()
+
+        model = api_kwargs.get("model")
+        if self.streaming_supported(model) is not False:
+            try:
+                stream = await self.async_client.chat.completions.create(**{**api_kwargs, "stream": True})
+            except Exception as e:
+                if not is_streaming_not_allowed_error(e):
+                    raise
+                log.warning(f"Streaming {model} is not allowed for this OpenAI key, using non-streaming mode: {e}")
+                self._record_streaming_support(model, False)
+            else:
+                self._record_streaming_support(model, True)
+                async for chunk in stream:
+                    choices = getattr(chunk, "choices", None) or []
+                    delta = getattr(choices[0], "delta", None) if choices else None
+                    text = getattr(delta, "content", None) if delta is not None else None
+                    if text:
+                        yield text
+                return
+
+        completion = await self.async_client.chat.completions.create(**{**api_kwargs, "stream": False})
+        if completion.choices and completion.choices[0].message.content:
+            yield completion.choices[0].message.content
+
     @classmethod
     def from_dict(cls: type[T], data: Dict[str, Any]) -> T:
         obj = super().from_dict(data)
@@ -3,9 +3,13 @@
 from typing import Dict, Sequence, Optional, Any, List
 import logging
 import json
+import os
+import re
+import asyncio
 import aiohttp
 import requests
 from requests.exceptions import RequestException, Timeout
+from xml.dom.minidom import parseString
 
 from adalflow.core.model_client import ModelClient
 from adalflow.core.types import (
@@ -14,8 +18,171 @@ from adalflow.core.types import (
     GeneratorOutput,
 )
 
+from api.http_client import get_http_session
+
 log = logging.getLogger(__name__)
 
+# Seconds to wait for the next chunk of a streamed completion
+OPENROUTER_READ_TIMEOUT = float(os.environ.get("OPENROUTER_READ_TIMEOUT", 60))
+# Seconds to wait for a whole non-streamed completion
+OPENROUTER_TIMEOUT = float(os.environ.get("OPENROUTER_TIMEOUT", 60))
+
+
+class ErrorText(str):
+    """
+    An error reported as text in the response stream instead of raised.
+
+    It reads as the plain message, so it is shown to users like any other chunk, while
+    is_error lets consumers such as the answer cache tell it apart from the answer.
+    """
+    is_error = True
+
+
+def _stream_error_message(error: Any) -> str:
+    """Return the message of an error event sent in a completion stream."""
+    if isinstance(error, dict):
+        return str(error.get("message") or error)
+    return str(error)
+
+
+def clean_xml_content(content: str) -> str:
+    """
+    Extract and tidy the wiki_structure XML of a completion that starts with XML.
+
+    Models often surround the structure with stray text or emit unescaped characters,
+    so the <wiki_structure> element is extracted, escaped, validated and pretty-printed,
+    or rebuilt from its recognized elements if it does not parse.
+
+    Args:
+        content (str): The full completion text.
+
+    Returns:
+        str: The cleaned structure, or the content unchanged if it holds none.
+    """
+    # Check if the content is XML and ensure it's properly formatted
+    if not (content.strip().startswith("<") and ">" in content):
+        # Not XML, just return the content
+        return content
+    try:
+        # Check if it's a wiki_structure XML
+        if "<wiki_structure>" not in content:
+            # For other XML content, just return it as is
+            return content
+        log.info("Found wiki_structure XML, ensuring proper format")
+
+        # Extract just the wiki_structure XML
+        wiki_match = re.search(r'<wiki_structure>[\s\S]*?<\/wiki_structure>', content)
+        if not wiki_match:
+            # If we can't extract it, just return the original content
+            log.warning("Could not extract wiki_structure XML, yielding original content")
+            return content
+
+        # Clean the XML by removing any leading/trailing whitespace
+        clean_xml = wiki_match.group(0).strip()
+
+        # Try to fix common XML issues
+        try:
+            # Replace & with &amp; if not already part of an entity
+            fixed_xml = re.sub(r'&(?!amp;|lt;|gt;|apos;|quot;)', '&amp;', clean_xml)
+
+            # Fix other common XML issues
+            fixed_xml = fixed_xml.replace('</', '</').replace('  >', '>')
+
+            # Try to parse the fixed XML and pretty-print it with proper indentation
+            pretty_xml = parseString(fixed_xml).toprettyxml()
+
+            # Remove XML declaration
+            if pretty_xml.startswith('<?xml'):
+                pretty_xml = pretty_xml[pretty_xml.find('?>')+2:].strip()
+
+            log.info(f"Extracted and validated XML: {pretty_xml[:100]}...")
+            return pretty_xml
+        except Exception as xml_parse_error:
+            log.warning(f"XML validation failed: {str(xml_parse_error)}, using raw XML")
+
+        # If XML validation fails, try a more aggressive approach
+        try:
+            return _rebuild_wiki_structure(clean_xml)
+        except Exception as rebuild_error:
+            log.warning(f"Failed to rebuild XML: {str(rebuild_error)}, using raw XML")
+            return clean_xml
+    except Exception as xml_error:
+        log.error(f"Error processing XML content: {str(xml_error)}")
+        return content
+
+
+def _rebuild_wiki_structure(clean_xml: str) -> str:
+    """Rebuild a wiki_structure from the elements regexes can find in it."""
+    # Extract the basic structure
+    structure_match = re.search(r'<wiki_structure>(.*?)</wiki_structure>', clean_xml, re.DOTALL)
+    if not structure_match:
+        log.warning("Could not extract wiki structure, using raw XML")
+        return clean_xml
+    structure = structure_match.group(1).strip()
+
+    # Rebuild a clean XML structure
+    clean_structure = "<wiki_structure>\n"
+
+    # Extract title
+    title_match = re.search(r'<title>(.*?)</title>', structure, re.DOTALL)
+    if title_match:
+        title = title_match.group(1).strip()
+        clean_structure += f"  <title>{title}</title>\n"
+
+    # Extract description
+    desc_match = re.search(r'<description>(.*?)</description>', structure, re.DOTALL)
+    if desc_match:
+        desc = desc_match.group(1).strip()
+        clean_structure += f"  <description>{desc}</description>\n"
+
+    # Add pages section
+    clean_structure += "  <pages>\n"
+
+    # Extract pages
+    pages = re.findall(r'<page id="(.*?)">(.*?)</page>', structure, re.DOTALL)
+    for page_id, page_content in pages:
+        clean_structure += f'    <page id="{page_id}">\n'
+
+        # Extract page title
+        page_title_match = re.search(r'<title>(.*?)</title>', page_content, re.DOTALL)
+        if page_title_match:
+            page_title = page_title_match.group(1).strip()
+            clean_structure += f"      <title>{page_title}</title>\n"
+
+        # Extract page description
+        page_desc_match = re.search(r'<description>(.*?)</description>', page_content, re.DOTALL)
+        if page_desc_match:
+            page_desc = page_desc_match.group(1).strip()
+            clean_structure += f"      <description>{page_desc}</description>\n"
+
+        # Extract importance
+        importance_match = re.search(r'<importance>(.*?)</importance>', page_content, re.DOTALL)
+        if importance_match:
+            importance = importance_match.group(1).strip()
+            clean_structure += f"      <importance>{importance}</importance>\n"
+
+        # Extract relevant files
+        clean_structure += "      <relevant_files>\n"
+        file_paths = re.findall(r'<file_path>(.*?)</file_path>', page_content, re.DOTALL)
+        for file_path in file_paths:
+            clean_structure += f"        <file_path>{file_path.strip()}</file_path>\n"
+        clean_structure += "      </relevant_files>\n"
+
+        # Extract related pages
+        clean_structure += "      <related_pages>\n"
+        related_pages = re.findall(r'<related>(.*?)</related>', page_content, re.DOTALL)
+        for related in related_pages:
+            clean_structure += f"        <related>{related.strip()}</related>\n"
+        clean_structure += "      </related_pages>\n"
+
+        clean_structure += "    </page>\n"
+
+    clean_structure += "  </pages>\n</wiki_structure>"
+
+    log.info("Successfully rebuilt clean XML structure")
+    return clean_structure
+
+
 class OpenRouterClient(ModelClient):
     __doc__ = r"""A component wrapper for the OpenRouter API client.
 
@@ -121,7 +288,7 @@ class OpenRouterClient(ModelClient):
             # Instead of raising an exception, return a generator that yields the error message
             # This allows the error to be displayed to the user in the streaming response
             async def error_generator():
-                yield error_msg
+                yield ErrorText(error_msg)
             return error_generator()
 
         api_kwargs = api_kwargs or {}
@@ -135,199 +302,63 @@ class OpenRouterClient(ModelClient):
                 "X-Title": "DeepWiki"  # Optional
             }
 
-            # Always use non-streaming mode for OpenRouter
-            api_kwargs["stream"] = False
+            url = f"{self.async_client['base_url']}/chat/completions"
 
             # Make the API call
             try:
-                log.info(f"Making async OpenRouter API call to {self.async_client['base_url']}/chat/completions")
-                log.info(f"Request headers: {headers}")
-                log.info(f"Request body: {api_kwargs}")
-
-                async with aiohttp.ClientSession() as session:
-                    try:
-                        async with session.post(
-                            f"{self.async_client['base_url']}/chat/completions",
-                            headers=headers,
-                            json=api_kwargs,
-                            timeout=60
-                        ) as response:
-                            if response.status != 200:
-                                error_text = await response.text()
-                                log.error(f"OpenRouter API error ({response.status}): {error_text}")
-
-                                # Return a generator that yields the error message
-                                async def error_response_generator():
-                                    yield f"OpenRouter API error ({response.status}): {error_text}"
-                                return error_response_generator()
-
-                            # Get the full response
-                            data = await response.json()
-                            log.info(f"Received response from OpenRouter: {data}")
-
-                            # Create a generator that yields the content
-                            async def content_generator():
-                                if "choices" in data and len(data["choices"]) > 0:
-                                    choice = data["choices"][0]
-                                    if "message" in choice and "content" in choice["message"]:
-                                        content = choice["message"]["content"]
-                                        log.info("Successfully retrieved response")
-
-                                        # Check if the content is XML and ensure it's properly formatted
-                                        if content.strip().startswith("<") and ">" in content:
-                                            # It's likely XML, let's make sure it's properly formatted
-                                            try:
-                                                # Extract the XML content
-                                                xml_content = content
-
-                                                # Check if it's a wiki_structure XML
-                                                if "<wiki_structure>" in xml_content:
-                                                    log.info("Found wiki_structure XML, ensuring proper format")
-
-                                                    # Extract just the wiki_structure XML
-                                                    import re
-                                                    wiki_match = re.search(r'<wiki_structure>[\s\S]*?<\/wiki_structure>', xml_content)
-                                                    if wiki_match:
-                                                        # Get the raw XML
-                                                        raw_xml = wiki_match.group(0)
-
-                                                        # Clean the XML by removing any leading/trailing whitespace
-                                                        # and ensuring it's properly formatted
-                                                        clean_xml = raw_xml.strip()
-
-                                                        # Try to fix common XML issues
-                                                        try:
-                                                            # Replace problematic characters in XML
-                                                            fixed_xml = clean_xml
-
-                                                            # Replace & with &amp; if not already part of an entity
-                                                            fixed_xml = re.sub(r'&(?!amp;|lt;|gt;|apos;|quot;)', '&amp;', fixed_xml)
-
-                                                            # Fix other common XML issues
-                                                            fixed_xml = fixed_xml.replace('</', '</').replace('  >', '>')
-
-                                                            # Try to parse the fixed XML
-                                                            from xml.dom.minidom import parseString
-                                                            dom = parseString(fixed_xml)
-
-                                                            # Get the pretty-printed XML with proper indentation
-                                                            pretty_xml = dom.toprettyxml()
-
-                                                            # Remove XML declaration
-                                                            if pretty_xml.startswith('<?xml'):
-                                                                pretty_xml = pretty_xml[pretty_xml.find('?>')+2:].strip()
-
-                                                            log.info(f"Extracted and validated XML: {pretty_xml[:100]}...")
-                                                            yield pretty_xml
-                                                        except Exception as xml_parse_error:
-                                                            log.warning(f"XML validation failed: {str(xml_parse_error)}, using raw XML")
-
-                                                            # If XML validation fails, try a more aggressive approach
-                                                            try:
-                                                                # Use regex to extract just the structure without any problematic characters
-                                                                import re
-
-                                                                # Extract the basic structure
-                                                                structure_match = re.search(r'<wiki_structure>(.*?)</wiki_structure>', clean_xml, re.DOTALL)
-                                                                if structure_match:
-                                                                    structure = structure_match.group(1).strip()
-
-                                                                    # Rebuild a clean XML structure
-                                                                    clean_structure = "<wiki_structure>\n"
-
-                                                                    # Extract title
-                                                                    title_match = re.search(r'<title>(.*?)</title>', structure, re.DOTALL)
-                                                                    if title_match:
-                                                                        title = title_match.group(1).strip()
-                                                                        clean_structure += f"  <title>{title}</title>\n"
-
-                                                                    # Extract description
-                                                                    desc_match = re.search(r'<description>(.*?)</description>', structure, re.DOTALL)
-                                                                    if desc_match:
-                                                                        desc = desc_match.group(1).strip()
-                                                                        clean_structure += f"  <description>{desc}</description>\n"
-
-                                                                    # Add pages section
-                                                                    clean_structure += "  <pages>\n"
-
-                                                                    # Extract pages
-                                                                    pages = re.findall(r'<page id="(.*?)">(.*?)</page>', structure, re.DOTALL)
-                                                                    for page_id, page_content in pages:
-                                                                        clean_structure += f'    <page id="{page_id}">\n'
-
-                                                                        # Extract page title
-                                                                        page_title_match = re.search(r'<title>(.*?)</title>', page_content, re.DOTALL)
-                                                                        if page_title_match:
-                                                                            page_title = page_title_match.group(1).strip()
-                                                                            clean_structure += f"      <title>{page_title}</title>\n"
-
-                                                                        # Extract page description
-                                                                        page_desc_match = re.search(r'<description>(.*?)</description>', page_content, re.DOTALL)
-                                                                        if page_desc_match:
-                                                                            page_desc = page_desc_match.group(1).strip()
-                                                                            clean_structure += f"      <description>{page_desc}</description>\n"
-
-                                                                        # Extract importance
-                                                                        importance_match = re.search(r'<importance>(.*?)</importance>', page_content, re.DOTALL)
-                                                                        if importance_match:
-                                                                            importance = importance_match.group(1).strip()
-                                                                            clean_structure += f"      <importance>{importance}</importance>\n"
-
-                                                                        # Extract relevant files
-                                                                        clean_structure += "      <relevant_files>\n"
-                                                                        file_paths = re.findall(r'<file_path>(.*?)</file_path>', page_content, re.DOTALL)
-                                                                        for file_path in file_paths:
-                                                                            clean_structure += f"        <file_path>{file_path.strip()}</file_path>\n"
-                                                                        clean_structure += "      </relevant_files>\n"
-
-                                                                        # Extract related pages
-                                                                        clean_structure += "      <related_pages>\n"
-                                                                        related_pages = re.findall(r'<related>(.*?)</related>', page_content, re.DOTALL)
-                                                                        for related in related_pages:
-                                                                            clean_structure += f"        <related>{related.strip()}</related>\n"
-                                                                        clean_structure += "      </related_pages>\n"
-
-                                                                        clean_structure += "    </page>\n"
-
-                                                                    clean_structure += "  </pages>\n</wiki_structure>"
-
-                                                                    log.info("Successfully rebuilt clean XML structure")
-                                                                    yield clean_structure
-                                                                else:
-                                                                    log.warning("Could not extract wiki structure, using raw XML")
-                                                                    yield clean_xml
-                                                            except Exception as rebuild_error:
-                                                                log.warning(f"Failed to rebuild XML: {str(rebuild_error)}, using raw XML")
-                                                                yield clean_xml
-                                                    else:
-                                                        # If we can't extract it, just yield the original content
-                                                        log.warning("Could not extract wiki_structure XML, yielding original content")
-                                                        yield xml_content
-                                                else:
-                                                    # For other XML content, just yield it as is
-                                                    yield content
-                                            except Exception as xml_error:
-                                                log.error(f"Error processing XML content: {str(xml_error)}")
-                                                yield content
-                                        else:
-                                            # Not XML, just yield the content
-                                            yield content
-                                    else:
-                                        log.error(f"Unexpected response format: {data}")
-                                        yield "Error: Unexpected response format from OpenRouter API"
-                                else:
-                                    log.error(f"No choices in response: {data}")
-                                    yield "Error: No response content from OpenRouter API"
-
-                            return content_generator()
-                    except aiohttp.ClientError as e:
-                        e_client = e
-                        log.error(f"Connection error with OpenRouter API: {str(e_client)}")
+                log.info(f"Making async OpenRouter API call to {url}")
+                log.debug(f"Request body: {api_kwargs}")
 
-                        # Return a generator that yields the error message
-                        async def connection_error_generator():
-                            yield f"Connection error with OpenRouter API: {str(e_client)}. Please check your internet connection and that the OpenRouter API is accessible."
-                        return connection_error_generator()
+                # Pooled keep-alive session, so only the first call pays for TCP and TLS setup
+                session = get_http_session("llm")
+                try:
+                    if api_kwargs.get("stream"):
+                        return await self._astream_completion(session, url, headers, api_kwargs)
+
+                    async with session.post(
+                        url,
+                        headers=headers,
+                        json=api_kwargs,
+                        timeout=aiohttp.ClientTimeout(total=OPENROUTER_TIMEOUT)
+                    ) as response:
+                        if response.status != 200:
+                            error_text = await response.text()
+                            log.error(f"OpenRouter API error ({response.status}): {error_text}")
+
+                            # Return a generator that yields the error message
+                            async def error_response_generator():
+                                yield ErrorText(f"OpenRouter API error ({response.status}): {error_text}")
+                            return error_response_generator()
+
+                        # Get the full response
+                        data = await response.json()
+                        log.info(f"Received response from OpenRouter: {data}")
+
+                        # Create a generator that yields the content
+                        async def content_generator():
+                            if "choices" in data and len(data["choices"]) > 0:
+                                choice = data["choices"][0]
+                                if "message" in choice and "content" in choice["message"]:
+                                    content = choice["message"]["content"]
+                                    log.info("Successfully retrieved response")
+
+                                    yield clean_xml_content(content)
+                                else:
+                                    log.error(f"Unexpected response format: {data}")
+                                    yield ErrorText("Error: Unexpected response format from OpenRouter API")
+                            else:
+                                log.error(f"No choices in response: {data}")
+                                yield ErrorText("Error: No response content from OpenRouter API")
+
+                        return content_generator()
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    e_client = e
+                    log.error(f"Connection error with OpenRouter API: {str(e_client)}")
+
+                    # Return a generator that yields the error message
+                    async def connection_error_generator():
+                        yield ErrorText(f"Connection error with OpenRouter API: {str(e_client)}. Please check your internet connection and that the OpenRouter API is accessible.")
+                    return connection_error_generator()
 
             except RequestException as e:
                 e_req = e
@@ -335,7 +366,7 @@ class OpenRouterClient(ModelClient):
 
                 # Return a generator that yields the error message
                 async def request_error_generator():
-                    yield f"Error calling OpenRouter API: {str(e_req)}"
+                    yield ErrorText(f"Error calling OpenRouter API: {str(e_req)}")
                 return request_error_generator()
 
             except Exception as e:
@@ -344,7 +375,7 @@ class OpenRouterClient(ModelClient):
 
                 # Return a generator that yields the error message
                 async def unexpected_error_generator():
-                    yield f"Unexpected error calling OpenRouter API: {str(e_unexp)}"
+                    yield ErrorText(f"Unexpected error calling OpenRouter API: {str(e_unexp)}")
                 return unexpected_error_generator()
 
         else:
@@ -353,9 +384,69 @@ class OpenRouterClient(ModelClient):
 
             # Return a generator that yields the error message
             async def model_type_error_generator():
-                yield error_msg
+                yield ErrorText(error_msg)
             return model_type_error_generator()
 
+    async def _astream_completion(self, session: aiohttp.ClientSession, url: str, headers: Dict,
+                                  api_kwargs: Dict):
+        """
+        Start a streamed completion and return an async generator of its text deltas.
+
+        The request is sent immediately, so HTTP errors are reported before the first
+        chunk; the connection goes back to the pool once the stream is consumed.
+
+        Args:
+            session (aiohttp.ClientSession): The pooled session to send the request with.
+            url (str): The chat completions endpoint.
+            headers (Dict): Request headers, including the API key.
+            api_kwargs (Dict): The request body, with "stream" set.
+
+        Returns:
+            AsyncGenerator[str, None]: The content deltas, or a single error message.
+        """
+        response = await session.post(
+            url,
+            headers=headers,
+            json=api_kwargs,
+            timeout=aiohttp.ClientTimeout(total=None, sock_read=OPENROUTER_READ_TIMEOUT),
+        )
+        if response.status != 200:
+            error_text = await response.text()
+            response.release()
+            log.error(f"OpenRouter API error ({response.status}): {error_text}")
+
+            async def error_response_generator():
+                yield ErrorText(f"OpenRouter API error ({response.status}): {error_text}")
+            return error_response_generator()
+
+        async def stream_generator():
+            # A reply starting with XML, such as a wiki structure, is collected and cleaned
+            # up as a whole like non-streamed replies; any other reply streams through
+            held = []
+            mode = None  # "xml" once the reply starts with "<", "text" otherwise
+            try:
+                async for content in self._process_async_streaming_response(response):
+                    if mode != "text" and not getattr(content, "is_error", False):
+                        held.append(content)
+                        if mode is None and content.strip():
+                            mode = "xml" if "".join(held).lstrip().startswith("<") else "text"
+                        if mode != "text":
+                            continue
+                        content = "".join(held)
+                        held = []
+                    elif held:
+                        # An error while collecting: pass the reply on as it is
+                        yield "".join(held)
+                        held = []
+                        mode = "text"
+                    yield content
+                if held:
+                    yield clean_xml_content("".join(held))
+            finally:
+                # Returns the connection to the pool, or drops it if the stream was abandoned
+                response.release()
+        return stream_generator()
+
     def _process_completion_response(self, data: Dict) -> GeneratorOutput:
         """Process a non-streaming completion response from OpenRouter."""
         try:
@@ -430,6 +521,12 @@ class OpenRouterClient(ModelClient):
                                 data_obj = json.loads(data)
                                 log.debug(f"Parsed JSON data: {data_obj}")
 
+                                # Errors after the response started, e.g. the upstream provider failing
+                                if isinstance(data_obj, dict) and data_obj.get("error"):
+                                    log.error(f"OpenRouter stream error: {data_obj['error']}")
+                                    yield ErrorText(f"OpenRouter API error: {_stream_error_message(data_obj['error'])}")
+                                    continue
+
                                 # Extract content from delta
                                 if "choices" in data_obj and len(data_obj["choices"]) > 0:
                                     choice = data_obj["choices"][0]
@@ -451,10 +548,10 @@ class OpenRouterClient(ModelClient):
                                 continue
                 except Exception as e_chunk:
                     log.error(f"Error processing streaming chunk: {str(e_chunk)}")
-                    yield f"Error processing response chunk: {str(e_chunk)}"
+                    yield ErrorText(f"Error processing response chunk: {str(e_chunk)}")
         except Exception as e_stream:
             log.error(f"Error in streaming response: {str(e_stream)}")
-            yield f"Error in streaming response: {str(e_stream)}"
+            yield ErrorText(f"Error in streaming response: {str(e_stream)}")
 
     async def _process_async_streaming_response(self, response):
         """Process an asynchronous streaming response from OpenRouter."""
@@ -498,6 +595,12 @@ class OpenRouterClient(ModelClient):
                                 data_obj = json.loads(data)
                                 log.debug(f"Parsed JSON data: {data_obj}")
 
+                                # Errors after the response started, e.g. the upstream provider failing
+                                if isinstance(data_obj, dict) and data_obj.get("error"):
+                                    log.error(f"OpenRouter stream error: {data_obj['error']}")
+                                    yield ErrorText(f"OpenRouter API error: {_stream_error_message(data_obj['error'])}")
+                                    continue
+
                                 # Extract content from delta
                                 if "choices" in data_obj and len(data_obj["choices"]) > 0:
                                     choice = data_obj["choices"][0]
@@ -519,7 +622,7 @@ class OpenRouterClient(ModelClient):
                                 continue
                 except Exception as e_chunk:
                     log.error(f"Error processing streaming chunk: {str(e_chunk)}")
-                    yield f"Error processing response chunk: {str(e_chunk)}"
+                    yield ErrorText(f"Error processing response chunk: {str(e_chunk)}")
         except Exception as e_stream:
             log.error(f"Error in async streaming response: {str(e_stream)}")
-            yield f"Error in streaming response: {str(e_stream)}"
+            yield ErrorText(f"Error in streaming response: {str(e_stream)}")
@@ -0,0 +1,206 @@
+"""Prompt assembly shared by the chat transports.
+
+The WebSocket handler (api/websocket_wiki.py) and the HTTP streaming endpoint
+(api/simple_chat.py) each parsed the conversation, detected Deep Research and rebuilt
+their system prompts from f-strings on every request, in copies that had drifted
+apart. Both now go through this module:
+
+- parse_conversation validates the messages and works out the query, the history and
+  the Deep Research iteration,
+- system prompts are formatted once per (mode, iteration, repository, language) and
+  reused, so the leading part of every prompt is byte-identical across requests and
+  eligible for the providers' prompt caching,
+- ChatPrompt renders the parts as the single text prompt most clients take, or as a
+  system and a user message for the clients accepting message lists.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from api.prompts import (
+    DEEP_RESEARCH_FIRST_ITERATION_PROMPT,
+    DEEP_RESEARCH_FINAL_ITERATION_PROMPT,
+    DEEP_RESEARCH_INTERMEDIATE_ITERATION_PROMPT,
+    SIMPLE_CHAT_SYSTEM_PROMPT,
+)
+
+logger = logging.getLogger(__name__)
+
+DEEP_RESEARCH_TAG = "[DEEP RESEARCH]"
+# Deep Research iteration from which the final conclusion is requested
+FINAL_RESEARCH_ITERATION = 5
+# Providers whose clients accept a list of chat messages as input
+MESSAGE_INPUT_PROVIDERS = frozenset({"openrouter", "dashscope"})
+
+CONTEXT_START = "<START_OF_CONTEXT>"
+CONTEXT_END = "<END_OF_CONTEXT>"
+
+_SYSTEM_TEMPLATES = {
+    "chat": SIMPLE_CHAT_SYSTEM_PROMPT,
+    "first": DEEP_RESEARCH_FIRST_ITERATION_PROMPT,
+    "intermediate": DEEP_RESEARCH_INTERMEDIATE_ITERATION_PROMPT,
+    "final": DEEP_RESEARCH_FINAL_ITERATION_PROMPT,
+}
+
+
+@dataclass
+class Conversation:
+    """The parts of a chat request the prompt is built from."""
+    query: str
+    history: List[Tuple[str, str]] = field(default_factory=list)
+    is_deep_research: bool = False
+    research_iteration: int = 1
+
+
+def parse_conversation(messages: Sequence[Any]) -> Conversation:
+    """
+    Extract the query, the previous turns and the Deep Research state from chat messages.
+
+    Args:
+        messages (Sequence[ChatMessage]): Messages with role and content, oldest first.
+
+    Returns:
+        Conversation: The parsed conversation; the messages are left unchanged.
+
+    Raises:
+        ValueError: If there are no messages or the last one is not from the user.
+    """
+    if not messages:
+        raise ValueError("No messages provided")
+    last_message = messages[-1]
+    if last_message.role != "user":
+        raise ValueError("Last message must be from the user")
+
+    history = []
+    for user_msg, assistant_msg in zip(messages[0:-1:2], messages[1::2]):
+        if user_msg.role == "user" and assistant_msg.role == "assistant":
+            history.append((user_msg.content, assistant_msg.content))
+
+    query = last_message.content
+    is_deep_research = any(msg.content and DEEP_RESEARCH_TAG in msg.content for msg in messages)
+    if not is_deep_research:
+        return Conversation(query=query, history=history)
+
+    if DEEP_RESEARCH_TAG in query:
+        query = query.replace(DEEP_RESEARCH_TAG, "").strip()
+    research_iteration = sum(1 for msg in messages if msg.role == "assistant") + 1
+    logger.info(f"Deep Research request detected - iteration {research_iteration}")
+
+    # Continuation requests research the topic of the first user message
+    if "continue" in query.lower() and "research" in query.lower():
+        for msg in messages:
+            if msg.role == "user" and "continue" not in msg.content.lower():
+                query = msg.content.replace(DEEP_RESEARCH_TAG, "").strip()
+                logger.info(f"Using original topic for research: {query}")
+                break
+
+    return Conversation(query=query, history=history, is_deep_research=True,
+                        research_iteration=research_iteration)
+
+
+def language_name(language_code: Optional[str], lang_config: Dict[str, Any]) -> str:
+    """Return the display name of a language code, falling back to the configured default."""
+    code = language_code or lang_config["default"]
+    return lang_config["supported_languages"].get(code, "English")
+
+
+def system_prompt(repo_type: str, repo_url: str, language: str, is_deep_research: bool = False,
+                  research_iteration: int = 1) -> str:
+    """
+    Return the system prompt for a chat mode, formatted once and reused afterwards.
+
+    Args:
+        repo_type (str): Repository type, e.g. "github".
+        repo_url (str): Repository URL.
+        language (str): Display name of the answer language.
+        is_deep_research (bool): Whether the request is part of a Deep Research.
+        research_iteration (int): Deep Research iteration, starting at 1.
+    """
+    if not is_deep_research:
+        stage, iteration = "chat", 0
+    elif research_iteration <= 1:
+        stage, iteration = "first", 0
+    elif research_iteration >= FINAL_RESEARCH_ITERATION:
+        stage, iteration = "final", 0
+    else:
+        stage, iteration = "intermediate", research_iteration
+    return _format_system_prompt(stage, iteration, repo_type, repo_url, language)
+
+
+@lru_cache(maxsize=512)
+def _format_system_prompt(stage: str, iteration: int, repo_type: str, repo_url: str, language: str) -> str:
+    repo_name = repo_url.split("/")[-1] if "/" in repo_url else repo_url
+    return _SYSTEM_TEMPLATES[stage].format(
+        repo_type=repo_type,
+        repo_url=repo_url,
+        repo_name=repo_name,
+        research_iteration=iteration,
+        language_name=language,
+    )
+
+
+def format_history(history: Sequence[Tuple[str, str]]) -> str:
+    """Render previous (user, assistant) turns for the prompt."""
+    return "".join(
+        f"<turn>\n<user>{user}</user>\n<assistant>{assistant}</assistant>\n</turn>\n" for user, assistant in history
+    )
+
+
+@dataclass
+class ChatPrompt:
+    """
+    The parts of a chat prompt, from the most static to the most request-specific.
+
+    The system prompt comes first so that requests about the same repository in the
+    same mode and language share a byte-identical prefix.
+    """
+    system: str
+    query: str
+    history: List[Tuple[str, str]] = field(default_factory=list)
+    file_path: Optional[str] = None
+    file_content: str = ""
+    context_text: str = ""
+
+    def _user_content(self, include_context: bool) -> str:
+        parts = []
+        if self.history:
+            parts.append(f"<conversation_history>\n{format_history(self.history)}</conversation_history>\n\n")
+        if self.file_path and self.file_content:
+            parts.append(f"<currentFileContent path=\"{self.file_path}\">\n{self.file_content}\n</currentFileContent>\n\n")
+        if not include_context:
+            parts.append("<note>Answering without retrieval augmentation due to input size constraints.</note>\n\n")
+        elif self.context_text.strip():
+            parts.append(f"{CONTEXT_START}\n{self.context_text}\n{CONTEXT_END}\n\n")
+        else:
+            parts.append("<note>Answering without retrieval augmentation.</note>\n\n")
+        parts.append(f"<query>\n{self.query}\n</query>\n\n")
+        return "".join(parts)
+
+    def text(self, provider: str, include_context: bool = True) -> str:
+        """Render the prompt as a single text, the input most model clients take."""
+        prompt = f"/no_think {self.system}\n\n{self._user_content(include_context)}Assistant: "
+        if provider == "ollama":
+            prompt += " /no_think"
+        return prompt
+
+    def messages(self, include_context: bool = True) -> List[Dict[str, str]]:
+        """Render the prompt as a system and a user message."""
+        return [
+            {"role": "system", "content": f"/no_think {self.system}"},
+            {"role": "user", "content": self._user_content(include_context).rstrip()},
+        ]
+
+    def for_provider(self, provider: str, include_context: bool = True) -> Union[str, List[Dict[str, str]]]:
+        """
+        Render the prompt in the input format of a provider's client.
+
+        Args:
+            provider (str): Provider name, e.g. "openrouter" or "ollama".
+            include_context (bool): False to leave out the retrieved context, e.g. when
+                retrying after a context length error.
+        """
+        if provider in MESSAGE_INPUT_PROVIDERS:
+            return self.messages(include_context)
+        return self.text(provider, include_context)
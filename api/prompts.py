@@ -131,7 +131,7 @@ IMPORTANT:You MUST respond in {language_name} language.
 - Your response MUST build on previous research iterations - do not repeat information already covered
 - Identify gaps or areas that need further exploration related to this specific topic
 - Focus on one specific aspect that needs deeper investigation in this iteration
-- Start your response with "## Research Update {{research_iteration}}"
+- Start your response with "## Research Update {research_iteration}"
 - Clearly explain what you're investigating in this iteration
 - Provide new insights that weren't covered in previous iterations
 - If this is iteration 3, prepare for a final conclusion in the next iteration
@@ -160,6 +160,8 @@ IMPORTANT:You MUST respond in {language_name} language.
 <guidelines>
 - Answer the user's question directly without ANY preamble or filler phrases
 - DO NOT include any rationale, explanation, or extra comments.
+- Strictly base answers ONLY on existing code or documents
+- DO NOT speculate or invent citations.
 - DO NOT start with preambles like "Okay, here's a breakdown" or "Here's an explanation"
 - DO NOT start with markdown headers like "## Analysis of..." or any file path references
 - DO NOT start with ```markdown code fences
@@ -0,0 +1,135 @@
+"""Two-tier cache of query embeddings.
+
+Every retrieval used to embed its query through a network round trip, although many
+queries repeat verbatim: the "Contexts related to {filePath}" queries issued while
+browsing wiki pages, Deep Research continuations reusing the original topic, or users
+asking the same question again. Query vectors are kept in:
+
+- a bounded in-process LRU, answering repeated queries without any I/O, and
+- optionally the persistent embedding cache (see api/embedding_cache.py), so they
+  survive restarts and are shared between workers.
+
+Keys are content addresses of the query text and the embedding settings (client,
+model, dimensions, task type), so switching models never serves a stale vector.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from api.embedding_cache import get_embedding_cache, make_key
+
+logger = logging.getLogger(__name__)
+
+# Query vectors kept in memory, 0 disables the in-memory tier
+QUERY_CACHE_SIZE = int(os.environ.get("DEEPWIKI_QUERY_CACHE_SIZE", 2048))
+# Whether query vectors are also stored in the persistent embedding cache
+QUERY_CACHE_DISK = os.environ.get("DEEPWIKI_QUERY_CACHE_DISK", "true").lower() in ("1", "true", "yes")
+
+
+class QueryEmbeddingCache:
+    """
+    LRU of query vectors in front of the persistent embedding cache.
+
+    All operations are thread-safe. The embedding function runs outside the lock, so
+    concurrent misses do not serialize on the network call.
+    """
+
+    def __init__(self, max_entries: int = QUERY_CACHE_SIZE, use_disk: bool = QUERY_CACHE_DISK):
+        self.max_entries = max_entries
+        self.use_disk = use_disk
+        self._entries: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get(self, namespace: str, query: str) -> Optional[List[float]]:
+        """Return the cached vector of a query, looking in memory first and then on disk."""
+        key = make_key(namespace, query)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return vector
+        disk = get_embedding_cache() if self.use_disk else None
+        if disk is not None:
+            try:
+                vector = disk.get_many([key]).get(key)
+            except sqlite3.Error as e:
+                # The disk tier is an optimization; a busy or broken database only costs a miss
+                logger.warning(f"Query embedding lookup on disk failed: {e}")
+            if vector is not None:
+                self._remember(key, vector)
+                with self._lock:
+                    self.disk_hits += 1
+                return vector
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, namespace: str, query: str, vector: List[float]) -> None:
+        """Store a query vector in both tiers."""
+        key = make_key(namespace, query)
+        vector = list(vector)
+        self._remember(key, vector)
+        disk = get_embedding_cache() if self.use_disk else None
+        if disk is not None:
+            try:
+                disk.put_many({key: vector})
+            except sqlite3.Error as e:
+                logger.warning(f"Could not store query embedding on disk: {e}")
+
+    def get_or_embed(self, namespace: str, query: str, embed: Callable[[str], List[float]]) -> List[float]:
+        """
+        Return the vector of a query, calling embed only when neither tier has it.
+
+        Args:
+            namespace (str): Embedding settings, see embedding_cache.make_namespace.
+            query (str): The query text, embedded as given.
+            embed (Callable): Embeds one query; its errors are not cached.
+        """
+        vector = self.get(namespace, query)
+        if vector is None:
+            vector = embed(query)
+            self.put(namespace, query, vector)
+        return vector
+
+    def clear(self) -> None:
+        """Drop the in-memory tier without touching the counters."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the cache counters and current occupancy."""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "disk_tier": self.use_disk,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+
+# Shared instance used by every RAG instance in this process
+query_embedding_cache = QueryEmbeddingCache()
@@ -1,3 +1,4 @@
+import hashlib
 import logging
 import weakref
 import re
@@ -9,6 +10,7 @@ from uuid import uuid4
 import adalflow as adal
 
 from api.tools.embedder import get_embedder
+from api.client_pool import get_model_client
 from api.prompts import RAG_SYSTEM_PROMPT as system_prompt, RAG_TEMPLATE
 
 # Create our own implementation of the conversation classes
@@ -41,7 +43,14 @@ class CustomConversation:
 # Import other adalflow components
 from adalflow.components.retriever.faiss_retriever import FAISSRetriever
 from api.config import configs
-from api.data_pipeline import DatabaseManager
+from api.data_pipeline import DatabaseManager, embedder_namespace
+from api.executors import SingleFlight, run_blocking
+from api.query_embedding_cache import query_embedding_cache
+from api.retriever_cache import CachedRetriever, estimate_nbytes, make_cache_key, retriever_cache
+from api.vector_store import StoredDocuments, normalize_rows, validate_vectors
+from api.lexical_index import LexicalIndex, load_or_build_for_store, reciprocal_rank_fusion, resolve_hybrid_config
+from api.faiss_index import (apply_search_params, build_index, build_settings, index_fingerprint, load_index,
+                             prepare_vectors, resolve_index_config, retriever_from_index, save_index)
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -49,6 +58,9 @@ logger = logging.getLogger(__name__)
 # Maximum token limit for embedding models
 MAX_INPUT_TOKENS = 7500  # Safe threshold below 8192 token limit
 
+# Concurrent preparations of the same repository share a single run
+_prepare_flights = SingleFlight()
+
 class Memory(adal.core.component.DataComponent):
     """Simple conversation management with a list of dialog turns."""
 
@@ -205,6 +217,8 @@ class RAG(adal.Component):
 
         # Use single string embedder for Ollama, regular embedder for others
         self.query_embedder = single_string_embedder if self.is_ollama_embedder else self.embedder
+        # Query vectors are cached per embedding settings, see api/query_embedding_cache.py
+        self.query_namespace = embedder_namespace(self.embedder)
 
         self.initialize_db_manager()
 
@@ -238,7 +252,7 @@ IMPORTANT FORMATTING RULES:
                 "system_prompt": system_prompt,
                 "contexts": None,
             },
-            model_client=generator_config["model_client"](),
+            model_client=get_model_client(self.provider, generator_config["model_client"]),
             model_kwargs=generator_config["model_kwargs"],
             output_processors=data_parser,
         )
@@ -248,104 +262,49 @@ IMPORTANT FORMATTING RULES:
         """Initialize the database manager with local storage"""
         self.db_manager = DatabaseManager()
         self.transformed_docs = []
+        self.validated_vectors = None
+        self.lexical_index = None
 
     def _validate_and_filter_embeddings(self, documents: List) -> List:
         """
         Validate embeddings and filter out documents with invalid or mismatched embedding sizes.
 
+        The vectors are stacked once and checked as a matrix (see validate_vectors); the
+        matrix of the kept documents, normalized unless the retriever metric is euclidean,
+        is left in self.validated_vectors for the index builder, so it does not have to
+        convert the vectors again.
+
         Args:
             documents: List of documents with embeddings
 
         Returns:
             List of documents with valid embeddings of consistent size
         """
+        self.validated_vectors = None
         if not documents:
             logger.warning("No documents provided for embedding validation")
             return []
 
-        valid_documents = []
-        embedding_sizes = {}
-
-        # First pass: collect all embedding sizes and count occurrences
-        for i, doc in enumerate(documents):
-            if not hasattr(doc, 'vector') or doc.vector is None:
-                logger.warning(f"Document {i} has no embedding vector, skipping")
-                continue
-
-            try:
-                if isinstance(doc.vector, list):
-                    embedding_size = len(doc.vector)
-                elif hasattr(doc.vector, 'shape'):
-                    embedding_size = doc.vector.shape[0] if len(doc.vector.shape) == 1 else doc.vector.shape[-1]
-                elif hasattr(doc.vector, '__len__'):
-                    embedding_size = len(doc.vector)
-                else:
-                    logger.warning(f"Document {i} has invalid embedding vector type: {type(doc.vector)}, skipping")
-                    continue
-
-                if embedding_size == 0:
-                    logger.warning(f"Document {i} has empty embedding vector, skipping")
-                    continue
-
-                embedding_sizes[embedding_size] = embedding_sizes.get(embedding_size, 0) + 1
-
-            except Exception as e:
-                logger.warning(f"Error checking embedding size for document {i}: {str(e)}, skipping")
-                continue
-
-        if not embedding_sizes:
+        keep, matrix = validate_vectors([getattr(doc, "vector", None) for doc in documents])
+        if not len(keep):
             logger.error("No valid embeddings found in any documents")
             return []
 
-        # Find the most common embedding size (this should be the correct one)
-        target_size = max(embedding_sizes.keys(), key=lambda k: embedding_sizes[k])
-        logger.info(f"Target embedding size: {target_size} (found in {embedding_sizes[target_size]} documents)")
-
-        # Log all embedding sizes found
-        for size, count in embedding_sizes.items():
-            if size != target_size:
-                logger.warning(f"Found {count} documents with incorrect embedding size {size}, will be filtered out")
-
-        # Second pass: filter documents with the target embedding size
-        for i, doc in enumerate(documents):
-            if not hasattr(doc, 'vector') or doc.vector is None:
-                continue
-
-            try:
-                if isinstance(doc.vector, list):
-                    embedding_size = len(doc.vector)
-                elif hasattr(doc.vector, 'shape'):
-                    embedding_size = doc.vector.shape[0] if len(doc.vector.shape) == 1 else doc.vector.shape[-1]
-                elif hasattr(doc.vector, '__len__'):
-                    embedding_size = len(doc.vector)
-                else:
-                    continue
-
-                if embedding_size == target_size:
-                    valid_documents.append(doc)
-                else:
-                    # Log which document is being filtered out
-                    file_path = getattr(doc, 'meta_data', {}).get('file_path', f'document_{i}')
-                    logger.warning(f"Filtering out document '{file_path}' due to embedding size mismatch: {embedding_size} != {target_size}")
-
-            except Exception as e:
-                file_path = getattr(doc, 'meta_data', {}).get('file_path', f'document_{i}')
-                logger.warning(f"Error validating embedding for document '{file_path}': {str(e)}, skipping")
-                continue
-
-        logger.info(f"Embedding validation complete: {len(valid_documents)}/{len(documents)} documents have valid embeddings")
-
-        if len(valid_documents) == 0:
-            logger.error("No documents with valid embeddings remain after filtering")
-        elif len(valid_documents) < len(documents):
-            filtered_count = len(documents) - len(valid_documents)
-            logger.warning(f"Filtered out {filtered_count} documents due to embedding issues")
-
+        valid_documents = [documents[i] for i in keep]
+        # Same preparation as faiss_index.prepare_vectors: euclidean distances use the raw vectors
+        if configs["retriever"].get("metric", "prob") != "euclidean":
+            matrix = normalize_rows(matrix)
+        self.validated_vectors = matrix
+        logger.info(f"Embedding validation complete: {len(valid_documents)}/{len(documents)} documents "
+                    f"have valid embeddings of size {matrix.shape[1]}")
+        if len(valid_documents) < len(documents):
+            logger.warning(f"Filtered out {len(documents) - len(valid_documents)} documents due to embedding issues")
         return valid_documents
 
     def prepare_retriever(self, repo_url_or_path: str, type: str = "github", access_token: str = None,
                       excluded_dirs: List[str] = None, excluded_files: List[str] = None,
-                      included_dirs: List[str] = None, included_files: List[str] = None):
+                      included_dirs: List[str] = None, included_files: List[str] = None,
+                      update: bool = False):
         """
         Prepare the retriever for a repository.
         Will load database from local storage if available.
@@ -357,13 +316,60 @@ IMPORTANT FORMATTING RULES:
             excluded_files: Optional list of file patterns to exclude from processing
             included_dirs: Optional list of directories to include exclusively
             included_files: Optional list of file patterns to include exclusively
+            update: Fetch the latest commit and re-embed only the files changed since indexing
         """
         self.initialize_db_manager()
         self.repo_url_or_path = repo_url_or_path
-        self.transformed_docs = self.db_manager.prepare_database(
-            repo_url_or_path,
-            type,
-            access_token,
+        # A retriever cached for the current database is served without waiting for a
+        # concurrent clone or re-index of the repository; only building or updating locks
+        db_file = self.db_manager.db_file_path(repo_url_or_path, type)
+        if not update and self._use_cached_retriever(db_file, excluded_dirs, excluded_files,
+                                                     included_dirs, included_files):
+            return
+        # Concurrent callers for the same repository, in this process or another worker,
+        # wait here and then load what the first one built instead of indexing again
+        with self.db_manager.index_lock(repo_url_or_path, type):
+            self._prepare_retriever_locked(repo_url_or_path, type, access_token, excluded_dirs, excluded_files,
+                                           included_dirs, included_files, update)
+
+    def _use_cached_retriever(self, db_file: str, excluded_dirs: List[str], excluded_files: List[str],
+                              included_dirs: List[str], included_files: List[str]) -> bool:
+        """Serve the retriever cached for the database file if there is one; return whether it was."""
+        cache_key = make_cache_key(db_file, self.embedder_type, excluded_dirs, excluded_files,
+                                   included_dirs, included_files)
+        cached = retriever_cache.get(cache_key)
+        if cached is None:
+            return False
+        logger.info(f"Using cached retriever for {self.repo_url_or_path} ({len(cached.documents)} documents)")
+        self.transformed_docs = cached.documents
+        self.retriever = cached.retriever
+        self.lexical_index = cached.extras.get("lexical_index")
+        return True
+
+    def _prepare_retriever_locked(self, repo_url_or_path: str, type: str, access_token: str,
+                                  excluded_dirs: List[str], excluded_files: List[str],
+                                  included_dirs: List[str], included_files: List[str], update: bool):
+        self.db_manager.reset_database()
+        self.db_manager._create_repo(repo_url_or_path, type, access_token)
+        db_file = self.db_manager.repo_paths["save_db_file"]
+
+        if update:
+            try:
+                self.db_manager.update_db_index(
+                    type, access_token, embedder_type=self.embedder_type,
+                    excluded_dirs=excluded_dirs, excluded_files=excluded_files,
+                    included_dirs=included_dirs, included_files=included_files
+                )
+            except ValueError as e:
+                # Keep serving the existing index if the remote cannot be reached
+                logger.warning(f"Incremental update failed, using existing database: {e}")
+
+        # Reuse a retriever built from the same database file if one is cached, e.g. by
+        # the caller this one waited for
+        if self._use_cached_retriever(db_file, excluded_dirs, excluded_files, included_dirs, included_files):
+            return
+
+        self.transformed_docs = self.db_manager.prepare_db_index(
             embedder_type=self.embedder_type,
             excluded_dirs=excluded_dirs,
             excluded_files=excluded_files,
@@ -372,8 +378,10 @@ IMPORTANT FORMATTING RULES:
         )
         logger.info(f"Loaded {len(self.transformed_docs)} documents for retrieval")
 
-        # Validate and filter embeddings to ensure consistent sizes
-        self.transformed_docs = self._validate_and_filter_embeddings(self.transformed_docs)
+        # Validate and filter embeddings to ensure consistent sizes; the vector store
+        # only holds vectors of a single size, so its chunks need no per-document check
+        if not isinstance(self.transformed_docs, StoredDocuments):
+            self.transformed_docs = self._validate_and_filter_embeddings(self.transformed_docs)
 
         if not self.transformed_docs:
             raise ValueError("No valid documents with embeddings found. Cannot create retriever.")
@@ -408,9 +416,6 @@ IMPORTANT FORMATTING RULES:
                 logger.error(f"Failed to create/verify index directory: {dir_err}")
                 raise
             
-            # Use the appropriate embedder for retrieval
-            retrieve_embedder = self.query_embedder if self.is_ollama_embedder else self.embedder
-            
             # Get retriever config and add index path if not present
             retriever_config = configs["retriever"].copy()
             if "index_path" not in retriever_config:
@@ -436,14 +441,30 @@ IMPORTANT FORMATTING RULES:
                 # index_path = os.path.join(index_dir, f"{repo_name}.index")
                 # retriever_config["index_path"] = index_path
                 # logger.info(f"Using index path: {index_path}")
+                # Indexes over a vector store are persisted next to it instead, see api/faiss_index.py
             
-            self.retriever = FAISSRetriever(
-                **retriever_config,
-                embedder=retrieve_embedder,
-                documents=self.transformed_docs,
-                document_map_func=lambda doc: doc.vector,
-            )
+            # The retriever is shared through the retriever cache, so it is built without an
+            # embedder; queries are embedded by the RAG instance that uses it (see call()).
+            if isinstance(self.transformed_docs, StoredDocuments):
+                self.retriever = self._load_or_build_stored_index(self.transformed_docs, retriever_config)
+            else:
+                # Index the matrix produced by validation instead of re-reading every document
+                self.retriever = FAISSRetriever(**retriever_config, embedder=None)
+                self.retriever.build_index_from_documents(self.validated_vectors)
             logger.info("FAISS retriever created successfully")
+            self.lexical_index = self._load_or_build_lexical_index(self.transformed_docs)
+
+            # Key on the database as written by prepare_db_index, which may have regenerated it
+            cache_key = make_cache_key(db_file, self.embedder_type, excluded_dirs, excluded_files,
+                                       included_dirs, included_files)
+            retriever_cache.put(cache_key, CachedRetriever(
+                documents=self.transformed_docs,
+                retriever=self.retriever,
+                db_file=db_file,
+                nbytes=estimate_nbytes(self.transformed_docs, self.retriever)
+                + (self.lexical_index.nbytes if self.lexical_index is not None else 0),
+                extras={"lexical_index": self.lexical_index},
+            ))
         except Exception as e:
             error_msg = str(e)
             logger.error(f"Error creating FAISS retriever: {error_msg}")
@@ -464,29 +485,125 @@ IMPORTANT FORMATTING RULES:
                 logger.error(f"Directory exists: {os.path.exists(index_dir)}")
                 if os.path.exists(index_dir):
                     logger.error(f"Directory writable: {os.access(index_dir, os.W_OK)}")
-            
-            # Try to provide more specific error information
-            if "All embeddings should be of the same size" in error_msg:
-                logger.error("Embedding size validation failed. This suggests there are still inconsistent embedding sizes.")
-                # Log embedding sizes for debugging
-                sizes = []
-                for i, doc in enumerate(self.transformed_docs[:10]):  # Check first 10 docs
-                    if hasattr(doc, 'vector') and doc.vector is not None:
-                        try:
-                            if isinstance(doc.vector, list):
-                                size = len(doc.vector)
-                            elif hasattr(doc.vector, 'shape'):
-                                size = doc.vector.shape[0] if len(doc.vector.shape) == 1 else doc.vector.shape[-1]
-                            elif hasattr(doc.vector, '__len__'):
-                                size = len(doc.vector)
-                            else:
-                                size = "unknown"
-                            sizes.append(f"doc_{i}: {size}")
-                        except:
-                            sizes.append(f"doc_{i}: error")
-                logger.error(f"Sample embedding sizes: {', '.join(sizes)}")
+
             raise
 
+    def _load_or_build_stored_index(self, documents: StoredDocuments, retriever_config: Dict) -> FAISSRetriever:
+        """
+        Reuse the FAISS index saved next to a vector store, building and saving it if needed.
+
+        Args:
+            documents: Chunks served from a vector store
+            retriever_config: Retriever configuration from embedder.json
+
+        Returns:
+            A retriever over the store's vectors, without an embedder
+        """
+        store = documents.store
+        metric = retriever_config.get("metric", "prob")
+        index_config = resolve_index_config(configs.get("vector_index"))
+        settings = build_settings(len(store), store.dim, index_config)
+        fingerprint = index_fingerprint(store.header, metric=metric, **settings)
+
+        index = load_index(store.base_path, fingerprint)
+        if index is None:
+            # Index the memory-mapped matrix directly instead of one list per document
+            index = build_index(prepare_vectors(documents.vectors, metric), settings, metric)
+            try:
+                save_index(store.base_path, index, fingerprint)
+            except (OSError, RuntimeError) as e:
+                logger.warning(f"Could not save FAISS index: {e}")
+        apply_search_params(index, index_config)
+        logger.info(f"Using {settings['type']} index for {len(store)} chunks")
+        return retriever_from_index(index, **retriever_config)
+
+    def _load_or_build_lexical_index(self, documents: List) -> LexicalIndex:
+        """
+        Return the identifier index over the retrieval documents, or None if hybrid retrieval is disabled.
+
+        Indexes over a vector store are persisted next to it; in-memory documents are indexed on the fly.
+        """
+        if not resolve_hybrid_config(configs.get("hybrid_retrieval"))["enabled"]:
+            return None
+        if isinstance(documents, StoredDocuments):
+            return load_or_build_for_store(documents.store)
+        return LexicalIndex.build((doc.text for doc in documents),
+                                  ((doc.meta_data or {}).get("file_path", "") for doc in documents))
+
+    def _fuse_lexical(self, query: str, retrieved) -> None:
+        """
+        Merge the lexical ranking for the query into a dense retrieval result, in place.
+
+        Rankings are combined with reciprocal rank fusion and cut to the retriever's top_k.
+        """
+        if self.lexical_index is None:
+            return
+        hybrid_config = resolve_hybrid_config(configs.get("hybrid_retrieval"))
+        lexical = self.lexical_index.search(query, hybrid_config["lexical_top_k"])
+        if not lexical:
+            return
+        top_k = configs["retriever"].get("top_k", len(retrieved.doc_indices))
+        fused = reciprocal_rank_fusion([list(retrieved.doc_indices), [i for i, _ in lexical]],
+                                       k=hybrid_config["rrf_k"], top_k=top_k)
+        retrieved.doc_indices = [i for i, _ in fused]
+        retrieved.doc_scores = [score for _, score in fused]
+
+    def embed_query(self, query: str) -> List[float]:
+        """
+        Embed a query string with this instance's query embedder.
+
+        Repeated queries are served from the query embedding cache without calling the API.
+
+        Args:
+            query: The query to embed
+
+        Returns:
+            The embedding vector of the query
+        """
+        return query_embedding_cache.get_or_embed(self.query_namespace, query, self._embed_query_uncached)
+
+    def _embed_query_uncached(self, query: str) -> List[float]:
+        """Embed a query through the embedding API."""
+        output = self.query_embedder(input=query)
+        if getattr(output, "error", None) or not output.data:
+            raise ValueError(f"Failed to embed query: {getattr(output, 'error', None) or 'empty embedding response'}")
+        return output.data[0].embedding
+
+    async def aprepare_retriever(self, repo_url_or_path: str, type: str = "github", access_token: str = None,
+                                 excluded_dirs: List[str] = None, excluded_files: List[str] = None,
+                                 included_dirs: List[str] = None, included_files: List[str] = None,
+                                 update: bool = False):
+        """
+        Prepare the retriever on the index executor, without blocking the event loop.
+
+        Calls for the same repository, credentials, filters and embedder that arrive while
+        a preparation is running wait for it and reuse its documents and retriever.
+        Takes the same arguments as prepare_retriever.
+        """
+        def _normalize(values):
+            return tuple(sorted(values)) if values else ()
+
+        key = (
+            repo_url_or_path, type, self.embedder_type,
+            hashlib.sha256((access_token or "").encode("utf-8")).hexdigest(),
+            _normalize(excluded_dirs), _normalize(excluded_files),
+            _normalize(included_dirs), _normalize(included_files),
+            bool(update),
+        )
+
+        def prepare():
+            self.prepare_retriever(repo_url_or_path, type, access_token, excluded_dirs, excluded_files,
+                                   included_dirs, included_files, update=update)
+            return self.transformed_docs, self.retriever, self.lexical_index
+
+        self.repo_url_or_path = repo_url_or_path
+        self.transformed_docs, self.retriever, self.lexical_index = await _prepare_flights.run(
+            key, lambda: run_blocking("index", prepare))
+
+    async def acall(self, query: str, language: str = "en") -> Tuple[List]:
+        """Run call() on the retrieval executor, without blocking the event loop."""
+        return await run_blocking("retrieval", self.call, query, language)
+
     def call(self, query: str, language: str = "en") -> Tuple[List]:
         """
         Process a query using RAG.
@@ -498,7 +615,11 @@ IMPORTANT FORMATTING RULES:
             Tuple of (RAGAnswer, retrieved_documents)
         """
         try:
-            retrieved_documents = self.retriever(query)
+            query_embedding = self.embed_query(query)
+            retrieved_documents = self.retriever([query_embedding])
+            retrieved_documents[0].query = query
+            # Exact identifier matches the dense ranking missed
+            self._fuse_lexical(query, retrieved_documents[0])
 
             # Fill in the documents
             retrieved_documents[0].documents = [
@@ -0,0 +1,64 @@
+"""Per-repository lock serializing cloning and indexing.
+
+Cloning and indexing a repository write the same clone directory, database and
+vector store files, so they are serialized per repository: across threads by an
+in-process lock, and across worker processes by an flock on {lock_dir}/{repo_name}.lock.
+"""
+
+import logging
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the in-process lock applies
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_repo_locks = {}
+_repo_locks_guard = threading.Lock()
+_held_repo_locks = threading.local()
+
+
+@contextmanager
+def repo_index_lock(repo_name: str, lock_dir: str):
+    """
+    Hold the indexing lock of a repository. The lock is reentrant within a thread.
+
+    Args:
+        repo_name (str): The repository name used in the storage paths.
+        lock_dir (str): Directory of the lock files shared by all worker processes.
+    """
+    held = getattr(_held_repo_locks, "names", None)
+    if held is None:
+        held = _held_repo_locks.names = set()
+    if repo_name in held:
+        yield
+        return
+
+    with _repo_locks_guard:
+        lock = _repo_locks.setdefault(repo_name, threading.Lock())
+    if not lock.acquire(blocking=False):
+        logger.info(f"Waiting for another request indexing {repo_name}")
+        lock.acquire()
+    try:
+        lock_path = os.path.join(lock_dir, f"{repo_name}.lock")
+        os.makedirs(lock_dir, exist_ok=True)
+        with open(lock_path, "a") as lock_file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    logger.info(f"Waiting for another worker indexing {repo_name}")
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            held.add(repo_name)
+            try:
+                yield
+            finally:
+                held.discard(repo_name)
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+    finally:
+        lock.release()
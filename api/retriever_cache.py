@@ -0,0 +1,190 @@
+"""Process-wide cache of ready-to-query retrievers.
+
+Building a retriever means unpickling the repository database, validating every
+embedding and adding all vectors to a FAISS index. The result only depends on the
+database file on disk, so it is shared between requests and rebuilt only when the
+database is regenerated.
+"""
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of retrievers kept in memory at once
+DEFAULT_MAX_ENTRIES = int(os.environ.get("DEEPWIKI_RETRIEVER_CACHE_SIZE", 8))
+# Approximate memory budget for all cached retrievers, in megabytes
+DEFAULT_MAX_MB = int(os.environ.get("DEEPWIKI_RETRIEVER_CACHE_MB", 2048))
+
+
+@dataclass
+class CachedRetriever:
+    """A retriever together with the documents its index was built from."""
+    documents: List[Any]
+    retriever: Any
+    db_file: str
+    nbytes: int = 0
+    extras: Dict[str, Any] = field(default_factory=dict)
+
+
+def make_cache_key(db_file: str, embedder_type: str,
+                   excluded_dirs: List[str] = None, excluded_files: List[str] = None,
+                   included_dirs: List[str] = None, included_files: List[str] = None) -> Optional[Tuple]:
+    """
+    Build the cache key for a repository database.
+
+    The modification time of the database file is part of the key, so a regenerated
+    database never matches a retriever built from the previous version.
+
+    Returns:
+        Optional[Tuple]: The key, or None if the database file does not exist yet.
+    """
+    try:
+        mtime = os.path.getmtime(db_file)
+    except OSError:
+        return None
+
+    def _normalize(values):
+        return tuple(sorted(values)) if values else ()
+
+    return (
+        db_file,
+        embedder_type,
+        _normalize(excluded_dirs),
+        _normalize(excluded_files),
+        _normalize(included_dirs),
+        _normalize(included_files),
+        mtime,
+    )
+
+
+def estimate_nbytes(documents: List[Any], retriever: Any = None) -> int:
+    """
+    Roughly estimate the memory held by a cached retriever.
+
+    Vectors stored as Python lists cost about 32 bytes per float (pointer plus float
+    object); the FAISS matrix adds 4 bytes per float on top of that. Documents served
+    from a memory-mapped vector store live in the shared page cache and are not counted.
+    """
+    total = 0
+    if getattr(documents, "store", None) is not None:
+        documents = []
+    for doc in documents:
+        vector = getattr(doc, "vector", None)
+        if vector is not None:
+            nbytes = getattr(vector, "nbytes", None)
+            total += nbytes if nbytes is not None else len(vector) * 32
+        text = getattr(doc, "text", None)
+        if text:
+            total += len(text)
+    xb = getattr(retriever, "xb", None)
+    if xb is not None and hasattr(xb, "nbytes"):
+        total += xb.nbytes
+    return total
+
+
+class RetrieverCache:
+    """
+    Bounded LRU cache of retrievers with an approximate memory budget.
+
+    Entries are evicted in least-recently-used order whenever either the entry count
+    or the memory budget is exceeded. All operations are thread-safe.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, CachedRetriever]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Optional[Hashable]) -> Optional[CachedRetriever]:
+        """Return the cached entry for key and mark it as recently used."""
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: Optional[Hashable], entry: CachedRetriever) -> None:
+        """Insert an entry, evicting older ones to respect the configured bounds."""
+        if key is None:
+            return
+        if entry.nbytes > self.max_bytes:
+            logger.warning(f"Retriever for {entry.db_file} ({entry.nbytes} bytes) exceeds the cache budget, not caching")
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= previous.nbytes
+            self._entries[key] = entry
+            self._total_bytes += entry.nbytes
+            while self._entries and (len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes):
+                evicted_key, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= evicted.nbytes
+                self.evictions += 1
+                logger.info(f"Evicted cached retriever for {evicted.db_file}")
+
+    def get_or_create(self, key: Optional[Hashable], factory: Callable[[], CachedRetriever]) -> CachedRetriever:
+        """Return the cached entry for key, building and caching it with factory on a miss."""
+        entry = self.get(key)
+        if entry is not None:
+            return entry
+        entry = factory()
+        self.put(key, entry)
+        return entry
+
+    def invalidate(self, db_file: str) -> int:
+        """
+        Drop every cached retriever built from the given database file.
+
+        Returns:
+            int: The number of entries removed.
+        """
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry.db_file == db_file]
+            for key in stale:
+                self._total_bytes -= self._entries.pop(key).nbytes
+            if stale:
+                self.invalidations += len(stale)
+                logger.info(f"Invalidated {len(stale)} cached retriever(s) for {db_file}")
+            return len(stale)
+
+    def clear(self) -> None:
+        """Remove all entries without touching the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the cache counters and current occupancy."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Shared instance used by all chat transports in this process
+retriever_cache = RetrieverCache()
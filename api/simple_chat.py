@@ -11,19 +11,17 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
-from api.config import get_model_config, configs, OPENROUTER_API_KEY, OPENAI_API_KEY, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY
-from api.data_pipeline import count_tokens, get_file_content
+from api.config import get_model_config, get_context_budget, configs, OPENROUTER_API_KEY, OPENAI_API_KEY, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY
+from api.data_pipeline import count_tokens, aget_file_content
 from api.openai_client import OpenAIClient
 from api.openrouter_client import OpenRouterClient
 from api.bedrock_client import BedrockClient
 from api.azureai_client import AzureAIClient
+from api.client_pool import get_model_client
+from api.context_builder import build_context
 from api.rag import RAG
-from api.prompts import (
-    DEEP_RESEARCH_FIRST_ITERATION_PROMPT,
-    DEEP_RESEARCH_FINAL_ITERATION_PROMPT,
-    DEEP_RESEARCH_INTERMEDIATE_ITERATION_PROMPT,
-    SIMPLE_CHAT_SYSTEM_PROMPT
-)
+from api.executors import run_blocking
+from api.prompt_builder import ChatPrompt, language_name, parse_conversation, system_prompt
 
 # Configure logging
 from api.logging_config import setup_logging
@@ -71,6 +69,7 @@ class ChatCompletionRequest(BaseModel):
     excluded_files: Optional[str] = Field(None, description="Comma-separated list of file patterns to exclude from processing")
     included_dirs: Optional[str] = Field(None, description="Comma-separated list of directories to include exclusively")
     included_files: Optional[str] = Field(None, description="Comma-separated list of file patterns to include exclusively")
+    refresh: Optional[bool] = Field(False, description="Re-index files changed in the repository since it was last indexed")
 
 @app.post("/chat/completions/stream")
 async def chat_completions_stream(request: ChatCompletionRequest):
@@ -81,7 +80,7 @@ async def chat_completions_stream(request: ChatCompletionRequest):
         if request.messages and len(request.messages) > 0:
             last_message = request.messages[-1]
             if hasattr(last_message, 'content') and last_message.content:
-                tokens = count_tokens(last_message.content, request.provider == "ollama")
+                tokens = count_tokens(last_message.content, "ollama" if request.provider == "ollama" else None)
                 logger.info(f"Request size: {tokens} tokens")
                 if tokens > 8000:
                     logger.warning(f"Request exceeds recommended token limit ({tokens} > 7500)")
@@ -89,7 +88,8 @@ async def chat_completions_stream(request: ChatCompletionRequest):
 
         # Create a new RAG instance for this request
         try:
-            request_rag = RAG(provider=request.provider, model=request.model)
+            # Construction may contact the embedding service (e.g. the Ollama model check)
+            request_rag = await run_blocking("retrieval", RAG, provider=request.provider, model=request.model)
 
             # Extract custom file filter parameters if provided
             excluded_dirs = None
@@ -110,7 +110,9 @@ async def chat_completions_stream(request: ChatCompletionRequest):
                 included_files = [unquote(file_pattern) for file_pattern in request.included_files.split('\n') if file_pattern.strip()]
                 logger.info(f"Using custom included files: {included_files}")
 
-            request_rag.prepare_retriever(request.repo_url, request.type, request.token, excluded_dirs, excluded_files, included_dirs, included_files)
+            # Runs on the index executor so other connections keep streaming meanwhile
+            await request_rag.aprepare_retriever(request.repo_url, request.type, request.token, excluded_dirs, excluded_files,
+                                                 included_dirs, included_files, update=bool(request.refresh))
             logger.info(f"Retriever prepared for {request.repo_url}")
         except ValueError as e:
             if "No valid documents with embeddings found" in str(e):
@@ -127,61 +129,12 @@ async def chat_completions_stream(request: ChatCompletionRequest):
             else:
                 raise HTTPException(status_code=500, detail=f"Error preparing retriever: {str(e)}")
 
-        # Validate request
-        if not request.messages or len(request.messages) == 0:
-            raise HTTPException(status_code=400, detail="No messages provided")
-
-        last_message = request.messages[-1]
-        if last_message.role != "user":
-            raise HTTPException(status_code=400, detail="Last message must be from the user")
-
-        # Process previous messages to build conversation history
-        for i in range(0, len(request.messages) - 1, 2):
-            if i + 1 < len(request.messages):
-                user_msg = request.messages[i]
-                assistant_msg = request.messages[i + 1]
-
-                if user_msg.role == "user" and assistant_msg.role == "assistant":
-                    request_rag.memory.add_dialog_turn(
-                        user_query=user_msg.content,
-                        assistant_response=assistant_msg.content
-                    )
-
-        # Check if this is a Deep Research request
-        is_deep_research = False
-        research_iteration = 1
-
-        # Process messages to detect Deep Research requests
-        for msg in request.messages:
-            if hasattr(msg, 'content') and msg.content and "[DEEP RESEARCH]" in msg.content:
-                is_deep_research = True
-                # Only remove the tag from the last message
-                if msg == request.messages[-1]:
-                    # Remove the Deep Research tag
-                    msg.content = msg.content.replace("[DEEP RESEARCH]", "").strip()
-
-        # Count research iterations if this is a Deep Research request
-        if is_deep_research:
-            research_iteration = sum(1 for msg in request.messages if msg.role == 'assistant') + 1
-            logger.info(f"Deep Research request detected - iteration {research_iteration}")
-
-            # Check if this is a continuation request
-            if "continue" in last_message.content.lower() and "research" in last_message.content.lower():
-                # Find the original topic from the first user message
-                original_topic = None
-                for msg in request.messages:
-                    if msg.role == "user" and "continue" not in msg.content.lower():
-                        original_topic = msg.content.replace("[DEEP RESEARCH]", "").strip()
-                        logger.info(f"Found original research topic: {original_topic}")
-                        break
-
-                if original_topic:
-                    # Replace the continuation message with the original topic
-                    last_message.content = original_topic
-                    logger.info(f"Using original topic for research: {original_topic}")
-
-        # Get the query from the last message
-        query = last_message.content
+        # Validate the messages and work out the query, history and Deep Research state
+        try:
+            conversation = parse_conversation(request.messages)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = conversation.query
 
         # Only retrieve documents if input is not too large
         context_text = ""
@@ -199,33 +152,20 @@ async def chat_completions_stream(request: ChatCompletionRequest):
                 # Try to perform RAG retrieval
                 try:
                     # This will use the actual RAG implementation
-                    retrieved_documents = request_rag(rag_query, language=request.language)
+                    retrieved_documents = await request_rag.acall(rag_query, language=request.language)
 
                     if retrieved_documents and retrieved_documents[0].documents:
                         # Format context for the prompt in a more structured way
                         documents = retrieved_documents[0].documents
                         logger.info(f"Retrieved {len(documents)} documents")
 
-                        # Group documents by file path
-                        docs_by_file = {}
-                        for doc in documents:
-                            file_path = doc.meta_data.get('file_path', 'unknown')
-                            if file_path not in docs_by_file:
-                                docs_by_file[file_path] = []
-                            docs_by_file[file_path].append(doc)
-
-                        # Format context text with file path grouping
-                        context_parts = []
-                        for file_path, docs in docs_by_file.items():
-                            # Add file header with metadata
-                            header = f"## File Path: {file_path}\n\n"
-                            # Add document content
-                            content = "\n\n".join([doc.text for doc in docs])
-
-                            context_parts.append(f"{header}{content}")
-
-                        # Join all parts with clear separation
-                        context_text = "\n\n" + "-" * 10 + "\n\n".join(context_parts)
+                        # Merge overlapping chunks and keep the most relevant ones within the model's budget
+                        token_encoding = "ollama" if request.provider == "ollama" else None
+                        context_text = build_context(
+                            documents,
+                            get_context_budget(request.provider, request.model),
+                            lambda text: count_tokens(text, token_encoding),
+                        )
                     else:
                         logger.warning("No documents retrieved from RAG")
                 except Exception as e:
@@ -236,102 +176,32 @@ async def chat_completions_stream(request: ChatCompletionRequest):
                 logger.error(f"Error retrieving documents: {str(e)}")
                 context_text = ""
 
-        # Get repository information
-        repo_url = request.repo_url
-        repo_name = repo_url.split("/")[-1] if "/" in repo_url else repo_url
-
-        # Determine repository type
-        repo_type = request.type
-
-        # Get language information
-        language_code = request.language or configs["lang_config"]["default"]
-        supported_langs = configs["lang_config"]["supported_languages"]
-        language_name = supported_langs.get(language_code, "English")
-
-        # Create system prompt
-        if is_deep_research:
-            # Check if this is the first iteration
-            is_first_iteration = research_iteration == 1
-
-            # Check if this is the final iteration
-            is_final_iteration = research_iteration >= 5
-
-            if is_first_iteration:
-                system_prompt = DEEP_RESEARCH_FIRST_ITERATION_PROMPT.format(
-                    repo_type=repo_type,
-                    repo_url=repo_url,
-                    repo_name=repo_name,
-                    language_name=language_name
-                )
-            elif is_final_iteration:
-                system_prompt = DEEP_RESEARCH_FINAL_ITERATION_PROMPT.format(
-                    repo_type=repo_type,
-                    repo_url=repo_url,
-                    repo_name=repo_name,
-                    research_iteration=research_iteration,
-                    language_name=language_name
-                )
-            else:
-                system_prompt = DEEP_RESEARCH_INTERMEDIATE_ITERATION_PROMPT.format(
-                    repo_type=repo_type,
-                    repo_url=repo_url,
-                    repo_name=repo_name,
-                    research_iteration=research_iteration,
-                    language_name=language_name
-                )
-        else:
-            system_prompt = SIMPLE_CHAT_SYSTEM_PROMPT.format(
-                repo_type=repo_type,
-                repo_url=repo_url,
-                repo_name=repo_name,
-                language_name=language_name
-            )
-
         # Fetch file content if provided
         file_content = ""
         if request.filePath:
             try:
-                file_content = get_file_content(request.repo_url, request.filePath, request.type, request.token)
+                file_content = await aget_file_content(request.repo_url, request.filePath, request.type, request.token)
                 logger.info(f"Successfully retrieved content for file: {request.filePath}")
             except Exception as e:
                 logger.error(f"Error retrieving file content: {str(e)}")
                 # Continue without file content if there's an error
 
-        # Format conversation history
-        conversation_history = ""
-        for turn_id, turn in request_rag.memory().items():
-            if not isinstance(turn_id, int) and hasattr(turn, 'user_query') and hasattr(turn, 'assistant_response'):
-                conversation_history += f"<turn>\n<user>{turn.user_query.query_str}</user>\n<assistant>{turn.assistant_response.response_str}</assistant>\n</turn>\n"
-
-        # Create the prompt with context
-        prompt = f"/no_think {system_prompt}\n\n"
-
-        if conversation_history:
-            prompt += f"<conversation_history>\n{conversation_history}</conversation_history>\n\n"
-
-        # Check if filePath is provided and fetch file content if it exists
-        if file_content:
-            # Add file content to the prompt after conversation history
-            prompt += f"<currentFileContent path=\"{request.filePath}\">\n{file_content}\n</currentFileContent>\n\n"
-
-        # Only include context if it's not empty
-        CONTEXT_START = "<START_OF_CONTEXT>"
-        CONTEXT_END = "<END_OF_CONTEXT>"
-        if context_text.strip():
-            prompt += f"{CONTEXT_START}\n{context_text}\n{CONTEXT_END}\n\n"
-        else:
-            # Add a note that we're skipping RAG due to size constraints or because it's the isolated API
-            logger.info("No context available from RAG")
-            prompt += "<note>Answering without retrieval augmentation.</note>\n\n"
-
-        prompt += f"<query>\n{query}\n</query>\n\nAssistant: "
+        # System prompt first: requests in the same mode and language share its exact bytes
+        prompt = ChatPrompt(
+            system=system_prompt(request.type, request.repo_url, language_name(request.language, configs["lang_config"]),
+                                 conversation.is_deep_research, conversation.research_iteration),
+            query=query,
+            history=conversation.history,
+            file_path=request.filePath,
+            file_content=file_content,
+            context_text=context_text,
+        )
+        prompt_input = prompt.for_provider(request.provider)
 
         model_config = get_model_config(request.provider, request.model)["model_kwargs"]
 
         if request.provider == "ollama":
-            prompt += " /no_think"
-
-            model = OllamaClient()
+            model = get_model_client("ollama", OllamaClient)
             model_kwargs = {
                 "model": model_config["model"],
                 "stream": True,
@@ -343,7 +213,7 @@ async def chat_completions_stream(request: ChatCompletionRequest):
             }
 
             api_kwargs = model.convert_inputs_to_api_kwargs(
-                input=prompt,
+                input=prompt_input,
                 model_kwargs=model_kwargs,
                 model_type=ModelType.LLM
             )
@@ -355,7 +225,7 @@ async def chat_completions_stream(request: ChatCompletionRequest):
                 logger.warning("OPENROUTER_API_KEY not configured, but continuing with request")
                 # We'll let the OpenRouterClient handle this and return a friendly error message
 
-            model = OpenRouterClient()
+            model = get_model_client("openrouter", OpenRouterClient)
             model_kwargs = {
                 "model": request.model,
                 "stream": True,
@@ -366,7 +236,7 @@ async def chat_completions_stream(request: ChatCompletionRequest):
                 model_kwargs["top_p"] = model_config["top_p"]
 
             api_kwargs = model.convert_inputs_to_api_kwargs(
-                input=prompt,
+                input=prompt_input,
                 model_kwargs=model_kwargs,
                 model_type=ModelType.LLM
             )
@@ -379,7 +249,7 @@ async def chat_completions_stream(request: ChatCompletionRequest):
                 # We'll let the OpenAIClient handle this and return an error message
 
             # Initialize Openai client
-            model = OpenAIClient()
+            model = get_model_client("openai", OpenAIClient)
             model_kwargs = {
                 "model": request.model,
                 "stream": True,
@@ -390,7 +260,7 @@ async def chat_completions_stream(request: ChatCompletionRequest):
                 model_kwargs["top_p"] = model_config["top_p"]
 
             api_kwargs = model.convert_inputs_to_api_kwargs(
-                input=prompt,
+                input=prompt_input,
                 model_kwargs=model_kwargs,
                 model_type=ModelType.LLM
             )
@@ -403,7 +273,7 @@ async def chat_completions_stream(request: ChatCompletionRequest):
                 # We'll let the BedrockClient handle this and return an error message
 
             # Initialize Bedrock client
-            model = BedrockClient()
+            model = get_model_client("bedrock", BedrockClient)
             model_kwargs = {
                 "model": request.model,
                 "temperature": model_config["temperature"],
@@ -411,7 +281,7 @@ async def chat_completions_stream(request: ChatCompletionRequest):
             }
 
             api_kwargs = model.convert_inputs_to_api_kwargs(
-                input=prompt,
+                input=prompt_input,
                 model_kwargs=model_kwargs,
                 model_type=ModelType.LLM
             )
@@ -419,7 +289,7 @@ async def chat_completions_stream(request: ChatCompletionRequest):
             logger.info(f"Using Azure AI with model: {request.model}")
 
             # Initialize Azure AI client
-            model = AzureAIClient()
+            model = get_model_client("azure", AzureAIClient)
             model_kwargs = {
                 "model": request.model,
                 "stream": True,
@@ -428,13 +298,14 @@ async def chat_completions_stream(request: ChatCompletionRequest):
             }
 
             api_kwargs = model.convert_inputs_to_api_kwargs(
-                input=prompt,
+                input=prompt_input,
                 model_kwargs=model_kwargs,
                 model_type=ModelType.LLM
             )
         else:
             # Initialize Google Generative AI model
-            model = genai.GenerativeModel(
+            model = get_model_client(
+                "google", genai.GenerativeModel,
                 model_name=model_config["model"],
                 generation_config={
                     "temperature": model_config["temperature"],
@@ -470,16 +341,9 @@ async def chat_completions_stream(request: ChatCompletionRequest):
                     try:
                         # Get the response and handle it properly using the previously created api_kwargs
                         logger.info("Making Openai API call")
-                        response = await model.acall(api_kwargs=api_kwargs, model_type=ModelType.LLM)
-                        # Handle streaming response from Openai
-                        async for chunk in response:
-                           choices = getattr(chunk, "choices", [])
-                           if len(choices) > 0:
-                               delta = getattr(choices[0], "delta", None)
-                               if delta is not None:
-                                    text = getattr(delta, "content", None)
-                                    if text is not None:
-                                        yield text
+                        # Streams token by token, or falls back to one chunk for keys that may not stream
+                        async for text in model.astream_text(api_kwargs):
+                            yield text
                     except Exception as e_openai:
                         logger.error(f"Error with Openai API: {str(e_openai)}")
                         yield f"\nError with Openai API: {str(e_openai)}\n\nPlease check that you have set the OPENAI_API_KEY environment variable with a valid API key."
@@ -516,7 +380,7 @@ async def chat_completions_stream(request: ChatCompletionRequest):
                         yield f"\nError with Azure AI API: {str(e_azure)}\n\nPlease check that you have set the AZURE_OPENAI_API_KEY, AZURE_OPENAI_ENDPOINT, and AZURE_OPENAI_VERSION environment variables with valid values."
                 else:
                     # Generate streaming response
-                    response = model.generate_content(prompt, stream=True)
+                    response = model.generate_content(prompt_input, stream=True)
                     # Stream the response
                     for chunk in response:
                         if hasattr(chunk, 'text'):
@@ -532,20 +396,9 @@ async def chat_completions_stream(request: ChatCompletionRequest):
                     logger.warning("Token limit exceeded, retrying without context")
                     try:
                         # Create a simplified prompt without context
-                        simplified_prompt = f"/no_think {system_prompt}\n\n"
-                        if conversation_history:
-                            simplified_prompt += f"<conversation_history>\n{conversation_history}</conversation_history>\n\n"
-
-                        # Include file content in the fallback prompt if it was retrieved
-                        if request.filePath and file_content:
-                            simplified_prompt += f"<currentFileContent path=\"{request.filePath}\">\n{file_content}\n</currentFileContent>\n\n"
-
-                        simplified_prompt += "<note>Answering without retrieval augmentation due to input size constraints.</note>\n\n"
-                        simplified_prompt += f"<query>\n{query}\n</query>\n\nAssistant: "
+                        simplified_prompt = prompt.for_provider(request.provider, include_context=False)
 
                         if request.provider == "ollama":
-                            simplified_prompt += " /no_think"
-
                             # Create new api_kwargs with the simplified prompt
                             fallback_api_kwargs = model.convert_inputs_to_api_kwargs(
                                 input=simplified_prompt,
@@ -592,11 +445,7 @@ async def chat_completions_stream(request: ChatCompletionRequest):
 
                                 # Get the response using the simplified prompt
                                 logger.info("Making fallback Openai API call")
-                                fallback_response = await model.acall(api_kwargs=fallback_api_kwargs, model_type=ModelType.LLM)
-
-                                # Handle streaming fallback_response from Openai
-                                async for chunk in fallback_response:
-                                    text = chunk if isinstance(chunk, str) else getattr(chunk, 'text', str(chunk))
+                                async for text in model.astream_text(fallback_api_kwargs):
                                     yield text
                             except Exception as e_fallback:
                                 logger.error(f"Error with Openai API fallback: {str(e_fallback)}")
@@ -651,7 +500,8 @@ async def chat_completions_stream(request: ChatCompletionRequest):
                         else:
                             # Initialize Google Generative AI model
                             model_config = get_model_config(request.provider, request.model)
-                            fallback_model = genai.GenerativeModel(
+                            fallback_model = get_model_client(
+                                "google", genai.GenerativeModel,
                                 model_name=model_config["model"],
                                 generation_config={
                                     "temperature": model_config["model_kwargs"].get("temperature", 0.7),
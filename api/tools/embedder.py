@@ -1,5 +1,6 @@
 import adalflow as adal
 
+from api.client_pool import get_model_client
 from api.config import configs, get_embedder_type
 
 
@@ -14,34 +15,29 @@ def get_embedder(is_local_ollama: bool = False, use_google_embedder: bool = Fals
     Returns:
         adal.Embedder: Configured embedder instance
     """
-    # Determine which embedder config to use
+    # Determine which embedder to use; the provider also keys the shared model client
     if embedder_type:
-        if embedder_type == 'ollama':
-            embedder_config = configs["embedder_ollama"]
-        elif embedder_type == 'google':
-            embedder_config = configs["embedder_google"]
-        else:  # default to openai
-            embedder_config = configs["embedder"]
+        provider = embedder_type
     elif is_local_ollama:
-        embedder_config = configs["embedder_ollama"]
+        provider = 'ollama'
     elif use_google_embedder:
-        embedder_config = configs["embedder_google"]
+        provider = 'google'
     else:
         # Auto-detect based on current configuration
-        current_type = get_embedder_type()
-        if current_type == 'ollama':
-            embedder_config = configs["embedder_ollama"]
-        elif current_type == 'google':
-            embedder_config = configs["embedder_google"]
-        else:
-            embedder_config = configs["embedder"]
+        provider = get_embedder_type()
+
+    if provider == 'ollama':
+        embedder_config = configs["embedder_ollama"]
+    elif provider == 'google':
+        embedder_config = configs["embedder_google"]
+    else:  # default to openai
+        provider = 'openai'
+        embedder_config = configs["embedder"]
 
     # --- Initialize Embedder ---
-    model_client_class = embedder_config["model_client"]
-    if "initialize_kwargs" in embedder_config:
-        model_client = model_client_class(**embedder_config["initialize_kwargs"])
-    else:
-        model_client = model_client_class()
+    # The model client is shared; only the lightweight Embedder wrapper is built per call
+    model_client = get_model_client(provider, embedder_config["model_client"],
+                                    **embedder_config.get("initialize_kwargs", {}))
     
     # Create embedder with basic parameters
     embedder_kwargs = {"model_client": model_client, "model_kwargs": embedder_config["model_kwargs"]}
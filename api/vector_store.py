@@ -0,0 +1,290 @@
+"""Memory-mapped, array-backed storage for the embedded chunks of a repository.
+
+The pickled LocalDB keeps every vector as a Python list of floats, which costs about
+eight times the memory of the raw numbers and has to be unpickled in full before the
+first query. For serving, the chunks are also written in a columnar layout:
+
+    {base}.vectors.npy   contiguous (n, dim) float32 or float16 matrix
+    {base}.texts.bin     UTF-8 chunk texts, back to back
+    {base}.offsets.npy   (n + 1,) int64 byte offsets into texts.bin
+    {base}.chunks.json   header plus per-chunk columns (ids, orders, metadata, ...)
+
+The .npy and .bin files are opened with mmap, so loading a store only parses the JSON
+columns, and processes serving the same repository share the same physical pages.
+"""
+
+import json
+import logging
+import os
+from collections.abc import Sequence
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+STORE_VERSION = 1
+# Storage precision of the vectors; float16 halves the size at a small recall cost
+VECTOR_DTYPE = os.environ.get("DEEPWIKI_VECTOR_DTYPE", "float32")
+
+
+def store_paths(base_path: str) -> Dict[str, str]:
+    """Return the paths of the files making up the store rooted at base_path."""
+    return {
+        "vectors": f"{base_path}.vectors.npy",
+        "texts": f"{base_path}.texts.bin",
+        "offsets": f"{base_path}.offsets.npy",
+        "chunks": f"{base_path}.chunks.json",
+    }
+
+
+def _vector_size(vector: Any) -> int:
+    if vector is None:
+        return 0
+    shape = getattr(vector, "shape", None)
+    if shape is not None:
+        return shape[-1] if len(shape) else 0
+    try:
+        return len(vector)
+    except TypeError:
+        return 0
+
+
+def validate_vectors(vectors: Sequence) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Keep the vectors usable for retrieval and stack them into one matrix.
+
+    A vector is kept when it has the most common size among all vectors, only finite
+    values and a non-zero norm. Sizes are read once per vector; every other check runs
+    on the stacked matrix.
+
+    Args:
+        vectors (Sequence): Embeddings as lists or arrays; None marks a missing one.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Positions of the kept vectors in the input, and
+        the (kept, dim) float32 matrix of those vectors.
+    """
+    sizes = np.fromiter((_vector_size(v) for v in vectors), dtype=np.int64, count=len(vectors))
+    if not len(sizes) or not sizes.any():
+        return np.zeros(0, dtype=np.int64), np.zeros((0, 0), dtype=np.float32)
+
+    counts = np.bincount(sizes)
+    counts[0] = 0
+    dim = int(counts.argmax())
+    candidates = np.flatnonzero(sizes == dim)
+    if isinstance(vectors, np.ndarray):
+        matrix = np.asarray(vectors[candidates], dtype=np.float32)
+    else:
+        matrix = np.asarray([vectors[i] for i in candidates], dtype=np.float32)
+
+    finite = np.isfinite(matrix).all(axis=1)
+    with np.errstate(over="ignore", invalid="ignore"):
+        nonzero = np.einsum("ij,ij->i", matrix, matrix) > 0
+    valid = finite & nonzero
+
+    missing = int((sizes == 0).sum())
+    wrong_size = len(sizes) - missing - len(candidates)
+    if missing or wrong_size or not valid.all():
+        logger.warning(f"Dropping embeddings: {missing} missing, {wrong_size} not of size {dim}, "
+                       f"{int((~finite).sum())} with NaN/inf, {int((finite & ~nonzero).sum())} all-zero")
+    return candidates[valid], np.ascontiguousarray(matrix[valid])
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize the rows of a float32 matrix in place and return it."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+def write_vector_store(base_path: str, documents: List[Any], source_mtime: float = None,
+                       dtype: str = VECTOR_DTYPE) -> int:
+    """
+    Write embedded chunks to a columnar store.
+
+    Chunks whose vector fails validate_vectors are left out, so a store only ever
+    holds vectors usable for retrieval.
+
+    Args:
+        base_path (str): Path prefix of the store files.
+        documents (List[Document]): The embedded chunks.
+        source_mtime (float, optional): Modification time of the database the chunks come
+            from, checked by VectorStore.open to detect a stale store.
+        dtype (str, optional): "float32" or "float16".
+
+    Returns:
+        int: The number of chunks written.
+    """
+    keep, matrix = validate_vectors([getattr(doc, "vector", None) for doc in documents])
+    if not len(keep):
+        raise ValueError("No documents with embeddings to store")
+    kept = [documents[i] for i in keep]
+    dim = matrix.shape[1]
+
+    paths = store_paths(base_path)
+    os.makedirs(os.path.dirname(os.path.abspath(base_path)), exist_ok=True)
+
+    vectors = matrix.astype(np.dtype(dtype), copy=False)
+    offsets = np.zeros(len(kept) + 1, dtype=np.int64)
+    columns = {"ids": [], "parent_doc_ids": [], "orders": [], "estimated_num_tokens": [], "meta_data": []}
+
+    tmp_suffix = f".tmp{os.getpid()}"
+    with open(paths["texts"] + tmp_suffix, "wb") as texts_file:
+        for i, doc in enumerate(kept):
+            encoded = (doc.text or "").encode("utf-8", errors="surrogatepass")
+            texts_file.write(encoded)
+            offsets[i + 1] = offsets[i] + len(encoded)
+            columns["ids"].append(str(doc.id) if doc.id is not None else None)
+            columns["parent_doc_ids"].append(str(doc.parent_doc_id) if doc.parent_doc_id is not None else None)
+            columns["orders"].append(doc.order)
+            columns["estimated_num_tokens"].append(getattr(doc, "estimated_num_tokens", None))
+            columns["meta_data"].append(doc.meta_data or {})
+
+    # np.save appends .npy to names without it, so write through file objects
+    with open(paths["vectors"] + tmp_suffix, "wb") as f:
+        np.save(f, vectors)
+    with open(paths["offsets"] + tmp_suffix, "wb") as f:
+        np.save(f, offsets)
+    header = {
+        "version": STORE_VERSION,
+        "count": len(kept),
+        "dim": dim,
+        "dtype": str(vectors.dtype),
+        "source_mtime": source_mtime,
+    }
+    with open(paths["chunks"] + tmp_suffix, "w", encoding="utf-8") as f:
+        json.dump({**header, **columns}, f)
+
+    # The chunks file is replaced last: a store is only valid once its header is in place
+    for key in ("vectors", "texts", "offsets", "chunks"):
+        os.replace(paths[key] + tmp_suffix, paths[key])
+    logger.info(f"Wrote vector store with {len(kept)} chunks of dimension {dim} ({vectors.dtype}) to {base_path}")
+    return len(kept)
+
+
+def remove_vector_store(base_path: str) -> None:
+    """Delete the files of a store, if present."""
+    for path in store_paths(base_path).values():
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class VectorStore:
+    """
+    Read-only view of a store written by write_vector_store.
+
+    Vectors and texts stay on disk behind memory maps; only the JSON columns are
+    parsed into memory.
+    """
+
+    def __init__(self, base_path: str):
+        self.base_path = base_path
+        paths = store_paths(base_path)
+        with open(paths["chunks"], "r", encoding="utf-8") as f:
+            columns = json.load(f)
+        if columns.get("version") != STORE_VERSION:
+            raise ValueError(f"Unsupported vector store version {columns.get('version')}")
+        self.header = {key: columns[key] for key in ("version", "count", "dim", "dtype", "source_mtime")}
+        self._ids = columns["ids"]
+        self._parent_doc_ids = columns["parent_doc_ids"]
+        self._orders = columns["orders"]
+        self._estimated_num_tokens = columns["estimated_num_tokens"]
+        self._meta_data = columns["meta_data"]
+
+        self.vectors = np.load(paths["vectors"], mmap_mode="r")
+        self._offsets = np.load(paths["offsets"], mmap_mode="r")
+        texts_size = os.path.getsize(paths["texts"])
+        self._texts = np.memmap(paths["texts"], dtype=np.uint8, mode="r") if texts_size else np.zeros(0, np.uint8)
+        if self.vectors.shape != (self.header["count"], self.header["dim"]):
+            raise ValueError(f"Vector store {base_path} is inconsistent: {self.vectors.shape} vectors "
+                             f"for {self.header['count']} chunks of dimension {self.header['dim']}")
+
+    @classmethod
+    def open(cls, base_path: str, source_mtime: float = None) -> Optional["VectorStore"]:
+        """
+        Open a store if it exists and was written from the given database version.
+
+        Returns:
+            Optional[VectorStore]: The store, or None if it is missing, stale or unreadable.
+        """
+        if not os.path.exists(store_paths(base_path)["chunks"]):
+            return None
+        try:
+            store = cls(base_path)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Could not open vector store {base_path}: {e}")
+            return None
+        if source_mtime is not None and store.header["source_mtime"] != source_mtime:
+            logger.info(f"Vector store {base_path} is older than its database")
+            return None
+        return store
+
+    def __len__(self) -> int:
+        return self.header["count"]
+
+    @property
+    def dim(self) -> int:
+        return self.header["dim"]
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes of the memory-mapped vectors and texts."""
+        return int(self.vectors.nbytes + self._texts.nbytes)
+
+    def text(self, index: int) -> str:
+        start, end = int(self._offsets[index]), int(self._offsets[index + 1])
+        return self._texts[start:end].tobytes().decode("utf-8", errors="surrogatepass")
+
+    def meta_data(self, index: int) -> Dict[str, Any]:
+        return self._meta_data[index]
+
+    def vector(self, index: int) -> np.ndarray:
+        return self.vectors[index]
+
+    def document(self, index: int):
+        """Materialize one chunk as an adalflow Document."""
+        from adalflow.core.types import Document
+
+        return Document(
+            text=self.text(index),
+            meta_data=dict(self._meta_data[index]),
+            vector=self.vectors[index],
+            id=self._ids[index],
+            order=self._orders[index],
+            parent_doc_id=self._parent_doc_ids[index],
+            estimated_num_tokens=self._estimated_num_tokens[index],
+        )
+
+    def documents(self) -> "StoredDocuments":
+        return StoredDocuments(self)
+
+
+class StoredDocuments(Sequence):
+    """
+    Lazy sequence of the chunks of a VectorStore.
+
+    Documents are built on access, so holding the sequence costs no more than the
+    store itself; only the retrieved chunks are ever materialized.
+    """
+
+    def __init__(self, store: VectorStore):
+        self.store = store
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.store.document(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("document index out of range")
+        return self.store.document(index)
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self.store.vectors
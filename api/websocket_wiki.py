@@ -1,3 +1,4 @@
+import json
 import logging
 import os
 from typing import List, Optional, Dict, Any
@@ -9,13 +10,19 @@ from adalflow.core.types import ModelType
 from fastapi import WebSocket, WebSocketDisconnect, HTTPException
 from pydantic import BaseModel, Field
 
-from api.config import get_model_config, configs, OPENROUTER_API_KEY, OPENAI_API_KEY
-from api.data_pipeline import count_tokens, get_file_content
-from api.openai_client import OpenAIClient
+from api.config import get_model_config, get_context_budget, configs, OPENROUTER_API_KEY, OPENAI_API_KEY
+from api.data_pipeline import DatabaseManager, count_tokens, aget_file_content
+from api.openai_client import OpenAIClient, is_streaming_not_allowed_error
 from api.openrouter_client import OpenRouterClient
 from api.azureai_client import AzureAIClient
 from api.dashscope_client import DashscopeClient
+from api.client_pool import get_model_client
+from api.context_builder import build_context
+from api.prompt_builder import ChatPrompt, language_name, parse_conversation, system_prompt
 from api.rag import RAG
+from api.executors import run_blocking
+from api.index_jobs import database_exists, get_job_manager
+from api.answer_cache import AnswerRecorder, get_answer_cache, hash_token, make_scope
 
 # Configure logging
 from api.logging_config import setup_logging
@@ -48,6 +55,8 @@ class ChatCompletionRequest(BaseModel):
     excluded_files: Optional[str] = Field(None, description="Comma-separated list of file patterns to exclude from processing")
     included_dirs: Optional[str] = Field(None, description="Comma-separated list of directories to include exclusively")
     included_files: Optional[str] = Field(None, description="Comma-separated list of file patterns to include exclusively")
+    refresh: Optional[bool] = Field(False, description="Re-index files changed in the repository since it was last indexed")
+    progress: Optional[bool] = Field(False, description="Send indexing progress as JSON messages of type 'index_progress' before the answer")
 
 async def handle_websocket_chat(websocket: WebSocket):
     """
@@ -66,7 +75,7 @@ async def handle_websocket_chat(websocket: WebSocket):
         if request.messages and len(request.messages) > 0:
             last_message = request.messages[-1]
             if hasattr(last_message, 'content') and last_message.content:
-                tokens = count_tokens(last_message.content, request.provider == "ollama")
+                tokens = count_tokens(last_message.content, "ollama" if request.provider == "ollama" else None)
                 logger.info(f"Request size: {tokens} tokens")
                 if tokens > 8000:
                     logger.warning(f"Request exceeds recommended token limit ({tokens} > 7500)")
@@ -75,7 +84,8 @@ async def handle_websocket_chat(websocket: WebSocket):
         # Create a new RAG instance for this request
         try:
             logger.info(f"Creating RAG instance for {request.provider} {request.model}")    
-            request_rag = RAG(provider=request.provider, model=request.model)
+            # Construction may contact the embedding service (e.g. the Ollama model check)
+            request_rag = await run_blocking("retrieval", RAG, provider=request.provider, model=request.model)
 
             # Extract custom file filter parameters if provided
             excluded_dirs = None
@@ -96,7 +106,29 @@ async def handle_websocket_chat(websocket: WebSocket):
                 included_files = [unquote(file_pattern) for file_pattern in request.included_files.split('\n') if file_pattern.strip()]
                 logger.info(f"Using custom included files: {included_files}")
 
-            request_rag.prepare_retriever(request.repo_url, request.type, request.token, excluded_dirs, excluded_files, included_dirs, included_files)
+            # New repositories and refreshes are indexed by a background job, which keeps
+            # running if the client disconnects; the socket reports its progress meanwhile
+            if request.refresh or not await run_blocking("retrieval", database_exists, request.repo_url, request.type):
+                job_manager = get_job_manager()
+                job = job_manager.submit(request.repo_url, request.type, request.token,
+                                         embedder_type=request_rag.embedder_type,
+                                         excluded_dirs=excluded_dirs, excluded_files=excluded_files,
+                                         included_dirs=included_dirs, included_files=included_files,
+                                         refresh=bool(request.refresh))
+
+                async def send_progress(snapshot):
+                    if request.progress:
+                        await websocket.send_text(json.dumps({"type": "index_progress", "job_id": snapshot["id"],
+                                                              "status": snapshot["status"], "stage": snapshot["stage"],
+                                                              "current": snapshot["current"], "total": snapshot["total"]}))
+
+                job = await job_manager.wait(job.id, on_progress=send_progress)
+                if job is None or job.status != "succeeded":
+                    raise ValueError(f"Indexing {request.repo_url} {job.status if job else 'failed'}: {job.error if job else ''}")
+
+            # Runs on the index executor so other connections keep streaming meanwhile
+            await request_rag.aprepare_retriever(request.repo_url, request.type, request.token, excluded_dirs, excluded_files,
+                                                 included_dirs, included_files)
             logger.info(f"Retriever prepared for {request.repo_url}")
         except ValueError as e:
             error_str = str(e)
@@ -130,65 +162,45 @@ async def handle_websocket_chat(websocket: WebSocket):
             await websocket.close()
             return
 
-        # Validate request
-        if not request.messages or len(request.messages) == 0:
-            await websocket.send_text("Error: No messages provided")
-            await websocket.close()
-            return
-
-        last_message = request.messages[-1]
-        if last_message.role != "user":
-            await websocket.send_text("Error: Last message must be from the user")
+        # Validate the messages and work out the query, history and Deep Research state
+        try:
+            conversation = parse_conversation(request.messages)
+        except ValueError as e:
+            await websocket.send_text(f"Error: {e}")
             await websocket.close()
             return
-
-        # Process previous messages to build conversation history
-        for i in range(0, len(request.messages) - 1, 2):
-            if i + 1 < len(request.messages):
-                user_msg = request.messages[i]
-                assistant_msg = request.messages[i + 1]
-
-                if user_msg.role == "user" and assistant_msg.role == "assistant":
-                    request_rag.memory.add_dialog_turn(
-                        user_query=user_msg.content,
-                        assistant_response=assistant_msg.content
+        query = conversation.query
+        is_deep_research = conversation.is_deep_research
+
+        # First-turn questions may be answered from the semantic answer cache, skipping
+        # retrieval and generation; follow-ups and Deep Research depend on the conversation
+        answer_cache = get_answer_cache()
+        answer_scope = None
+        question_vector = None
+        if answer_cache is not None and len(request.messages) == 1 and not is_deep_research and not input_too_large:
+            try:
+                indexed_version = await run_blocking("retrieval", DatabaseManager().indexed_version,
+                                                     request.repo_url, request.type)
+                if indexed_version:
+                    answer_scope = make_scope(
+                        repo=request.repo_url, type=request.type, version=indexed_version,
+                        embedder=request_rag.embedder_type, provider=request.provider, model=request.model,
+                        language=request.language, file=request.filePath, token=hash_token(request.token),
+                        excluded_dirs=excluded_dirs, excluded_files=excluded_files,
+                        included_dirs=included_dirs, included_files=included_files,
                     )
-
-        # Check if this is a Deep Research request
-        is_deep_research = False
-        research_iteration = 1
-
-        # Process messages to detect Deep Research requests
-        for msg in request.messages:
-            if hasattr(msg, 'content') and msg.content and "[DEEP RESEARCH]" in msg.content:
-                is_deep_research = True
-                # Only remove the tag from the last message
-                if msg == request.messages[-1]:
-                    # Remove the Deep Research tag
-                    msg.content = msg.content.replace("[DEEP RESEARCH]", "").strip()
-
-        # Count research iterations if this is a Deep Research request
-        if is_deep_research:
-            research_iteration = sum(1 for msg in request.messages if msg.role == 'assistant') + 1
-            logger.info(f"Deep Research request detected - iteration {research_iteration}")
-
-            # Check if this is a continuation request
-            if "continue" in last_message.content.lower() and "research" in last_message.content.lower():
-                # Find the original topic from the first user message
-                original_topic = None
-                for msg in request.messages:
-                    if msg.role == "user" and "continue" not in msg.content.lower():
-                        original_topic = msg.content.replace("[DEEP RESEARCH]", "").strip()
-                        logger.info(f"Found original research topic: {original_topic}")
-                        break
-
-                if original_topic:
-                    # Replace the continuation message with the original topic
-                    last_message.content = original_topic
-                    logger.info(f"Using original topic for research: {original_topic}")
-
-        # Get the query from the last message
-        query = last_message.content
+                    question_vector = await run_blocking("retrieval", request_rag.embed_query, query)
+                    cached_answer = await run_blocking("retrieval", answer_cache.lookup, answer_scope, question_vector)
+                    if cached_answer is not None:
+                        for chunk in cached_answer:
+                            await websocket.send_text(chunk)
+                        await websocket.close()
+                        return
+            except WebSocketDisconnect:
+                raise
+            except Exception as e:
+                logger.warning(f"Answer cache lookup failed: {e}")
+                answer_scope = None
 
         # Only retrieve documents if input is not too large
         context_text = ""
@@ -206,33 +218,20 @@ async def handle_websocket_chat(websocket: WebSocket):
                 # Try to perform RAG retrieval
                 try:
                     # This will use the actual RAG implementation
-                    retrieved_documents = request_rag(rag_query, language=request.language)
+                    retrieved_documents = await request_rag.acall(rag_query, language=request.language)
 
                     if retrieved_documents and retrieved_documents[0].documents:
                         # Format context for the prompt in a more structured way
                         documents = retrieved_documents[0].documents
                         logger.info(f"Retrieved {len(documents)} documents")
 
-                        # Group documents by file path
-                        docs_by_file = {}
-                        for doc in documents:
-                            file_path = doc.meta_data.get('file_path', 'unknown')
-                            if file_path not in docs_by_file:
-                                docs_by_file[file_path] = []
-                            docs_by_file[file_path].append(doc)
-
-                        # Format context text with file path grouping
-                        context_parts = []
-                        for file_path, docs in docs_by_file.items():
-                            # Add file header with metadata
-                            header = f"## File Path: {file_path}\n\n"
-                            # Add document content
-                            content = "\n\n".join([doc.text for doc in docs])
-
-                            context_parts.append(f"{header}{content}")
-
-                        # Join all parts with clear separation
-                        context_text = "\n\n" + "-" * 10 + "\n\n".join(context_parts)
+                        # Merge overlapping chunks and keep the most relevant ones within the model's budget
+                        token_encoding = "ollama" if request.provider == "ollama" else None
+                        context_text = build_context(
+                            documents,
+                            get_context_budget(request.provider, request.model),
+                            lambda text: count_tokens(text, token_encoding),
+                        )
                     else:
                         logger.warning("No documents retrieved from RAG")
                 except Exception as e:
@@ -243,207 +242,32 @@ async def handle_websocket_chat(websocket: WebSocket):
                 logger.error(f"Error retrieving documents: {str(e)}")
                 context_text = ""
 
-        # Get repository information
-        repo_url = request.repo_url
-        repo_name = repo_url.split("/")[-1] if "/" in repo_url else repo_url
-
-        # Determine repository type
-        repo_type = request.type
-
-        # Get language information
-        language_code = request.language or configs["lang_config"]["default"]
-        supported_langs = configs["lang_config"]["supported_languages"]
-        language_name = supported_langs.get(language_code, "English")
-
-        # Create system prompt
-        if is_deep_research:
-            # Check if this is the first iteration
-            is_first_iteration = research_iteration == 1
-
-            # Check if this is the final iteration
-            is_final_iteration = research_iteration >= 5
-
-            if is_first_iteration:
-                system_prompt = f"""<role>
-You are an expert code analyst examining the {repo_type} repository: {repo_url} ({repo_name}).
-You are conducting a multi-turn Deep Research process to thoroughly investigate the specific topic in the user's query.
-Your goal is to provide detailed, focused information EXCLUSIVELY about this topic.
-IMPORTANT:You MUST respond in {language_name} language.
-</role>
-
-<guidelines>
-- This is the first iteration of a multi-turn research process focused EXCLUSIVELY on the user's query
-- Start your response with "## Research Plan"
-- Outline your approach to investigating this specific topic
-- If the topic is about a specific file or feature (like "Dockerfile"), focus ONLY on that file or feature
-- Clearly state the specific topic you're researching to maintain focus throughout all iterations
-- Identify the key aspects you'll need to research
-- Provide initial findings based on the information available
-- End with "## Next Steps" indicating what you'll investigate in the next iteration
-- Do NOT provide a final conclusion yet - this is just the beginning of the research
-- Do NOT include general repository information unless directly relevant to the query
-- Focus EXCLUSIVELY on the specific topic being researched - do not drift to related topics
-- Your research MUST directly address the original question
-- NEVER respond with just "Continue the research" as an answer - always provide substantive research findings
-- Remember that this topic will be maintained across all research iterations
-</guidelines>
-
-<style>
-- Be concise but thorough
-- Use markdown formatting to improve readability
-- Cite specific files and code sections when relevant
-</style>"""
-            elif is_final_iteration:
-                system_prompt = f"""<role>
-You are an expert code analyst examining the {repo_type} repository: {repo_url} ({repo_name}).
-You are in the final iteration of a Deep Research process focused EXCLUSIVELY on the latest user query.
-Your goal is to synthesize all previous findings and provide a comprehensive conclusion that directly addresses this specific topic and ONLY this topic.
-IMPORTANT:You MUST respond in {language_name} language.
-</role>
-
-<guidelines>
-- This is the final iteration of the research process
-- CAREFULLY review the entire conversation history to understand all previous findings
-- Synthesize ALL findings from previous iterations into a comprehensive conclusion
-- Start with "## Final Conclusion"
-- Your conclusion MUST directly address the original question
-- Stay STRICTLY focused on the specific topic - do not drift to related topics
-- Include specific code references and implementation details related to the topic
-- Highlight the most important discoveries and insights about this specific functionality
-- Provide a complete and definitive answer to the original question
-- Do NOT include general repository information unless directly relevant to the query
-- Focus exclusively on the specific topic being researched
-- NEVER respond with "Continue the research" as an answer - always provide a complete conclusion
-- If the topic is about a specific file or feature (like "Dockerfile"), focus ONLY on that file or feature
-- Ensure your conclusion builds on and references key findings from previous iterations
-</guidelines>
-
-<style>
-- Be concise but thorough
-- Use markdown formatting to improve readability
-- Cite specific files and code sections when relevant
-- Structure your response with clear headings
-- End with actionable insights or recommendations when appropriate
-</style>"""
-            else:
-                system_prompt = f"""<role>
-You are an expert code analyst examining the {repo_type} repository: {repo_url} ({repo_name}).
-You are currently in iteration {research_iteration} of a Deep Research process focused EXCLUSIVELY on the latest user query.
-Your goal is to build upon previous research iterations and go deeper into this specific topic without deviating from it.
-IMPORTANT:You MUST respond in {language_name} language.
-</role>
-
-<guidelines>
-- CAREFULLY review the conversation history to understand what has been researched so far
-- Your response MUST build on previous research iterations - do not repeat information already covered
-- Identify gaps or areas that need further exploration related to this specific topic
-- Focus on one specific aspect that needs deeper investigation in this iteration
-- Start your response with "## Research Update {research_iteration}"
-- Clearly explain what you're investigating in this iteration
-- Provide new insights that weren't covered in previous iterations
-- If this is iteration 3, prepare for a final conclusion in the next iteration
-- Do NOT include general repository information unless directly relevant to the query
-- Focus EXCLUSIVELY on the specific topic being researched - do not drift to related topics
-- If the topic is about a specific file or feature (like "Dockerfile"), focus ONLY on that file or feature
-- NEVER respond with just "Continue the research" as an answer - always provide substantive research findings
-- Your research MUST directly address the original question
-- Maintain continuity with previous research iterations - this is a continuous investigation
-</guidelines>
-
-<style>
-- Be concise but thorough
-- Focus on providing new information, not repeating what's already been covered
-- Use markdown formatting to improve readability
-- Cite specific files and code sections when relevant
-</style>"""
-        else:
-            system_prompt = f"""<role>
-You are an expert code analyst examining the {repo_type} repository: {repo_url} ({repo_name}).
-You provide direct, concise, and accurate information about code repositories.
-You NEVER start responses with markdown headers or code fences.
-IMPORTANT:You MUST respond in {language_name} language.
-</role>
-
-<guidelines>
-- Answer the user's question directly without ANY preamble or filler phrases
-- DO NOT include any rationale, explanation, or extra comments.
-- Strictly base answers ONLY on existing code or documents
-- DO NOT speculate or invent citations.
-- DO NOT start with preambles like "Okay, here's a breakdown" or "Here's an explanation"
-- DO NOT start with markdown headers like "## Analysis of..." or any file path references
-- DO NOT start with ```markdown code fences
-- DO NOT end your response with ``` closing fences
-- DO NOT start by repeating or acknowledging the question
-- JUST START with the direct answer to the question
-
-<example_of_what_not_to_do>
-```markdown
-## Analysis of `adalflow/adalflow/datasets/gsm8k.py`
-
-This file contains...
-```
-</example_of_what_not_to_do>
-
-- Format your response with proper markdown including headings, lists, and code blocks WITHIN your answer
-- For code analysis, organize your response with clear sections
-- Think step by step and structure your answer logically
-- Start with the most relevant information that directly addresses the user's query
-- Be precise and technical when discussing code
-- Your response language should be in the same language as the user's query
-</guidelines>
-
-<style>
-- Use concise, direct language
-- Prioritize accuracy over verbosity
-- When showing code, include line numbers and file paths when relevant
-- Use markdown formatting to improve readability
-</style>"""
-
         # Fetch file content if provided
         file_content = ""
         if request.filePath:
             try:
-                file_content = get_file_content(request.repo_url, request.filePath, request.type, request.token)
+                file_content = await aget_file_content(request.repo_url, request.filePath, request.type, request.token)
                 logger.info(f"Successfully retrieved content for file: {request.filePath}")
             except Exception as e:
                 logger.error(f"Error retrieving file content: {str(e)}")
                 # Continue without file content if there's an error
 
-        # Format conversation history
-        conversation_history = ""
-        for turn_id, turn in request_rag.memory().items():
-            if not isinstance(turn_id, int) and hasattr(turn, 'user_query') and hasattr(turn, 'assistant_response'):
-                conversation_history += f"<turn>\n<user>{turn.user_query.query_str}</user>\n<assistant>{turn.assistant_response.response_str}</assistant>\n</turn>\n"
-
-        # Create the prompt with context
-        prompt = f"/no_think {system_prompt}\n\n"
-
-        if conversation_history:
-            prompt += f"<conversation_history>\n{conversation_history}</conversation_history>\n\n"
-
-        # Check if filePath is provided and fetch file content if it exists
-        if file_content:
-            # Add file content to the prompt after conversation history
-            prompt += f"<currentFileContent path=\"{request.filePath}\">\n{file_content}\n</currentFileContent>\n\n"
-
-        # Only include context if it's not empty
-        CONTEXT_START = "<START_OF_CONTEXT>"
-        CONTEXT_END = "<END_OF_CONTEXT>"
-        if context_text.strip():
-            prompt += f"{CONTEXT_START}\n{context_text}\n{CONTEXT_END}\n\n"
-        else:
-            # Add a note that we're skipping RAG due to size constraints or because it's the isolated API
-            logger.info("No context available from RAG")
-            prompt += "<note>Answering without retrieval augmentation.</note>\n\n"
-
-        prompt += f"<query>\n{query}\n</query>\n\nAssistant: "
+        # System prompt first: requests in the same mode and language share its exact bytes
+        prompt = ChatPrompt(
+            system=system_prompt(request.type, request.repo_url, language_name(request.language, configs["lang_config"]),
+                                 conversation.is_deep_research, conversation.research_iteration),
+            query=query,
+            history=conversation.history,
+            file_path=request.filePath,
+            file_content=file_content,
+            context_text=context_text,
+        )
+        prompt_input = prompt.for_provider(request.provider)
 
         model_config = get_model_config(request.provider, request.model)["model_kwargs"]
 
         if request.provider == "ollama":
-            prompt += " /no_think"
-
-            model = OllamaClient()
+            model = get_model_client("ollama", OllamaClient)
             model_kwargs = {
                 "model": model_config["model"],
                 "stream": True,
@@ -455,7 +279,7 @@ This file contains...
             }
 
             api_kwargs = model.convert_inputs_to_api_kwargs(
-                input=prompt,
+                input=prompt_input,
                 model_kwargs=model_kwargs,
                 model_type=ModelType.LLM
             )
@@ -467,7 +291,7 @@ This file contains...
                 logger.warning("OPENROUTER_API_KEY not configured, but continuing with request")
                 # We'll let the OpenRouterClient handle this and return a friendly error message
 
-            model = OpenRouterClient()
+            model = get_model_client("openrouter", OpenRouterClient)
             model_kwargs = {
                 "model": request.model,
                 "stream": True,
@@ -478,7 +302,7 @@ This file contains...
                 model_kwargs["top_p"] = model_config["top_p"]
 
             api_kwargs = model.convert_inputs_to_api_kwargs(
-                input=prompt,
+                input=prompt_input,
                 model_kwargs=model_kwargs,
                 model_type=ModelType.LLM
             )
@@ -491,16 +315,13 @@ This file contains...
                 # We'll let the OpenAIClient handle this and return an error message
 
             # Initialize Openai client
-            model = OpenAIClient()
-            
-            # DISABLE STREAMING for OpenAI to avoid organization verification requirement
-            # Non-streaming mode works without organization verification
-            use_streaming = False
-            logger.info("OpenAI streaming disabled - using non-streaming mode")
+            model = get_model_client("openai", OpenAIClient)
             
+            # Streaming is requested; OpenAIClient.astream_text falls back to a non-streaming
+            # call for keys whose organization is not verified to stream this model
             model_kwargs = {
                 "model": request.model,
-                "stream": use_streaming,
+                "stream": True,
                 "temperature": model_config["temperature"]
             }
             # Only add top_p if it exists in the model config
@@ -508,7 +329,7 @@ This file contains...
                 model_kwargs["top_p"] = model_config["top_p"]
 
             api_kwargs = model.convert_inputs_to_api_kwargs(
-                input=prompt,
+                input=prompt_input,
                 model_kwargs=model_kwargs,
                 model_type=ModelType.LLM
             )
@@ -516,7 +337,7 @@ This file contains...
             logger.info(f"Using Azure AI with model: {request.model}")
 
             # Initialize Azure AI client
-            model = AzureAIClient()
+            model = get_model_client("azure", AzureAIClient)
             model_kwargs = {
                 "model": request.model,
                 "stream": True,
@@ -525,7 +346,7 @@ This file contains...
             }
 
             api_kwargs = model.convert_inputs_to_api_kwargs(
-                input=prompt,
+                input=prompt_input,
                 model_kwargs=model_kwargs,
                 model_type=ModelType.LLM
             )
@@ -533,7 +354,7 @@ This file contains...
             logger.info(f"Using Dashscope with model: {request.model}")
 
             # Initialize Dashscope client
-            model = DashscopeClient()
+            model = get_model_client("dashscope", DashscopeClient)
             model_kwargs = {
                 "model": request.model,
                 "stream": True,
@@ -542,13 +363,14 @@ This file contains...
             }
 
             api_kwargs = model.convert_inputs_to_api_kwargs(
-                input=prompt,
+                input=prompt_input,
                 model_kwargs=model_kwargs,
                 model_type=ModelType.LLM
             )
         else:
             # Initialize Google Generative AI model
-            model = genai.GenerativeModel(
+            model = get_model_client(
+                "google", genai.GenerativeModel,
                 model_name=model_config["model"],
                 generation_config={
                     "temperature": model_config["temperature"],
@@ -557,6 +379,9 @@ This file contains...
                 }
             )
 
+        # Record the streamed answer so it can be offered to the answer cache
+        websocket = AnswerRecorder(websocket)
+
         # Process the response based on the provider
         try:
             if request.provider == "ollama":
@@ -581,6 +406,7 @@ This file contains...
                     # Explicitly close the WebSocket connection after the response is complete
                     await websocket.close()
                 except Exception as e_openrouter:
+                    websocket.discard()
                     logger.error(f"Error with OpenRouter API: {str(e_openrouter)}")
                     error_msg = f"\nError with OpenRouter API: {str(e_openrouter)}\n\nPlease check that you have set the OPENROUTER_API_KEY environment variable with a valid API key."
                     await websocket.send_text(error_msg)
@@ -588,164 +414,37 @@ This file contains...
                     await websocket.close()
             elif request.provider == "openai":
                 try:
-                    # Get the response and handle it properly using the previously created api_kwargs
-                    logger.info("Making Openai API call (non-streaming mode)")
-                    response = await model.acall(api_kwargs=api_kwargs, model_type=ModelType.LLM)
-                    
-                    # Check if streaming is enabled in api_kwargs
-                    if api_kwargs.get("stream", False):
-                        # Handle streaming response from Openai
-                        chunk_count = 0
-                        total_chars_sent = 0
-                        async for chunk in response:
-                            choices = getattr(chunk, "choices", [])
-                            if len(choices) > 0:
-                                delta = getattr(choices[0], "delta", None)
-                                if delta is not None:
-                                    text = getattr(delta, "content", None)
-                                    if text is not None:
-                                        chunk_count += 1
-                                        total_chars_sent += len(text)
-                                        await websocket.send_text(text)
-                                        # Log every 50th chunk for debugging
-                                        if chunk_count % 50 == 0:
-                                            logger.info(f"Sent {chunk_count} chunks, {total_chars_sent} total chars")
-                        
-                        logger.info(f"OpenAI streaming complete: {chunk_count} chunks, {total_chars_sent} total chars sent")
+                    logger.info("Making Openai API call")
+                    chunk_count = 0
+                    total_chars_sent = 0
+                    async for text in model.astream_text(api_kwargs):
+                        chunk_count += 1
+                        total_chars_sent += len(text)
+                        await websocket.send_text(text)
+                        # Log every 50th chunk for debugging
+                        if chunk_count % 50 == 0:
+                            logger.info(f"Sent {chunk_count} chunks, {total_chars_sent} total chars")
+
+                    if chunk_count:
+                        logger.info(f"OpenAI response complete: {chunk_count} chunks, {total_chars_sent} total chars sent")
                     else:
-                        # Handle non-streaming response (ChatCompletion object)
-                        logger.info("Processing non-streaming OpenAI response")
-                        full_response = ""
-                        
-                        if hasattr(response, 'choices') and len(response.choices) > 0:
-                            choice = response.choices[0]
-                            if hasattr(choice, 'message') and hasattr(choice.message, 'content'):
-                                full_response = choice.message.content or ""
-                        
-                        if full_response:
-                            logger.info(f"OpenAI non-streaming response received: {len(full_response)} chars")
-                            # Send the full response as a single chunk
-                            await websocket.send_text(full_response)
-                            logger.info("OpenAI non-streaming response sent successfully")
-                        else:
-                            logger.warning("OpenAI non-streaming response received but content is empty")
-                            await websocket.send_text("\n⚠️ Error: Received empty response from OpenAI API.\n")
-                    
+                        logger.warning("OpenAI response received but content is empty")
+                        websocket.discard()
+                        await websocket.send_text("\n⚠️ Error: Received empty response from OpenAI API.\n")
+
                     # Explicitly close the WebSocket connection after the response is complete
                     await websocket.close()
                 except Exception as e_openai:
+                    websocket.discard()
                     error_str = str(e_openai)
-                    error_str_lower = error_str.lower()
-                    
-                    # Log the error immediately with full details
-                    logger.error(f"Error with Openai API: {error_str}")
-                    logger.error(f"Error type: {type(e_openai).__name__}")
-                    
-                    # Check exception attributes for more detailed error info
-                    error_body = None
-                    error_message = None
-                    error_code = None
-                    if hasattr(e_openai, 'response'):
-                        logger.debug(f"Exception has response attribute: {type(e_openai.response)}")
-                    if hasattr(e_openai, 'body'):
-                        error_body = e_openai.body
-                        logger.error(f"Exception body: {error_body}")
-                    
-                    # Try to extract error message from exception body if it's a dict
-                    if error_body and isinstance(error_body, dict):
-                        if 'error' in error_body and isinstance(error_body['error'], dict):
-                            error_message = error_body['error'].get('message', '')
-                            error_code = error_body['error'].get('code', '')
-                            logger.error(f"Extracted error message: {error_message}")
-                            logger.error(f"Extracted error code: {error_code}")
-                    
-                    # Log the api_kwargs to see what was sent
-                    logger.error(f"API kwargs that caused the error: model={api_kwargs.get('model')}, stream={api_kwargs.get('stream')}, messages_count={len(api_kwargs.get('messages', []))}")
-                    
-                    # Check for organization verification error
-                    # Check multiple possible error message patterns
-                    is_org_verification_error = (
-                        "organization must be verified" in error_str_lower or
-                        "unsupported_value" in error_str_lower or
-                        ("verify organization" in error_str_lower and "stream" in error_str_lower) or
-                        (error_message and "organization must be verified" in error_message.lower())
-                    )
-                    
-                    logger.info(f"🔍 Organization verification error check: {is_org_verification_error}")
-                    logger.info(f"   Error string contains 'organization must be verified': {'organization must be verified' in error_str_lower}")
-                    logger.info(f"   Error string contains 'unsupported_value': {'unsupported_value' in error_str_lower}")
-                    if error_message:
-                        logger.info(f"   Error message contains 'organization must be verified': {'organization must be verified' in error_message.lower()}")
-                    
-                    if is_org_verification_error:
-                        logger.warning(f"OpenAI organization verification error detected. Full error: {error_str}")
-                        logger.warning("OpenAI organization verification error detected. Attempting non-streaming fallback...")
-                        
-                        # Try non-streaming mode as fallback
-                        # IMPORTANT: Create a new OpenAI client instance to avoid backoff decorator issues
-                        try:
-                            logger.info("Attempting OpenAI API call with streaming disabled (fallback mode)")
-                            
-                            # Create fresh API kwargs without streaming
-                            from api.openai_client import OpenAIClient as FreshOpenAIClient
-                            fallback_model = FreshOpenAIClient()
-                            
-                            # Prepare non-streaming kwargs
-                            # Extract messages from api_kwargs (already formatted by convert_inputs_to_api_kwargs)
-                            non_streaming_kwargs = {
-                                "model": api_kwargs.get("model", request.model),
-                                "messages": api_kwargs.get("messages", []),
-                                "temperature": api_kwargs.get("temperature", model_config["temperature"]),
-                                "stream": False  # Explicitly disable streaming
-                            }
-                            if "top_p" in api_kwargs:
-                                non_streaming_kwargs["top_p"] = api_kwargs["top_p"]
-                            
-                            # Validate messages
-                            if not non_streaming_kwargs["messages"] or len(non_streaming_kwargs["messages"]) == 0:
-                                logger.error("No messages found in api_kwargs for non-streaming fallback")
-                                raise ValueError("Messages list is empty")
-                            
-                            logger.info(f"Non-streaming API kwargs prepared: model={non_streaming_kwargs['model']}, messages_count={len(non_streaming_kwargs['messages'])}, stream=False")
-                            
-                            # Make non-streaming call using direct OpenAI client (bypassing backoff for this call)
-                            try:
-                                # Use sync client directly for non-streaming to avoid backoff decorator
-                                import openai
-                                if fallback_model.sync_client is None:
-                                    fallback_model.init_sync_client()
-                                
-                                # Direct API call without backoff
-                                response = fallback_model.sync_client.chat.completions.create(**non_streaming_kwargs)
-                                
-                                # Get the full response content
-                                full_response = ""
-                                if hasattr(response, 'choices') and len(response.choices) > 0:
-                                    choice = response.choices[0]
-                                    if hasattr(choice, 'message') and hasattr(choice.message, 'content'):
-                                        full_response = choice.message.content or ""
-                                
-                                if full_response:
-                                    logger.info(f"✅ Non-streaming response received: {len(full_response)} chars")
-                                    # Send the full response as a single chunk
-                                    await websocket.send_text(full_response)
-                                    logger.info("✅ OpenAI non-streaming response sent successfully")
-                                    await websocket.close()
-                                    return
-                                else:
-                                    logger.warning("Non-streaming response received but content is empty")
-                            except Exception as direct_error:
-                                logger.error(f"Direct non-streaming call failed: {str(direct_error)}")
-                                raise direct_error
-                                
-                        except Exception as fallback_error:
-                            logger.error(f"Non-streaming fallback also failed: {str(fallback_error)}")
-                            logger.error(f"Fallback error type: {type(fallback_error).__name__}")
-                        
-                        # If fallback failed or streaming is required, send error message
+                    logger.error(f"Error with Openai API ({type(e_openai).__name__}): {error_str}")
+                    logger.error(f"API kwargs that caused the error: model={api_kwargs.get('model')}, messages_count={len(api_kwargs.get('messages', []))}")
+
+                    if is_streaming_not_allowed_error(e_openai):
+                        # Only reached if the non-streaming fallback was refused as well
                         error_msg = (
                             "\n⚠️ OpenAI Organization Verification Required\n\n"
-                            "Your OpenAI organization needs to be verified to use streaming mode.\n\n"
+                            "Your OpenAI organization needs to be verified to use this model.\n\n"
                             "📋 Steps to Fix:\n"
                             "1. Go to: https://platform.openai.com/settings/organization/general\n"
                             "2. Click on 'Verify Organization'\n"
@@ -764,7 +463,7 @@ This file contains...
                             f"2. Your API key has sufficient credits\n"
                             f"3. The API key has access to the requested model"
                         )
-                    
+
                     await websocket.send_text(error_msg)
                     # Close the WebSocket connection after sending the error message
                     await websocket.close()
@@ -785,6 +484,7 @@ This file contains...
                     # Explicitly close the WebSocket connection after the response is complete
                     await websocket.close()
                 except Exception as e_azure:
+                    websocket.discard()
                     logger.error(f"Error with Azure AI API: {str(e_azure)}")
                     error_msg = f"\nError with Azure AI API: {str(e_azure)}\n\nPlease check that you have set the AZURE_OPENAI_API_KEY, AZURE_OPENAI_ENDPOINT, and AZURE_OPENAI_VERSION environment variables with valid values."
                     await websocket.send_text(error_msg)
@@ -793,7 +493,7 @@ This file contains...
             else:
                 # Generate streaming response (Google Gemini default)
                 logger.info("Making Google Gemini API call")
-                response = model.generate_content(prompt, stream=True)
+                response = model.generate_content(prompt_input, stream=True)
                 # Stream the response
                 chunk_count = 0
                 total_chars_sent = 0
@@ -811,6 +511,7 @@ This file contains...
                 await websocket.close()
 
         except Exception as e_outer:
+            websocket.discard()
             logger.error(f"Error in streaming response: {str(e_outer)}")
             error_message = str(e_outer)
 
@@ -820,20 +521,9 @@ This file contains...
                 logger.warning("Token limit exceeded, retrying without context")
                 try:
                     # Create a simplified prompt without context
-                    simplified_prompt = f"/no_think {system_prompt}\n\n"
-                    if conversation_history:
-                        simplified_prompt += f"<conversation_history>\n{conversation_history}</conversation_history>\n\n"
-
-                    # Include file content in the fallback prompt if it was retrieved
-                    if request.filePath and file_content:
-                        simplified_prompt += f"<currentFileContent path=\"{request.filePath}\">\n{file_content}\n</currentFileContent>\n\n"
-
-                    simplified_prompt += "<note>Answering without retrieval augmentation due to input size constraints.</note>\n\n"
-                    simplified_prompt += f"<query>\n{query}\n</query>\n\nAssistant: "
+                    simplified_prompt = prompt.for_provider(request.provider, include_context=False)
 
                     if request.provider == "ollama":
-                        simplified_prompt += " /no_think"
-
                         # Create new api_kwargs with the simplified prompt
                         fallback_api_kwargs = model.convert_inputs_to_api_kwargs(
                             input=simplified_prompt,
@@ -881,11 +571,7 @@ This file contains...
 
                             # Get the response using the simplified prompt
                             logger.info("Making fallback Openai API call")
-                            fallback_response = await model.acall(api_kwargs=fallback_api_kwargs, model_type=ModelType.LLM)
-
-                            # Handle streaming fallback_response from Openai
-                            async for chunk in fallback_response:
-                                text = chunk if isinstance(chunk, str) else getattr(chunk, 'text', str(chunk))
+                            async for text in model.astream_text(fallback_api_kwargs):
                                 await websocket.send_text(text)
                         except Exception as e_fallback:
                             logger.error(f"Error with Openai API fallback: {str(e_fallback)}")
@@ -920,7 +606,8 @@ This file contains...
                     else:
                         # Initialize Google Generative AI model
                         model_config = get_model_config(request.provider, request.model)
-                        fallback_model = genai.GenerativeModel(
+                        fallback_model = get_model_client(
+                            "google", genai.GenerativeModel,
                             model_name=model_config["model"],
                             generation_config={
                                 "temperature": model_config["model_kwargs"].get("temperature", 0.7),
@@ -946,6 +633,13 @@ This file contains...
                 # Close the WebSocket connection after sending the error message
                 await websocket.close()
 
+        answer = websocket.answer
+        if answer_scope is not None and question_vector is not None and answer is not None:
+            try:
+                await run_blocking("retrieval", answer_cache.store, answer_scope, query, question_vector, answer)
+            except Exception as e:
+                logger.warning(f"Could not store answer in cache: {e}")
+
     except WebSocketDisconnect:
         logger.info("WebSocket disconnected")
     except Exception as e:
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Tests for the semantic answer cache.
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from api.answer_cache import AnswerCache, AnswerRecorder, hash_token, make_scope
+
+
+@pytest.fixture
+def cache(tmp_path):
+    answer_cache = AnswerCache(str(tmp_path / "answers.sqlite3"), threshold=0.95, ttl=3600, max_per_scope=2)
+    yield answer_cache
+    answer_cache.close()
+
+
+def test_close_questions_reuse_the_answer(cache):
+    scope = make_scope(repo="https://github.com/o/r", version="abc123", provider="google", model=None, language="en")
+    cache.store(scope, "How do I run this?", [1.0, 0.0, 0.1], ["Run ", "`make dev`."])
+
+    assert cache.lookup(scope, [0.99, 0.0, 0.12]) == ["Run ", "`make dev`."]
+    assert cache.lookup(scope, [0.0, 1.0, 0.0]) is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+
+def test_scopes_are_isolated(cache):
+    old = make_scope(repo="r", version="abc123", language="en")
+    new = make_scope(repo="r", version="def456", language="en")
+    cache.store(old, "q", [1.0, 0.0], ["old answer"])
+    assert cache.lookup(new, [1.0, 0.0]) is None
+    assert make_scope(a=1, b=2) == make_scope(b=2, a=1)
+    assert hash_token(None) == "" and "secret" not in hash_token("secret")
+
+
+def test_least_recently_used_answers_are_dropped(cache):
+    scope = make_scope(repo="r")
+    cache.store(scope, "a", [1.0, 0.0, 0.0], ["a"])
+    cache.store(scope, "b", [0.0, 1.0, 0.0], ["b"])
+    cache.lookup(scope, [1.0, 0.0, 0.0])
+    cache.store(scope, "c", [0.0, 0.0, 1.0], ["c"])
+    assert cache.lookup(scope, [0.0, 1.0, 0.0]) is None
+    assert cache.lookup(scope, [1.0, 0.0, 0.0]) == ["a"]
+
+
+def test_expired_answers_are_not_served(tmp_path):
+    expired = AnswerCache(str(tmp_path / "answers.sqlite3"), ttl=-1)
+    expired.store("scope", "q", [1.0], ["stale"])
+    assert expired.lookup("scope", [1.0]) is None
+    expired.close()
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+        self.closed = False
+
+    async def send_text(self, text):
+        self.sent.append(text)
+
+    async def close(self):
+        self.closed = True
+
+
+def test_recorder_keeps_only_complete_answers():
+    async def scenario():
+        socket = FakeWebSocket()
+        recorder = AnswerRecorder(socket)
+        await recorder.send_text("Hello ")
+        await recorder.send_text("world")
+        await recorder.close()
+        ok = recorder.answer
+
+        failed = AnswerRecorder(FakeWebSocket())
+        await failed.send_text("partial")
+        failed.discard()
+
+        streamed_error = AnswerRecorder(FakeWebSocket())
+        await streamed_error.send_text("Error: No response content from OpenRouter API")
+        return socket, ok, failed.answer, streamed_error.answer
+
+    socket, ok, failed, streamed_error = asyncio.run(scenario())
+    assert socket.sent == ["Hello ", "world"] and socket.closed
+    assert ok == ["Hello ", "world"]
+    assert failed is None and streamed_error is None
+
+
+class ErrorText(str):
+    # Mirrors api.openrouter_client.ErrorText, which cannot be imported without adalflow
+    is_error = True
+
+
+def test_recorder_drops_answers_with_streamed_provider_errors():
+    async def scenario():
+        connection_error = AnswerRecorder(FakeWebSocket())
+        await connection_error.send_text(ErrorText(
+            "Connection error with OpenRouter API: timed out. Please check your internet connection."))
+
+        after_partial = AnswerRecorder(FakeWebSocket())
+        await after_partial.send_text("The indexer walks ")
+        await after_partial.send_text("the repository and ")
+        await after_partial.send_text(ErrorText("Error in streaming response: connection reset"))
+        return connection_error, after_partial
+
+    connection_error, after_partial = asyncio.run(scenario())
+    assert connection_error.answer is None
+    assert after_partial.answer is None
+    # The error is still shown to the user
+    assert after_partial._websocket.sent[-1] == "Error in streaming response: connection reset"
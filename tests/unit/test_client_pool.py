@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared model client pool.
+"""
+
+import sys
+import threading
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from api.client_pool import ClientPool, make_client_key
+
+
+class FakeClient:
+    instances = 0
+
+    def __init__(self, **kwargs):
+        FakeClient.instances += 1
+        self.kwargs = kwargs
+
+
+def test_key_tracks_credentials_and_arguments(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "key-a")
+    key_a = make_client_key("openai", FakeClient)
+    assert key_a == make_client_key("openai", FakeClient)
+    assert "key-a" not in "".join(key_a)
+
+    monkeypatch.setenv("OPENAI_API_KEY", "key-b")
+    assert make_client_key("openai", FakeClient) != key_a
+    assert make_client_key("openai", FakeClient, {"model": "x"}) != make_client_key("openai", FakeClient)
+
+
+def test_key_records_base_url(monkeypatch):
+    monkeypatch.setenv("OLLAMA_HOST", "http://ollama:11434")
+    assert make_client_key("ollama", FakeClient)[2] == "http://ollama:11434"
+    assert make_client_key("openai", FakeClient, {"base_url": "http://proxy/v1"})[2] == "http://proxy/v1"
+
+
+def test_client_is_built_once_under_concurrency():
+    pool = ClientPool(max_entries=4)
+    key = make_client_key("openai", FakeClient)
+    FakeClient.instances = 0
+    results = []
+
+    def worker():
+        results.append(pool.get_or_create(key, FakeClient))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert FakeClient.instances == 1
+    assert all(client is results[0] for client in results)
+    assert pool.stats()["hits"] == 7
+
+
+def test_lru_eviction():
+    pool = ClientPool(max_entries=2)
+    keys = [make_client_key("openai", FakeClient, {"n": n}) for n in range(3)]
+    first = pool.get_or_create(keys[0], FakeClient)
+    pool.get_or_create(keys[1], FakeClient)
+    pool.get_or_create(keys[0], FakeClient)  # keys[1] becomes least recently used
+    pool.get_or_create(keys[2], FakeClient)
+
+    assert pool.stats()["evictions"] == 1
+    assert pool.get_or_create(keys[0], FakeClient) is first
+    assert pool.stats()["entries"] == 2
+
+
+def test_failed_construction_is_not_cached():
+    pool = ClientPool(max_entries=2)
+    key = make_client_key("openai", FakeClient)
+
+    def failing():
+        raise ValueError("Environment variable OPENAI_API_KEY must be set")
+
+    try:
+        pool.get_or_create(key, failing)
+    except ValueError:
+        pass
+    assert pool.stats()["entries"] == 0
+    assert isinstance(pool.get_or_create(key, FakeClient), FakeClient)
+
+
+def test_slow_construction_does_not_block_other_keys():
+    pool = ClientPool(max_entries=4)
+    slow_key = make_client_key("bedrock", FakeClient)
+    fast_key = make_client_key("openai", FakeClient)
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_factory():
+        started.set()
+        release.wait(5)
+        return FakeClient()
+
+    builder = threading.Thread(target=pool.get_or_create, args=(slow_key, slow_factory))
+    builder.start()
+    assert started.wait(5)
+    try:
+        # Answered while the other key is still being built
+        assert isinstance(pool.get_or_create(fast_key, FakeClient), FakeClient)
+        assert pool.stats()["entries"] == 1
+    finally:
+        release.set()
+        builder.join()
+    assert pool.stats()["entries"] == 2
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Tests for the structure-aware code splitter.
+"""
+
+import sys
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from api.code_splitter import CodeSplitter
+
+
+def word_counts(lines):
+    return [len(line.split()) for line in lines]
+
+
+PYTHON_SOURCE = '''import os
+import sys
+
+
+def first(a, b):
+    total = a + b
+    return total
+
+
+@decorator
+def second():
+    return os.getcwd()
+
+
+class Widget:
+    """A widget."""
+
+    def draw(self):
+        print("draw one two three four five")
+        print("draw six seven eight nine ten")
+
+    def resize(self, width):
+        self.width = width
+        return self.width
+'''
+
+
+def test_small_files_stay_in_one_chunk():
+    chunks = CodeSplitter(word_counts, chunk_tokens=1000).split(PYTHON_SOURCE, "py")
+    assert len(chunks) == 1
+    assert chunks[0].text == PYTHON_SOURCE
+    assert (chunks[0].start_line, chunks[0].end_line) == (1, PYTHON_SOURCE.count("\n"))
+
+
+def test_functions_are_not_cut_mid_body():
+    chunks = CodeSplitter(word_counts, chunk_tokens=16).split(PYTHON_SOURCE, "py")
+    texts = [chunk.text for chunk in chunks]
+    assert any("def first" in text and "return total" in text for text in texts)
+    # Decorators stay attached to their function
+    assert any("@decorator\ndef second():\n    return os.getcwd()" in text for text in texts)
+    # The oversized class is split at its methods
+    assert any(text.lstrip().startswith("def draw") and "nine ten" in text for text in texts)
+    assert any(text.lstrip().startswith("def resize") and "return self.width" in text for text in texts)
+    # Chunks cover the file in order without overlap
+    assert "".join(texts) == PYTHON_SOURCE
+    assert all(a.end_line + 1 == b.start_line for a, b in zip(chunks, chunks[1:]))
+    assert all(chunk.num_tokens <= 16 for chunk in chunks)
+
+
+def test_small_blocks_are_packed_together():
+    source = "a = 1\n\nb = 2\n\nc = 3\n\nd = 4\n"
+    chunks = CodeSplitter(word_counts, chunk_tokens=6).split(source, "py")
+    assert [chunk.text for chunk in chunks] == ["a = 1\n\nb = 2\n\n", "c = 3\n\nd = 4\n"]
+
+
+def test_brace_languages_split_after_closing_brace():
+    source = "function a() {\n  return 1;\n}\nfunction b() {\n  return 2;\n}\n"
+    chunks = CodeSplitter(word_counts, chunk_tokens=6).split(source, "js")
+    assert [chunk.text for chunk in chunks] == [
+        "function a() {\n  return 1;\n}\n",
+        "function b() {\n  return 2;\n}\n",
+    ]
+
+
+def test_markdown_splits_on_headings_outside_fences():
+    source = "# Title\nintro words here\n## Usage\n```\n# not a heading\nrun it\n```\n## API\nfunctions listed\n"
+    chunks = CodeSplitter(word_counts, chunk_tokens=10).split(source, "md")
+    starts = [chunk.text.splitlines()[0] for chunk in chunks]
+    assert starts == ["# Title", "## Usage", "## API"]
+    assert "# not a heading" in chunks[1].text
+
+
+def test_unstructured_blocks_fall_back_to_overlapping_windows():
+    source = "".join(f"line {i} of prose\n" for i in range(10))
+    chunks = CodeSplitter(word_counts, chunk_tokens=8, overlap_tokens=4).split(source, "txt")
+    assert all(chunk.num_tokens <= 8 for chunk in chunks)
+    assert chunks[0].start_line == 1 and chunks[-1].end_line == 10
+    # Consecutive windows share a line
+    assert all(b.start_line == a.end_line for a, b in zip(chunks, chunks[1:]))
+
+
+def test_blank_files_give_no_chunks():
+    assert CodeSplitter(word_counts).split("\n\n  \n", "py") == []
+
+
+def test_over_budget_lines_are_cut_into_pieces():
+    minified = "var a=1;" * 500 + "\n"
+    source = "// header\n" + minified + "done();\n"
+    chunks = CodeSplitter(lambda lines: [len(line) // 4 for line in lines], chunk_tokens=50,
+                          overlap_tokens=0).split(source, "js")
+    assert all(chunk.num_tokens <= 50 for chunk in chunks)
+    assert len(chunks) > 20
+    assert "".join(chunk.text for chunk in chunks) == source
+    assert (chunks[0].text, chunks[0].whole_lines) == ("// header\n", True)
+    # Pieces of the long line report it as their line range but are not whole lines
+    assert all(not chunk.whole_lines and chunk.start_line == chunk.end_line == 2 for chunk in chunks[1:-1])
+    assert (chunks[-1].text, chunks[-1].start_line, chunks[-1].whole_lines) == ("done();\n", 3, True)
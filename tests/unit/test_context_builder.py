@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Tests for token-budgeted context assembly.
+"""
+
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from api.context_builder import build_context, context_token_budget, merge_chunks
+
+
+def doc(text, file_path="a.py", start_line=None, end_line=None, parent_doc_id=None, order=None):
+    meta_data = {"file_path": file_path}
+    if start_line is not None:
+        meta_data.update(start_line=start_line, end_line=end_line)
+    return SimpleNamespace(text=text, meta_data=meta_data, parent_doc_id=parent_doc_id, order=order)
+
+
+def words(text):
+    return len(text.split())
+
+
+LINES = [f"line{i}\n" for i in range(10)]
+
+
+def test_overlapping_and_adjacent_line_ranges_are_merged():
+    documents = [
+        doc("".join(LINES[4:8]), start_line=4, end_line=7),
+        doc("".join(LINES[0:5]), start_line=0, end_line=4),
+        doc("".join(LINES[8:10]), start_line=8, end_line=9),
+        doc("".join(LINES[0:5]), start_line=0, end_line=4),
+    ]
+    spans = merge_chunks(documents)
+    assert len(spans) == 1
+    assert spans[0].text == "".join(LINES)
+    assert (spans[0].start_line, spans[0].end_line, spans[0].rank) == (0, 9, 0)
+
+
+def test_consecutive_word_chunks_are_joined_on_their_overlap():
+    first = " ".join(f"w{i}" for i in range(0, 30))
+    second = " ".join(f"w{i}" for i in range(20, 50))
+    unrelated = " ".join(f"x{i}" for i in range(10))
+    spans = merge_chunks([
+        doc(second, parent_doc_id="p", order=1),
+        doc(first, parent_doc_id="p", order=0),
+        doc(unrelated, parent_doc_id="p", order=3),
+    ])
+    assert [span.text for span in spans] == [" ".join(f"w{i}" for i in range(50)), unrelated]
+    assert spans[0].rank == 0
+
+
+def test_budget_is_filled_in_relevance_order():
+    documents = [
+        doc("best match here", file_path="b.py"),
+        doc("a long chunk that does not fit the remaining budget", file_path="a.py"),
+        doc("small one", file_path="a.py"),
+    ]
+    context = build_context(documents, token_budget=5, count_tokens=words)
+    assert "best match here" in context and "small one" in context
+    assert "long chunk" not in context
+    assert context.index("## File Path: b.py") < context.index("## File Path: a.py")
+
+
+def test_oversized_top_chunk_is_truncated_not_dropped():
+    context = build_context([doc("one two three four five six seven eight")], token_budget=4, count_tokens=words)
+    assert "one two" in context and "eight" not in context
+    assert build_context([], token_budget=100) == ""
+
+
+def test_budget_resolution():
+    config = {"default_tokens": 8000, "num_ctx_fraction": 0.5, "providers": {"google": 30000},
+              "models": {"gpt-4o": 20000}}
+    assert context_token_budget("openai", "gpt-4o", {}, config) == 20000
+    assert context_token_budget("google", "gemini", {}, config) == 30000
+    assert context_token_budget("openai", "other", {}, config) == 8000
+    assert context_token_budget("ollama", "qwen3:1.7b", {"num_ctx": 8000}, config) == 4000
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Tests for the persistent content-addressed embedding cache.
+"""
+
+import itertools
+import sys
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from api.embedding_cache import EmbeddingCache, make_key, make_namespace
+
+
+def test_key_depends_on_text_and_settings():
+    openai = make_namespace("OpenAIClient", "text-embedding-3-small", 256)
+    openai_full = make_namespace("OpenAIClient", "text-embedding-3-small", 1536)
+    assert make_key(openai, "def f(): pass") == make_key(openai, "def f(): pass")
+    assert make_key(openai, "def f(): pass") != make_key(openai, "def g(): pass")
+    assert make_key(openai, "def f(): pass") != make_key(openai_full, "def f(): pass")
+
+
+def test_round_trip_and_counters(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), max_bytes=1 << 20)
+    cache.put_many({"a": [0.5, 1.0], "b": [0.25, -2.0]})
+
+    found = cache.get_many(["a", "b", "missing"])
+    assert found == {"a": [0.5, 1.0], "b": [0.25, -2.0]}
+
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+    assert stats["bytes"] == 16
+
+
+def test_persists_across_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    EmbeddingCache(path).put_many({"a": [1.0, 2.0, 3.0]})
+    reopened = EmbeddingCache(path)
+    assert reopened.get_many(["a"]) == {"a": [1.0, 2.0, 3.0]}
+    assert reopened.stats()["bytes"] == 12
+
+
+def test_replacing_a_key_does_not_grow_size(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"))
+    cache.put_many({"a": [1.0, 2.0]})
+    cache.put_many({"a": [3.0, 4.0]})
+    assert cache.stats()["bytes"] == 8
+    assert cache.get_many(["a"]) == {"a": [3.0, 4.0]}
+
+
+def test_evicts_least_recently_used(tmp_path):
+    clock = itertools.count()
+
+    # Four vectors of 8 bytes fit, a fifth triggers eviction down to 90% of the budget
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), max_bytes=32, clock=lambda: next(clock))
+    for key in ["a", "b", "c", "d"]:
+        cache.put_many({key: [1.0, 1.0]})
+    cache.get_many(["a"])  # "b" becomes least recently used
+    cache.put_many({"e": [1.0, 1.0]})
+
+    found = cache.get_many(["a", "b", "c", "d", "e"])
+    assert "b" not in found
+    assert "a" in found and "e" in found
+    assert cache.stats()["bytes"] <= 32
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Tests for token-budgeted, concurrent embedding dispatch.
+"""
+
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from api.embedding_dispatcher import RateLimiter, dispatch_embeddings, is_transient_error, pack_batches
+
+
+class FakeStatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+def test_pack_batches_respects_tokens_and_items():
+    assert pack_batches([10, 10, 10, 10], max_tokens=25, max_items=10) == [(0, 2), (2, 4)]
+    assert pack_batches([1] * 5, max_tokens=100, max_items=2) == [(0, 2), (2, 4), (4, 5)]
+    # An oversized input is sent on its own rather than blocking the queue
+    assert pack_batches([5, 50, 5], max_tokens=20, max_items=10) == [(0, 1), (1, 2), (2, 3)]
+    assert pack_batches([], max_tokens=20, max_items=10) == []
+
+
+def test_dispatch_keeps_order_with_concurrency():
+    texts = [f"chunk {i}" for i in range(20)]
+    in_flight = []
+    peak = []
+    lock = threading.Lock()
+
+    def embed(batch):
+        with lock:
+            in_flight.append(1)
+            peak.append(len(in_flight))
+        time.sleep(0.02)
+        with lock:
+            in_flight.pop()
+        return [[float(text.split()[1])] for text in batch]
+
+    vectors = dispatch_embeddings(texts, [1] * 20, embed, max_batch_tokens=100, max_batch_size=3,
+                                  max_concurrency=4)
+    assert vectors == [[float(i)] for i in range(20)]
+    assert 1 < max(peak) <= 4
+
+
+def test_rejected_batch_is_bisected_to_the_bad_chunk():
+    calls = []
+
+    def embed(batch):
+        calls.append(list(batch))
+        if "bad" in batch:
+            raise FakeStatusError(400)
+        return [[1.0] for _ in batch]
+
+    texts = ["a", "b", "bad", "d"]
+    vectors = dispatch_embeddings(texts, [1] * 4, embed, max_batch_tokens=100, max_batch_size=10,
+                                  max_concurrency=1, sleep=lambda _: None)
+    assert vectors == [[1.0], [1.0], None, [1.0]]
+    assert calls[0] == texts
+    assert ["a", "b"] in calls and ["bad"] in calls
+
+
+def test_transient_errors_are_retried_with_backoff():
+    attempts = []
+    delays = []
+
+    def embed(batch):
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise FakeStatusError(429)
+        return [[0.5] for _ in batch]
+
+    vectors = dispatch_embeddings(["a", "b"], [1, 1], embed, max_batch_tokens=100, max_batch_size=10,
+                                  max_retries=4, backoff_base=1.0, sleep=delays.append)
+    assert vectors == [[0.5], [0.5]]
+    assert len(attempts) == 3
+    assert 1.0 <= delays[0] < delays[1]
+
+
+def test_persistent_transient_failure_leaves_batch_empty():
+    vectors = dispatch_embeddings(["a", "b"], [1, 1], lambda batch: (_ for _ in ()).throw(TimeoutError()),
+                                  max_batch_tokens=100, max_batch_size=10, max_retries=2, sleep=lambda _: None)
+    assert vectors == [None, None]
+
+
+def test_transient_error_classification():
+    assert is_transient_error(FakeStatusError(429))
+    assert is_transient_error(FakeStatusError(503))
+    assert not is_transient_error(FakeStatusError(400))
+    assert is_transient_error(TimeoutError())
+    assert not is_transient_error(ValueError("bad input"))
+
+
+def _fake_clock():
+    now = [0.0]
+
+    def sleep(seconds):
+        now[0] += seconds
+
+    return (lambda: now[0]), sleep
+
+
+def test_rate_limiter_paces_requests():
+    clock, sleep = _fake_clock()
+    limiter = RateLimiter(requests_per_minute=2, clock=clock, sleep=sleep)
+    # The bucket starts full, then refills at one request every 30 seconds
+    assert limiter.acquire() == 0
+    assert limiter.acquire() == 0
+    assert abs(limiter.acquire() - 30.0) < 1e-6
+
+
+def test_rate_limiter_paces_tokens():
+    clock, sleep = _fake_clock()
+    limiter = RateLimiter(tokens_per_minute=600, clock=clock, sleep=sleep)
+    assert limiter.acquire(500) == 0
+    # 100 tokens left, refilling at 10 per second
+    assert abs(limiter.acquire(200) - 10.0) < 1e-6
+    # Requests above the whole budget wait for a full bucket instead of forever
+    assert abs(limiter.acquire(10_000) - 60.0) < 1e-6
+
+
+def test_unlimited_rate_limiter_never_waits():
+    limiter = RateLimiter()
+    assert all(limiter.acquire(1_000_000) == 0 for _ in range(100))
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Tests for the blocking-work executors and single-flight deduplication.
+"""
+
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from api.executors import SingleFlight, get_executor, run_blocking
+
+
+def test_run_blocking_keeps_loop_responsive():
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        task = asyncio.ensure_future(ticker())
+        thread_name = await run_blocking("index", lambda: (time.sleep(0.2), threading.current_thread().name)[1])
+        task.cancel()
+        return ticks, thread_name
+
+    ticks, thread_name = asyncio.run(scenario())
+    assert ticks >= 5
+    assert thread_name.startswith("deepwiki-index")
+
+
+def test_unknown_executor():
+    with pytest.raises(ValueError):
+        get_executor("gpu")
+
+
+def test_single_flight_shares_one_run():
+    flights = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "index"
+
+    async def scenario():
+        results = await asyncio.gather(*(flights.run("repo", work) for _ in range(5)))
+        return results, flights.in_flight()
+
+    results, in_flight = asyncio.run(scenario())
+    assert results == ["index"] * 5
+    assert len(calls) == 1
+    assert (flights.started, flights.joined) == (1, 4)
+    assert in_flight == 0
+
+
+def test_single_flight_propagates_errors_and_allows_retry():
+    flights = SingleFlight()
+    attempts = []
+
+    async def work():
+        attempts.append(1)
+        await asyncio.sleep(0.01)
+        if len(attempts) == 1:
+            raise ValueError("clone failed")
+        return "ok"
+
+    async def scenario():
+        first = await asyncio.gather(flights.run("repo", work), flights.run("repo", work), return_exceptions=True)
+        second = await flights.run("repo", work)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert all(isinstance(result, ValueError) for result in first)
+    assert second == "ok"
+
+
+def test_cancelled_caller_does_not_abort_others():
+    flights = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def scenario():
+        leader = asyncio.ensure_future(flights.run("repo", work))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flights.run("repo", work))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(scenario()) == "done"
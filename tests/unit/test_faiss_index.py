@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Tests for persisting FAISS indexes next to the vector store.
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from api.faiss_index import index_fingerprint, index_paths, load_index, save_index
+
+HEADER = {"version": 1, "count": 50, "dim": 8, "dtype": "float32", "source_mtime": 1.0}
+
+
+def _index():
+    vectors = np.random.default_rng(0).random((50, 8), dtype=np.float32)
+    index = faiss.IndexFlatIP(8)
+    index.add(vectors)
+    return index, vectors
+
+
+def test_fingerprint_tracks_data_and_settings():
+    fingerprint = index_fingerprint(HEADER, metric="prob")
+    assert fingerprint == index_fingerprint(dict(HEADER), metric="prob")
+    assert fingerprint != index_fingerprint({**HEADER, "source_mtime": 2.0}, metric="prob")
+    assert fingerprint != index_fingerprint(HEADER, metric="euclidean")
+
+
+def test_save_and_load_round_trip(tmp_path):
+    base = str(tmp_path / "owner_repo")
+    index, vectors = _index()
+    fingerprint = index_fingerprint(HEADER, metric="prob")
+    save_index(base, index, fingerprint)
+
+    loaded = load_index(base, fingerprint)
+    assert loaded is not None
+    assert loaded.ntotal == 50
+    expected = index.search(vectors[:2], 5)[1]
+    np.testing.assert_array_equal(loaded.search(vectors[:2], 5)[1], expected)
+
+
+def test_stale_or_missing_index_is_not_loaded(tmp_path):
+    base = str(tmp_path / "owner_repo")
+    assert load_index(base, "anything") is None
+
+    index, _ = _index()
+    save_index(base, index, index_fingerprint(HEADER, metric="prob"))
+    assert load_index(base, index_fingerprint({**HEADER, "count": 51}, metric="prob")) is None
+
+    # A truncated rewrite that left the sidecar behind is detected by the vector count
+    meta_path = index_paths(base)["meta"]
+    with open(meta_path) as f:
+        meta = json.load(f)
+    meta["ntotal"] = 49
+    with open(meta_path, "w") as f:
+        json.dump(meta, f)
+    assert load_index(base, meta["fingerprint"]) is None
+
+
+def test_index_type_follows_chunk_count():
+    from api.faiss_index import build_settings, resolve_index_config
+
+    config = resolve_index_config({"hnsw_min_chunks": 1000, "ivfpq_min_chunks": 100000})
+    assert build_settings(999, 256, config)["type"] == "flat"
+    assert build_settings(1000, 256, config)["type"] == "hnsw"
+    settings = build_settings(200000, 256, config)
+    assert settings["type"] == "ivfpq"
+    assert 256 % settings["pq_m"] == 0
+
+    # Forcing IVF-PQ on a repository too small to train it falls back to exact search
+    assert build_settings(500, 256, resolve_index_config({"type": "ivfpq"}))["type"] == "flat"
+
+
+def test_recall_latency_report():
+    from api.faiss_index import recall_latency_report
+
+    vectors = np.random.default_rng(1).random((2000, 16), dtype=np.float32)
+    report = recall_latency_report(vectors, [{"type": "flat"}, {"type": "hnsw", "ef_search": 64}],
+                                   top_k=10, num_queries=20)
+    assert [row["type"] for row in report] == ["flat", "hnsw"]
+    assert report[0]["recall@10"] == 1.0
+    assert 0.5 < report[1]["recall@10"] <= 1.0
+    assert report[1]["ef_search"] == 64
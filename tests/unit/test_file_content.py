@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Tests for reading file contents from the local clone of an indexed repository.
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+REPO_URL = "https://github.com/o/r"
+
+
+def git(repo, *args):
+    result = subprocess.run(["git", "-C", str(repo), *args], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    return result.stdout.decode("utf-8").strip()
+
+
+@pytest.fixture
+def data_pipeline(monkeypatch):
+    from api import data_pipeline
+
+    monkeypatch.setattr(data_pipeline, "_file_content_cache", data_pipeline.OrderedDict())
+    return data_pipeline
+
+
+@pytest.fixture
+def clone(tmp_path):
+    """A repository with one commit, the file outside it a symlink could point to."""
+    (tmp_path / "secret.txt").write_text("server file\n")
+    repo = tmp_path / "repo"
+    (repo / "src").mkdir(parents=True)
+    (repo / "src" / "main.py").write_text("print('v1')\n")
+    git(repo, "init", "-q")
+    git(repo, "config", "user.email", "dev@example.com")
+    git(repo, "config", "user.name", "dev")
+    git(repo, "add", "-A")
+    git(repo, "commit", "-q", "-m", "v1")
+    return repo
+
+
+def test_paths_outside_the_repository_are_refused(data_pipeline, clone):
+    read = data_pipeline.read_file_from_clone
+    assert read(str(clone), "src/main.py") == "print('v1')\n"
+    assert read(str(clone), "/src/main.py") == "print('v1')\n"
+    assert read(str(clone), "../secret.txt") is None
+    assert read(str(clone), "src/../../secret.txt") is None
+    assert read(str(clone), "missing.py") is None
+
+
+def test_symlinks_leaving_the_repository_are_refused(data_pipeline, clone):
+    os.symlink(clone.parent / "secret.txt", clone / "README")
+    os.symlink(clone.parent, clone / "parent")
+    os.symlink(clone / "src" / "main.py", clone / "alias.py")
+
+    read = data_pipeline.read_file_from_clone
+    assert read(str(clone), "README") is None
+    assert read(str(clone), "parent/secret.txt") is None
+    # Links staying inside the repository are followed
+    assert read(str(clone), "alias.py") == "print('v1')\n"
+
+
+def test_commit_pinned_reads_ignore_the_working_tree(data_pipeline, clone):
+    commit = git(clone, "rev-parse", "HEAD")
+    (clone / "src" / "main.py").write_text("print('edited')\n")
+    read = data_pipeline.read_file_from_clone
+    assert read(str(clone), "src/main.py", commit) == "print('v1')\n"
+    assert read(str(clone), "src/missing.py", commit) is None
+    assert read(str(clone), "../secret.txt", commit) is None
+
+
+def test_commit_pinned_contents_are_cached_least_recently_used(data_pipeline, clone, monkeypatch):
+    for name in ("a.py", "b.py", "c.py"):
+        (clone / name).write_text(f"# {name}\n")
+    git(clone, "add", "-A")
+    git(clone, "commit", "-q", "-m", "more")
+    commit = git(clone, "rev-parse", "HEAD")
+
+    indexed = {"commit": commit}
+    reads = []
+    read_file_from_clone = data_pipeline.read_file_from_clone
+
+    def counting_read(local_path, file_path, at_commit=None):
+        reads.append((file_path, at_commit))
+        return read_file_from_clone(local_path, file_path, at_commit)
+
+    monkeypatch.setattr(data_pipeline, "_get_local_clone", lambda repo_url, repo_type: (str(clone), indexed["commit"]))
+    monkeypatch.setattr(data_pipeline, "read_file_from_clone", counting_read)
+    monkeypatch.setattr(data_pipeline, "FILE_CONTENT_CACHE_SIZE", 2)
+
+    def get(file_path):
+        return asyncio.run(data_pipeline.aget_file_content(REPO_URL, file_path, "github"))
+
+    assert get("a.py") == "# a.py\n"
+    assert get("b.py") == "# b.py\n"
+    assert get("a.py") == "# a.py\n"  # cached, and now the most recently used
+    assert get("c.py") == "# c.py\n"  # evicts b.py
+    assert get("a.py") == "# a.py\n"
+    assert get("b.py") == "# b.py\n"
+    assert [path for path, _ in reads] == ["a.py", "b.py", "c.py", "b.py"]
+
+    # Without an indexed commit the working tree is read every time and nothing is cached
+    indexed["commit"] = None
+    (clone / "a.py").write_text("# edited\n")
+    assert get("a.py") == "# edited\n"
+    assert get("a.py") == "# edited\n"
+    assert reads[-2:] == [("a.py", None), ("a.py", None)]
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Tests for the pooled HTTP client and its ETag revalidation.
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+from aiohttp import web
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from api.http_client import ETagCache, etag_cache, fetch, get_http_session, run_coroutine_sync
+
+
+async def _serve(handler):
+    app = web.Application()
+    app.router.add_get("/{tail:.*}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def test_etag_key_separates_credentials():
+    url = "https://api.github.com/repos/o/r/contents/a.py"
+    assert ETagCache.make_key(url, {}) == ETagCache.make_key(url, {"Accept": "json"})
+    assert ETagCache.make_key(url, {"Authorization": "token a"}) != ETagCache.make_key(url, {"Authorization": "token b"})
+
+
+def test_conditional_requests_reuse_cached_body():
+    seen_if_none_match = []
+
+    async def handler(request):
+        seen_if_none_match.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304)
+        return web.Response(text="file body", headers={"ETag": '"v1"'})
+
+    async def scenario():
+        etag_cache.clear()
+        runner, base = await _serve(handler)
+        try:
+            first = await fetch(f"{base}/file")
+            second = await fetch(f"{base}/file")
+            uncached = await fetch(f"{base}/file", use_etag=False)
+        finally:
+            await runner.cleanup()
+        return first, second, uncached
+
+    first, second, uncached = run_coroutine_sync(scenario())
+    assert (first.status, first.text, first.from_cache) == (200, "file body", False)
+    assert (second.status, second.text, second.from_cache) == (200, "file body", True)
+    assert uncached.from_cache is False
+    assert seen_if_none_match == [None, '"v1"', None]
+
+
+def test_session_is_shared_within_a_loop():
+    async def scenario():
+        return get_http_session() is get_http_session()
+
+    assert run_coroutine_sync(scenario())
+
+
+def test_llm_pool_is_separate_and_untimed():
+    async def scenario():
+        llm = get_http_session("llm")
+        return llm is get_http_session("llm"), llm is not get_http_session(), llm.timeout.total
+
+    shared, separate, total_timeout = run_coroutine_sync(scenario())
+    assert shared and separate
+    assert total_timeout is None
+
+
+def test_run_coroutine_sync_inside_running_loop():
+    async def inner():
+        return 42
+
+    async def outer():
+        # Synchronous code called from a coroutine must not try to re-enter the loop
+        return run_coroutine_sync(inner())
+
+    assert asyncio.run(outer()) == 42
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Tests for re-indexing a repository incrementally from its git history.
+"""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+EMBEDDER = "openai"
+# The default exclusions match any component of the absolute path, tmp_path's "tmp" included
+FILTERS = {"included_files": [".py", ".md"]}
+
+
+def git(repo, *args):
+    result = subprocess.run(["git", "-C", str(repo), *args], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    return result.stdout.decode("utf-8").strip()
+
+
+def init_repo(path, files):
+    path.mkdir()
+    git(path, "init", "-q")
+    git(path, "config", "user.email", "dev@example.com")
+    git(path, "config", "user.name", "dev")
+    return commit(path, files)
+
+
+def commit(repo, files=None, deleted=()):
+    for name, text in (files or {}).items():
+        file = repo / name
+        file.parent.mkdir(parents=True, exist_ok=True)
+        file.write_text(text)
+    for name in deleted:
+        (repo / name).unlink()
+    git(repo, "add", "-A")
+    git(repo, "commit", "-q", "-m", "change")
+    return git(repo, "rev-parse", "HEAD")
+
+
+# Files the stub embedder pipeline was called with
+EMBEDDED = []
+
+
+def stub_embed_pipeline():
+    """An embedder pipeline stand-in that splits documents into lines and records their files."""
+    from adalflow.core.component import DataComponent
+    from adalflow.core.types import Document
+    from adalflow.utils.registry import EntityMapping
+
+    class StubEmbedPipeline(DataComponent):
+        def call(self, documents):
+            chunks = []
+            for doc in documents:
+                EMBEDDED.append(doc.meta_data["file_path"])
+                for order, line in enumerate(doc.text.splitlines()):
+                    chunks.append(Document(text=line, meta_data=dict(doc.meta_data),
+                                           vector=[float(len(line)), 1.0], parent_doc_id=doc.id, order=order))
+            return chunks
+
+    # The database pickle rebuilds its transformers by class name
+    EntityMapping.register(StubEmbedPipeline.__name__, StubEmbedPipeline)
+    return StubEmbedPipeline
+
+
+@pytest.fixture
+def data_pipeline(tmp_path, monkeypatch):
+    from api import data_pipeline
+
+    monkeypatch.setattr(data_pipeline, "get_adalflow_default_root_path", lambda: str(tmp_path / "adalflow"))
+    pipeline_class = stub_embed_pipeline()
+    monkeypatch.setattr(data_pipeline, "prepare_data_pipeline",
+                        lambda embedder_type=None, is_ollama_embedder=None: pipeline_class())
+    EMBEDDED.clear()
+    return data_pipeline
+
+
+@pytest.fixture
+def indexed_repo(tmp_path, data_pipeline):
+    """A local repository with a database and manifest built from its first commit."""
+    repo = tmp_path / "repo"
+    init_repo(repo, {
+        "a.py": "def a():\n    return 1\n",
+        "b.py": "def b():\n    return 2\n",
+        "notes.md": "# Notes\nUnchanged file\n",
+    })
+    manager = data_pipeline.DatabaseManager()
+    manager._create_repo(str(repo))
+    documents = data_pipeline.read_all_documents(str(repo), embedder_type=EMBEDDER, **FILTERS)
+    data_pipeline.transform_documents_and_save_to_db(documents, manager.repo_paths["save_db_file"], embedder_type=EMBEDDER)
+    manager._write_index_manifest(EMBEDDER)
+    EMBEDDED.clear()
+    return repo, manager
+
+
+def load_chunks(data_pipeline, manager):
+    db = data_pipeline.LocalDB.load_state(manager.repo_paths["save_db_file"])
+    return db, db.get_transformed_data(key="split_and_embed")
+
+
+def test_changed_files_are_split_into_changed_and_deleted(tmp_path, data_pipeline):
+    repo = tmp_path / "repo"
+    old = init_repo(repo, {"a.py": "a = 1\n", "b.py": "b = 1\n"})
+    new = commit(repo, {"a.py": "a = 2\n", "src/c.py": "c = 1\n"}, deleted=["b.py"])
+
+    changed, deleted = data_pipeline.get_changed_files(str(repo), old, new)
+    assert changed == {"a.py", os.path.join("src", "c.py")}
+    assert deleted == {"b.py"}
+    assert data_pipeline.get_changed_files(str(repo), "0" * 40, new) is None
+
+
+def test_update_reembeds_only_modified_and_added_files(data_pipeline, indexed_repo):
+    repo, manager = indexed_repo
+    _, before = load_chunks(data_pipeline, manager)
+    kept_before = [(c.text, c.vector) for c in before if c.meta_data["file_path"] == "notes.md"]
+
+    new_commit = commit(repo, {"a.py": "def a():\n    return 10\n", "src/c.py": "C = 3\n"}, deleted=["b.py"])
+    assert manager.update_db_index(embedder_type=EMBEDDER, **FILTERS) is True
+    assert sorted(EMBEDDED) == ["a.py", os.path.join("src", "c.py")]
+
+    db, chunks = load_chunks(data_pipeline, manager)
+    by_file = {}
+    for chunk in chunks:
+        by_file.setdefault(chunk.meta_data["file_path"], []).append(chunk.text)
+    assert set(by_file) == {"a.py", "notes.md", os.path.join("src", "c.py")}
+    assert by_file["a.py"] == ["def a():", "    return 10"]
+    assert [(c.text, c.vector) for c in chunks if c.meta_data["file_path"] == "notes.md"] == kept_before
+    assert sorted(doc.meta_data["file_path"] for doc in db.items) == sorted(by_file)
+
+    with open(manager.repo_paths["save_manifest_file"], "r", encoding="utf-8") as f:
+        assert json.load(f) == {"commit": new_commit, "embedder_type": EMBEDDER}
+    # Nothing left to do until the next commit
+    assert manager.update_db_index(embedder_type=EMBEDDER, **FILTERS) is False
+
+
+def test_unavailable_old_commit_falls_back_to_a_full_rebuild(data_pipeline, indexed_repo):
+    repo, manager = indexed_repo
+    with open(manager.repo_paths["save_manifest_file"], "w", encoding="utf-8") as f:
+        json.dump({"commit": "0" * 40, "embedder_type": EMBEDDER}, f)
+    commit(repo, {"a.py": "a = 2\n"})
+
+    assert manager.update_db_index(embedder_type=EMBEDDER, **FILTERS) is True
+    assert not os.path.exists(manager.repo_paths["save_db_file"])
+    assert EMBEDDED == []
+
+
+def test_embedder_change_falls_back_to_a_full_rebuild(data_pipeline, indexed_repo):
+    repo, manager = indexed_repo
+    commit(repo, {"a.py": "a = 2\n"})
+
+    assert manager.update_db_index(embedder_type="google", **FILTERS) is True
+    assert not os.path.exists(manager.repo_paths["save_db_file"])
+    assert EMBEDDED == []
+
+
+def test_refresh_keeps_the_old_commit_diffable(tmp_path, data_pipeline):
+    origin = tmp_path / "origin"
+    old = init_repo(origin, {"a.py": "a = 1\n"})
+    clone = tmp_path / "clone"
+    subprocess.run(["git", "clone", "-q", "--depth=1", f"file://{origin}", str(clone)], check=True)
+    new = commit(origin, {"a.py": "a = 2\n", "b.py": "b = 1\n"})
+
+    assert data_pipeline.refresh_repo(f"file://{origin}", str(clone)) == new
+    assert (clone / "b.py").read_text() == "b = 1\n"
+    assert data_pipeline.get_changed_files(str(clone), old, new) == ({"a.py", "b.py"}, set())
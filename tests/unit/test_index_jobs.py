@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Tests for the background indexing job manager.
+"""
+
+import asyncio
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from api.index_jobs import IndexJobManager, report_progress
+
+
+def _wait(manager, job_id, on_progress=None):
+    return asyncio.run(manager.wait(job_id, on_progress=on_progress, interval=0.01))
+
+
+def test_job_reports_progress_and_succeeds(tmp_path):
+    seen_tokens = []
+
+    def runner(job, token):
+        seen_tokens.append(token)
+        report_progress("cloned")
+        for done in range(0, 101, 50):
+            report_progress("embedding", done, 100)
+
+    manager = IndexJobManager(str(tmp_path / "jobs.sqlite3"), runner=runner)
+    job = manager.submit("https://github.com/o/r", access_token="secret")
+    snapshots = []
+
+    async def collect(snapshot):
+        snapshots.append(snapshot)
+
+    finished = _wait(manager, job.id, collect)
+    assert finished.status == "succeeded"
+    assert finished.stage == "done"
+    assert seen_tokens == ["secret"]
+    assert snapshots[-1]["status"] == "succeeded"
+
+    # Tokens never reach the job table
+    rows = sqlite3.connect(str(tmp_path / "jobs.sqlite3")).execute("SELECT * FROM index_jobs").fetchall()
+    assert not any("secret" in str(value) for row in rows for value in row)
+    manager.close()
+
+
+def test_failed_job_records_error(tmp_path):
+    def runner(job, token):
+        raise ValueError("clone failed")
+
+    manager = IndexJobManager(str(tmp_path / "jobs.sqlite3"), runner=runner)
+    finished = _wait(manager, manager.submit("https://github.com/o/r").id)
+    assert (finished.status, finished.error) == ("failed", "clone failed")
+    manager.close()
+
+
+def test_duplicate_submissions_share_a_job(tmp_path):
+    release = threading.Event()
+
+    def runner(job, token):
+        release.wait(5)
+
+    manager = IndexJobManager(str(tmp_path / "jobs.sqlite3"), runner=runner)
+    first = manager.submit("https://github.com/o/r", excluded_dirs=["b", "a"])
+    second = manager.submit("https://github.com/o/r", excluded_dirs=["a", "b"])
+    other = manager.submit("https://github.com/o/other")
+    release.set()
+
+    assert first.id == second.id
+    assert other.id != first.id
+    assert _wait(manager, first.id).status == "succeeded"
+    manager.close()
+
+
+def test_cancel_running_and_queued_jobs(tmp_path):
+    started = threading.Event()
+
+    def runner(job, token):
+        started.set()
+        while True:
+            report_progress("embedding", 0, 10)
+
+    manager = IndexJobManager(str(tmp_path / "jobs.sqlite3"), workers=1, runner=runner)
+    running = manager.submit("https://github.com/o/r")
+    queued = manager.submit("https://github.com/o/queued")
+    started.wait(5)
+
+    assert manager.cancel(queued.id).status == "cancelled"
+    manager.cancel(running.id)
+    assert _wait(manager, running.id).status == "cancelled"
+    assert manager.cancel("missing") is None
+    manager.close()
+
+
+def test_unfinished_jobs_are_marked_interrupted_on_restart(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    release = threading.Event()
+    manager = IndexJobManager(path, runner=lambda job, token: release.wait(5))
+    job = manager.submit("https://github.com/o/r")
+    manager.close()
+
+    restarted = IndexJobManager(path, runner=lambda job, token: None)
+    interrupted = restarted.get(job.id)
+    assert interrupted.status == "failed"
+    assert "Interrupted" in interrupted.error
+    assert [listed.id for listed in restarted.list()] == [job.id]
+    release.set()
+    restarted.close()
+
+
+def _add_unfinished_job(path, job_id, owner_host, owner_pid):
+    conn = sqlite3.connect(path)
+    conn.execute("INSERT INTO index_jobs (id, repo_url, status, created_at, owner_host, owner_pid) "
+                 "VALUES (?, 'https://github.com/o/r', 'running', 0, ?, ?)", (job_id, owner_host, owner_pid))
+    conn.commit()
+    conn.close()
+
+
+def test_only_jobs_of_exited_processes_are_reaped(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    IndexJobManager(path, runner=lambda job, token: None).close()
+    worker = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    try:
+        host = socket.gethostname()
+        _add_unfinished_job(path, "live", host, worker.pid)
+        _add_unfinished_job(path, "exited", host, exited.pid)
+        _add_unfinished_job(path, "other-host", "elsewhere", exited.pid)
+
+        manager = IndexJobManager(path, runner=lambda job, token: None)
+        assert manager.get("live").status == "running"
+        assert manager.get("other-host").status == "running"
+        assert manager.get("exited").status == "failed"
+        manager.close()
+    finally:
+        worker.kill()
+        worker.wait()
+
+
+def test_job_table_without_owners_is_migrated(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE index_jobs (id TEXT PRIMARY KEY, repo_url TEXT NOT NULL, repo_type TEXT, "
+                 "embedder_type TEXT, excluded_dirs TEXT, excluded_files TEXT, included_dirs TEXT, "
+                 "included_files TEXT, refresh INTEGER, status TEXT NOT NULL, stage TEXT, current INTEGER, "
+                 "total INTEGER, error TEXT, created_at REAL NOT NULL, started_at REAL, finished_at REAL)")
+    conn.execute("INSERT INTO index_jobs (id, repo_url, status, created_at) VALUES ('old', 'https://github.com/o/r', 'queued', 0)")
+    conn.commit()
+    conn.close()
+
+    manager = IndexJobManager(path, runner=lambda job, token: None)
+    assert manager.get("old").status == "failed"
+    job = manager.submit("https://github.com/o/new")
+    assert (job.owner_host, job.owner_pid) == (socket.gethostname(), os.getpid())
+    manager.close()
+
+
+def test_report_progress_is_a_noop_outside_jobs():
+    report_progress("reading", 1, 2)
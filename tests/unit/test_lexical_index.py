@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Tests for the BM25 identifier index and reciprocal rank fusion.
+"""
+
+import sys
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from api.lexical_index import (LexicalIndex, lexical_fingerprint, load_or_build_for_store, reciprocal_rank_fusion,
+                               tokenize)
+
+CHUNKS = [
+    ("def prepare_db_index(self):\n    return self.db", "api/data_pipeline.py"),
+    ("transformed = manager.prepare_db_index()", "api/rag.py"),
+    ("class FAISSRetriever:\n    def build_index_from_documents(self): pass", "api/retriever.py"),
+    ("const chatHistory = useChatHistory();", "src/components/Ask.tsx"),
+]
+
+
+def test_tokenize_splits_identifiers():
+    assert tokenize("prepare_db_index") == ["prepare_db_index", "prepare", "db", "index"]
+    assert tokenize("useChatHistory") == ["usechathistory", "use", "chat", "history"]
+    assert tokenize("HTTPServer x") == ["httpserver", "http", "server"]
+    assert tokenize("src/components/Ask.tsx") == ["src", "components", "ask", "tsx"]
+
+
+def test_exact_identifier_ranks_first():
+    index = LexicalIndex.build([text for text, _ in CHUNKS], [path for _, path in CHUNKS])
+    results = index.search("where is `prepare_db_index` called?", top_k=10)
+    assert {i for i, _ in results[:2]} == {0, 1}
+    assert all(score > 0 for _, score in results)
+    assert index.search("chat history", top_k=1)[0][0] == 3
+    # File paths are indexed too
+    assert index.search("retriever", top_k=1)[0][0] == 2
+    assert index.search("nothing matches", top_k=5) == []
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = LexicalIndex.build([text for text, _ in CHUNKS], [path for _, path in CHUNKS])
+    base = str(tmp_path / "repo")
+    index.save(base, "fp")
+
+    loaded = LexicalIndex.load(base, "fp")
+    assert loaded is not None
+    assert loaded.search("prepare_db_index") == index.search("prepare_db_index")
+    assert LexicalIndex.load(base, "other") is None
+
+
+class FakeStore:
+    """The parts of a VectorStore the lexical index reads."""
+
+    def __init__(self, base_path):
+        self.base_path = base_path
+        self.header = {"count": len(CHUNKS), "source_mtime": 1.0}
+
+    def __len__(self):
+        return len(CHUNKS)
+
+    def text(self, i):
+        return CHUNKS[i][0]
+
+    def meta_data(self, i):
+        return {"file_path": CHUNKS[i][1]}
+
+
+def test_load_or_build_for_store_saves_the_index(tmp_path):
+    store = FakeStore(str(tmp_path / "repo"))
+    built = load_or_build_for_store(store)
+    assert built.search("useChatHistory")[0][0] == 3
+    assert LexicalIndex.load(store.base_path, lexical_fingerprint(store.header)) is not None
+
+    # A newer store does not reuse the saved index
+    store.header["source_mtime"] = 2.0
+    assert LexicalIndex.load(store.base_path, lexical_fingerprint(store.header)) is None
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 4]], k=60)
+    assert [item for item, _ in fused] == [3, 1, 2, 4]
+    assert reciprocal_rank_fusion([[1, 2], [2, 1]], top_k=1)[0][0] in (1, 2)
+    assert len(reciprocal_rank_fusion([[1, 2, 3]], top_k=2)) == 2
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared chat prompt builder.
+"""
+
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from api.prompt_builder import ChatPrompt, language_name, parse_conversation, system_prompt
+
+
+def message(role, content):
+    return SimpleNamespace(role=role, content=content)
+
+
+def test_plain_conversation_keeps_its_history():
+    conversation = parse_conversation([
+        message("user", "What is this?"),
+        message("assistant", "A wiki generator."),
+        message("user", "How is it deployed?"),
+    ])
+    assert conversation.query == "How is it deployed?"
+    assert conversation.history == [("What is this?", "A wiki generator.")]
+    assert not conversation.is_deep_research
+
+
+def test_deep_research_continuation_uses_the_original_topic():
+    messages = [
+        message("user", "[DEEP RESEARCH] How does indexing work?"),
+        message("assistant", "## Research Plan ..."),
+        message("user", "[DEEP RESEARCH] Continue the research"),
+    ]
+    conversation = parse_conversation(messages)
+    assert conversation.is_deep_research
+    assert conversation.research_iteration == 2
+    assert conversation.query == "How does indexing work?"
+    assert messages[-1].content == "[DEEP RESEARCH] Continue the research"
+
+
+def test_invalid_conversations_are_rejected():
+    with pytest.raises(ValueError, match="No messages"):
+        parse_conversation([])
+    with pytest.raises(ValueError, match="from the user"):
+        parse_conversation([message("assistant", "hi")])
+
+
+def test_system_prompts_are_shared_per_mode():
+    url = "https://github.com/AsyncFuncAI/deepwiki-open"
+    first = system_prompt("github", url, "English")
+    assert first is system_prompt("github", url, "English")
+    assert "(deepwiki-open)" in first and "respond in English" in first
+    assert "## Research Update 3" in system_prompt("github", url, "English", True, 3)
+    assert "## Final Conclusion" in system_prompt("github", url, "English", True, 7)
+    assert language_name("ja", {"default": "en", "supported_languages": {"ja": "Japanese"}}) == "Japanese"
+    assert language_name(None, {"default": "en", "supported_languages": {}}) == "English"
+
+
+def test_prompt_renders_for_each_client_format():
+    prompt = ChatPrompt(system="SYSTEM", query="Why?", history=[("q", "a")], file_path="a.py",
+                        file_content="code", context_text="## File Path: a.py\n\ncode")
+    text = prompt.text("openai")
+    assert text.startswith("/no_think SYSTEM\n\n<conversation_history>\n<turn>\n<user>q</user>")
+    assert "<currentFileContent path=\"a.py\">\ncode\n</currentFileContent>" in text
+    assert "<START_OF_CONTEXT>" in text and text.endswith("<query>\nWhy?\n</query>\n\nAssistant: ")
+    assert prompt.text("ollama").endswith("Assistant:  /no_think")
+
+    fallback = prompt.text("google", include_context=False)
+    assert "<START_OF_CONTEXT>" not in fallback and "input size constraints" in fallback
+
+    messages = prompt.for_provider("openrouter")
+    assert [m["role"] for m in messages] == ["system", "user"]
+    assert messages[0]["content"] == "/no_think SYSTEM"
+    assert messages[1]["content"].endswith("<query>\nWhy?\n</query>")
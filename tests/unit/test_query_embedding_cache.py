@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Tests for the two-tier query embedding cache.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+import api.query_embedding_cache as query_cache_module
+from api.embedding_cache import EmbeddingCache
+from api.query_embedding_cache import QueryEmbeddingCache
+
+
+@pytest.fixture
+def disk_cache(tmp_path, monkeypatch):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite3"))
+    monkeypatch.setattr(query_cache_module, "get_embedding_cache", lambda: cache)
+    yield cache
+    cache.close()
+
+
+def test_repeated_queries_skip_the_embedder(disk_cache):
+    cache = QueryEmbeddingCache(max_entries=10)
+    calls = []
+
+    def embed(query):
+        calls.append(query)
+        return [0.5, 0.25]
+
+    for _ in range(3):
+        assert cache.get_or_embed("openai|small|256|", "Contexts related to api/rag.py", embed) == [0.5, 0.25]
+    assert calls == ["Contexts related to api/rag.py"]
+    stats = cache.stats()
+    assert (stats["memory_hits"], stats["misses"]) == (2, 1)
+    assert stats["hit_rate"] == pytest.approx(2 / 3)
+
+
+def test_namespaces_are_kept_apart(disk_cache):
+    cache = QueryEmbeddingCache(max_entries=10)
+    cache.put("model-a", "query", [1.0])
+    assert cache.get("model-b", "query") is None
+    assert cache.get("model-a", "query") == [1.0]
+
+
+def test_disk_tier_survives_a_new_process(disk_cache):
+    QueryEmbeddingCache(max_entries=10).put("ns", "query", [0.5])
+
+    fresh = QueryEmbeddingCache(max_entries=10)
+    assert fresh.get("ns", "query") == [0.5]
+    assert fresh.get("ns", "query") == [0.5]
+    assert (fresh.disk_hits, fresh.memory_hits) == (1, 1)
+
+
+def test_lru_evicts_oldest_queries():
+    cache = QueryEmbeddingCache(max_entries=2, use_disk=False)
+    cache.put("ns", "a", [1.0])
+    cache.put("ns", "b", [2.0])
+    cache.get("ns", "a")
+    cache.put("ns", "c", [3.0])
+    assert cache.get("ns", "b") is None
+    assert cache.get("ns", "a") == [1.0]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_embedding_errors_are_not_cached():
+    cache = QueryEmbeddingCache(max_entries=2, use_disk=False)
+
+    def failing(query):
+        raise ValueError("quota exceeded")
+
+    with pytest.raises(ValueError):
+        cache.get_or_embed("ns", "query", failing)
+    assert cache.get_or_embed("ns", "query", lambda query: [1.0]) == [1.0]
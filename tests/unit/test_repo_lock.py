@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Tests for the per-repository indexing lock.
+"""
+
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from api.repo_lock import repo_index_lock
+
+
+def test_threads_indexing_a_repository_are_serialized(tmp_path):
+    active = []
+    overlaps = []
+
+    def index():
+        with repo_index_lock("owner_repo", str(tmp_path)):
+            active.append(1)
+            overlaps.append(len(active))
+            time.sleep(0.02)
+            active.pop()
+
+    threads = [threading.Thread(target=index) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert overlaps == [1, 1, 1, 1]
+    assert (tmp_path / "owner_repo.lock").exists()
+
+
+def try_lock(repo_name, lock_dir, timeout=0.5):
+    """Return whether another thread takes and releases the lock within timeout."""
+    done = threading.Event()
+
+    def take():
+        with repo_index_lock(repo_name, lock_dir):
+            done.set()
+
+    threading.Thread(target=take, daemon=True).start()
+    return done.wait(timeout)
+
+
+def test_other_repositories_are_not_blocked(tmp_path):
+    with repo_index_lock("owner_a", str(tmp_path)):
+        assert try_lock("owner_b", str(tmp_path))
+
+
+def test_lock_is_reentrant_within_a_thread(tmp_path):
+    with repo_index_lock("owner_repo", str(tmp_path)):
+        with repo_index_lock("owner_repo", str(tmp_path)):
+            pass
+        # Leaving the inner block does not release the outer one
+        assert not try_lock("owner_repo", str(tmp_path), timeout=0.1)
+    assert try_lock("owner_repo", str(tmp_path))
+
+
+def test_cached_retriever_is_served_while_the_repository_is_indexed(tmp_path, monkeypatch):
+    from api import data_pipeline, rag
+    from api.retriever_cache import CachedRetriever, make_cache_key, retriever_cache
+
+    monkeypatch.setattr(data_pipeline, "get_adalflow_default_root_path", lambda: str(tmp_path))
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    manager = data_pipeline.DatabaseManager()
+    db_file = manager.db_file_path(str(repo), "local")
+    Path(db_file).parent.mkdir(parents=True)
+    Path(db_file).write_bytes(b"")
+    key = make_cache_key(db_file, "openai")
+    retriever_cache.put(key, CachedRetriever(documents=["chunk"], retriever="retriever", db_file=db_file))
+
+    instance = rag.RAG.__new__(rag.RAG)
+    instance.embedder_type = "openai"
+    served = threading.Event()
+    try:
+        with manager.index_lock(str(repo), "local"):
+            thread = threading.Thread(target=lambda: instance.prepare_retriever(str(repo), "local") or served.set())
+            thread.start()
+            assert served.wait(2)
+        assert instance.retriever == "retriever"
+    finally:
+        retriever_cache.invalidate(db_file)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Tests for the process-wide retriever cache.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from api.retriever_cache import CachedRetriever, RetrieverCache, make_cache_key
+
+
+def _entry(db_file, nbytes=10):
+    return CachedRetriever(documents=[], retriever=object(), db_file=db_file, nbytes=nbytes)
+
+
+def test_hit_miss_counters():
+    cache = RetrieverCache(max_entries=2, max_bytes=1000)
+    assert cache.get("a") is None
+    cache.put("a", _entry("a.pkl"))
+    assert cache.get("a") is not None
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["entries"] == 1
+
+
+def test_lru_eviction_by_entry_count():
+    cache = RetrieverCache(max_entries=2, max_bytes=1000)
+    cache.put("a", _entry("a.pkl"))
+    cache.put("b", _entry("b.pkl"))
+    cache.get("a")  # "b" becomes least recently used
+    cache.put("c", _entry("c.pkl"))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_eviction_by_memory_budget():
+    cache = RetrieverCache(max_entries=10, max_bytes=100)
+    cache.put("a", _entry("a.pkl", nbytes=60))
+    cache.put("b", _entry("b.pkl", nbytes=60))
+
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] == 60
+
+    # Entries larger than the whole budget are never cached
+    cache.put("huge", _entry("huge.pkl", nbytes=1000))
+    assert cache.get("huge") is None
+
+
+def test_invalidate_by_db_file():
+    cache = RetrieverCache(max_entries=10, max_bytes=1000)
+    cache.put(("a.pkl", 1), _entry("a.pkl"))
+    cache.put(("a.pkl", 2), _entry("a.pkl"))
+    cache.put(("b.pkl", 1), _entry("b.pkl"))
+
+    assert cache.invalidate("a.pkl") == 2
+    assert cache.get(("b.pkl", 1)) is not None
+    assert cache.stats()["invalidations"] == 2
+
+
+def test_cache_key_tracks_file_and_filters(tmp_path):
+    db_file = tmp_path / "owner_repo.pkl"
+    assert make_cache_key(str(db_file), "openai") is None
+
+    db_file.write_bytes(b"data")
+    key = make_cache_key(str(db_file), "openai", excluded_dirs=["b", "a"])
+    assert key == make_cache_key(str(db_file), "openai", excluded_dirs=["a", "b"])
+    assert key != make_cache_key(str(db_file), "ollama", excluded_dirs=["a", "b"])
+
+    os.utime(db_file, (1, 1))
+    assert key != make_cache_key(str(db_file), "openai", excluded_dirs=["a", "b"])
+
+
+def test_get_or_create_builds_once():
+    cache = RetrieverCache(max_entries=2, max_bytes=1000)
+    calls = []
+
+    def factory():
+        calls.append(1)
+        return _entry("a.pkl")
+
+    first = cache.get_or_create("a", factory)
+    second = cache.get_or_create("a", factory)
+    assert first is second
+    assert len(calls) == 1
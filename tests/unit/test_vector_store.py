@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Tests for the memory-mapped vector store.
+"""
+
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from api.vector_store import VectorStore, remove_vector_store, store_paths, write_vector_store
+
+
+def _chunk(i, vector, text=None):
+    return SimpleNamespace(
+        text=text if text is not None else f"chunk {i}",
+        vector=vector,
+        id=f"id-{i}",
+        parent_doc_id="parent",
+        order=i,
+        estimated_num_tokens=2,
+        meta_data={"file_path": f"src/file_{i}.py"},
+    )
+
+
+def test_round_trip(tmp_path):
+    base = str(tmp_path / "owner_repo")
+    chunks = [_chunk(0, [1.0, 0.0, 0.0]), _chunk(1, [0.0, 1.0, 0.0], text="héllo ✓"), _chunk(2, [0.0, 0.0, 1.0])]
+    assert write_vector_store(base, chunks, source_mtime=42.0) == 3
+
+    store = VectorStore.open(base, source_mtime=42.0)
+    assert len(store) == 3
+    assert store.dim == 3
+    assert isinstance(store.vectors, np.memmap)
+    assert store.text(1) == "héllo ✓"
+    assert store.meta_data(2) == {"file_path": "src/file_2.py"}
+    np.testing.assert_array_equal(store.vector(1), [0.0, 1.0, 0.0])
+
+
+def test_inconsistent_vectors_are_left_out(tmp_path):
+    base = str(tmp_path / "owner_repo")
+    chunks = [_chunk(0, [1.0, 0.0]), _chunk(1, [1.0, 0.0, 0.0]), _chunk(2, [0.0, 1.0]), _chunk(3, None)]
+    assert write_vector_store(base, chunks) == 2
+    store = VectorStore.open(base)
+    assert [store.text(i) for i in range(len(store))] == ["chunk 0", "chunk 2"]
+
+
+def test_float16_storage(tmp_path):
+    base = str(tmp_path / "owner_repo")
+    write_vector_store(base, [_chunk(0, [0.5, 0.25])], dtype="float16")
+    store = VectorStore.open(base)
+    assert store.vectors.dtype == np.float16
+    assert store.vectors.nbytes == 4
+
+
+def test_stale_or_missing_store_is_not_opened(tmp_path):
+    base = str(tmp_path / "owner_repo")
+    assert VectorStore.open(base) is None
+
+    write_vector_store(base, [_chunk(0, [1.0])], source_mtime=1.0)
+    assert VectorStore.open(base, source_mtime=2.0) is None
+
+    remove_vector_store(base)
+    assert not any(Path(p).exists() for p in store_paths(base).values())
+
+
+def test_validate_vectors_drops_unusable_embeddings():
+    from api.vector_store import normalize_rows, validate_vectors
+
+    vectors = [
+        [3.0, 4.0],
+        None,
+        [1.0, 2.0, 3.0],
+        [float("nan"), 1.0],
+        [0.0, 0.0],
+        np.array([0.0, 2.0]),
+    ]
+    keep, matrix = validate_vectors(vectors)
+    assert keep.tolist() == [0, 5]
+    assert matrix.dtype == np.float32
+    np.testing.assert_allclose(normalize_rows(matrix), [[0.6, 0.8], [0.0, 1.0]])
+
+    keep, matrix = validate_vectors([None, []])
+    assert len(keep) == 0 and matrix.size == 0